@@ -17,7 +17,7 @@ warnings.filterwarnings("ignore", category=DeprecationWarning)
 # Suppress Snowflake INFO logs for cleaner startup
 logging.getLogger("snowflake.snowpark").setLevel(logging.WARNING)
 
-from dash import Dash, Output, Input, callback, page_container  # noqa: E402
+from dash import Dash, MATCH, Output, Input, callback, page_container  # noqa: E402
 import dash  # noqa: E402
 import dash_bootstrap_components as dbc  # noqa: E402
 import time  # noqa: E402
@@ -33,6 +33,7 @@ except Exception:  # pragma: no cover
 
 # Import shared components
 from components.layout import create_theme_store  # noqa: E402
+from utils.snowflake_utils import GRID_ID_TYPE, GRID_ROWS_ID_TYPE  # noqa: E402
 
 # Add a global variable indicating the port number
 PORT = 8000
@@ -246,6 +247,28 @@ app.clientside_callback(
     prevent_initial_call=True,
 )
 
+# Clientside callback to build each query results grid's rowData from the
+# column-wise rows format_query_results ships in its paired store
+app.clientside_callback(
+    """
+    function(payload) {
+        if (!payload) {
+            return window.dash_clientside.no_update;
+        }
+        const columns = payload.columns;
+        return payload.data.map(function(values) {
+            const row = {};
+            for (let i = 0; i < columns.length; i++) {
+                row[columns[i]] = values[i];
+            }
+            return row;
+        });
+    }
+    """,
+    Output({"type": GRID_ID_TYPE, "index": MATCH}, "rowData"),
+    Input({"type": GRID_ROWS_ID_TYPE, "index": MATCH}, "data"),
+)
+
 if __name__ == "__main__":
     logger.info(f"Starting Multi-Page Snowflake Dash Application on port {PORT}")
     logger.info(f"Registered pages: {list(dash.page_registry.keys())}")
@@ -2,14 +2,13 @@
 Pytest configuration and fixtures for the test suite.
 """
 
+import numpy as np
 import pytest
 import pandas as pd
 from unittest.mock import Mock, patch
-import os
 import sys
-
-# Add the project root to the Python path
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from functools import lru_cache
+from types import MappingProxyType, SimpleNamespace
 
 
 @pytest.fixture
@@ -51,6 +50,48 @@ def mock_snowflake_session():
     return mock_session
 
 
+@pytest.fixture(scope="session")
+def _snowflake_session_spec():
+    """Snowpark Session class, imported once and used as the spec for mocks."""
+    from snowflake.snowpark import Session
+
+    return Session
+
+
+@pytest.fixture
+def mock_session(_snowflake_session_spec):
+    """Fresh Session-spec mock whose queries return an empty DataFrame."""
+    session = Mock(spec=_snowflake_session_spec)
+    session.sql.return_value.to_pandas.return_value = pd.DataFrame()
+    return session
+
+
+@pytest.fixture
+def patched_get_session(monkeypatch, mock_session):
+    """Make get_snowflake_session return ``mock_session`` for the test."""
+    monkeypatch.setattr(
+        "utils.snowflake_utils.get_snowflake_session", lambda: mock_session
+    )
+    return mock_session
+
+
+@pytest.fixture(scope="module")
+def large_result_df():
+    """6000-row single-column frame, above the large-result logging threshold."""
+    return pd.DataFrame({"col1": np.arange(6000, dtype=np.int64)})
+
+
+@pytest.fixture(scope="module")
+def medium_result_df():
+    """2000-row frame for exercising result truncation in the grid."""
+    return pd.DataFrame(
+        {
+            "id": np.arange(2000, dtype=np.int64),
+            "value": np.arange(2000, dtype=np.int64),
+        }
+    )
+
+
 @pytest.fixture
 def mock_environment_variables():
     """Mock environment variables for testing."""
@@ -137,6 +178,66 @@ def reset_query_history():
     _query_history.clear()
 
 
+@pytest.fixture(autouse=True)
+def reset_cached_session(monkeypatch):
+    """Start every test without a shared session or cached lookups."""
+    from utils.snowflake_utils import is_running_in_spcs
+
+    monkeypatch.setattr("utils.snowflake_utils._cached_session", None)
+    monkeypatch.setattr("utils.snowflake_utils._login_token_cache", None)
+    monkeypatch.setattr("utils.snowflake_utils._schema_objects_cache", None)
+    is_running_in_spcs.cache_clear()
+    yield
+    is_running_in_spcs.cache_clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_result_cache():
+    """Start every test without cached query results."""
+    from utils.snowflake_utils import clear_result_cache
+
+    clear_result_cache()
+    yield
+    clear_result_cache()
+
+
+@pytest.fixture(autouse=True)
+def reset_security_check_cache():
+    """Clear memoized security-check results so each test validates afresh."""
+    from utils.snowflake_utils import _cached_security_checks
+
+    _cached_security_checks.cache_clear()
+    yield
+    _cached_security_checks.cache_clear()
+
+
+@pytest.fixture(scope="session")
+def cached_validators():
+    """
+    Memoized query validators shared across the session.
+
+    Results are shared between callers, so consumers must treat them as
+    read-only. Tests that patch validator internals should call the
+    functions directly instead.
+    """
+    from utils import snowflake_utils
+
+    return SimpleNamespace(
+        validate=lru_cache(maxsize=256)(snowflake_utils._validate_query_safety),
+        check=lru_cache(maxsize=256)(
+            snowflake_utils._perform_additional_security_checks
+        ),
+    )
+
+
+@pytest.fixture
+def frozen_time(monkeypatch):
+    """Freeze time.time at a fixed instant; set ``frozen_time[0]`` to advance it."""
+    now = [1_700_000_000.0]
+    monkeypatch.setattr("utils.snowflake_utils.time.time", lambda: now[0])
+    return now
+
+
 @pytest.fixture
 def patch_snowflake_session():
     """Patch the get_snowflake_session function."""
@@ -213,10 +314,15 @@ class TestDataFactory:
         )
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def advanced_attack_patterns():
-    """Advanced attack patterns for comprehensive security testing."""
-    return {
+    """
+    Advanced attack patterns for comprehensive security testing.
+
+    Built once per session, with interned strings, and returned read-only so
+    tests can share it.
+    """
+    patterns = {
         "privilege_escalation": [
             "USE ROLE SYSADMIN",
             "GRANT ALL PRIVILEGES ON *.* TO CURRENT_USER",
@@ -254,6 +360,7 @@ def advanced_attack_patterns():
             "SELECT\t*\tFROM\tusers\tWHERE\tid\t=\t1",
         ],
     }
+    return MappingProxyType({k: tuple(map(sys.intern, v)) for k, v in patterns.items()})
 
 
 @pytest.fixture
@@ -310,10 +417,15 @@ def performance_attack_queries():
     ]
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def real_world_attack_scenarios():
-    """Real-world attack scenarios for comprehensive testing."""
-    return {
+    """
+    Real-world attack scenarios for comprehensive testing.
+
+    Built once per session, with interned strings, and returned read-only so
+    tests can share it.
+    """
+    scenarios = {
         "sql_injection_chains": [
             "SELECT * FROM users WHERE id = '1'; DROP TABLE users; --",
             "SELECT * FROM data WHERE name = '' OR 1=1 --",
@@ -333,6 +445,55 @@ def real_world_attack_scenarios():
             "SELECT * FROM finance.budget_data",
         ],
     }
+    return MappingProxyType(
+        {k: tuple(map(sys.intern, v)) for k, v in scenarios.items()}
+    )
+
+
+@pytest.fixture(scope="session")
+def sql_injection_corpus():
+    """Named SQL injection queries with the rejection message each should produce."""
+    return MappingProxyType(
+        {
+            "stacked_drop": (
+                "SELECT * FROM users WHERE id = 1; DROP TABLE users;",
+                "malicious pattern",
+            ),
+            "or_tautology": (
+                "SELECT * FROM data WHERE name = '' OR 1=1 --",
+                "malicious pattern",
+            ),
+            "union_select": (
+                "SELECT * UNION SELECT password FROM credentials",
+                "malicious pattern",
+            ),
+        }
+    )
+
+
+@pytest.fixture
+def sql_injection_case(request, sql_injection_corpus):
+    """Single (query, expected message) entry selected by indirect parametrization."""
+    return sql_injection_corpus[request.param]
+
+
+@pytest.fixture(scope="session")
+def dangerous_keyword_corpus():
+    """Named data-modifying queries that must be rejected as forbidden keywords."""
+    return MappingProxyType(
+        {
+            "delete": "DELETE FROM customer",
+            "update": "UPDATE users SET password = 'hack'",
+            "drop": "DROP TABLE important_data",
+            "insert": "INSERT INTO logs VALUES ('bad')",
+        }
+    )
+
+
+@pytest.fixture
+def dangerous_keyword_query(request, dangerous_keyword_corpus):
+    """Single dangerous query selected by indirect parametrization."""
+    return dangerous_keyword_corpus[request.param]
 
 
 @pytest.fixture
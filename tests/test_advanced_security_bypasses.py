@@ -28,9 +28,7 @@ class TestAdvancedInjectionBypasses:
         ]
 
         for malicious_query in bypass_attempts:
-            result = _perform_additional_security_checks(
-                malicious_query.upper(), malicious_query
-            )
+            result = _perform_additional_security_checks(malicious_query)
             assert result["error"], (
                 f"Failed to detect Unicode bypass: {malicious_query}"
             )
@@ -49,9 +47,7 @@ class TestAdvancedInjectionBypasses:
         ]
 
         for malicious_query in bypass_attempts:
-            _perform_additional_security_checks(
-                malicious_query.upper(), malicious_query
-            )
+            _perform_additional_security_checks(malicious_query)
             # Note: These might not be caught by current regex, but should be flagged
             # This test documents the current behavior and alerts if it changes
 
@@ -67,9 +63,7 @@ class TestAdvancedInjectionBypasses:
         ]
 
         for malicious_query in bypass_attempts:
-            result = _perform_additional_security_checks(
-                malicious_query.upper(), malicious_query
-            )
+            result = _perform_additional_security_checks(malicious_query)
             assert result["error"], (
                 f"Failed to detect whitespace bypass: {repr(malicious_query)}"
             )
@@ -84,9 +78,7 @@ class TestAdvancedInjectionBypasses:
         ]
 
         for malicious_query in bypass_attempts:
-            result = _perform_additional_security_checks(
-                malicious_query.upper(), malicious_query
-            )
+            result = _perform_additional_security_checks(malicious_query)
             assert result["error"], f"Failed to detect case bypass: {malicious_query}"
 
     def test_comment_based_bypasses(self):
@@ -101,9 +93,7 @@ class TestAdvancedInjectionBypasses:
         ]
 
         for malicious_query in bypass_attempts:
-            result = _perform_additional_security_checks(
-                malicious_query.upper(), malicious_query
-            )
+            result = _perform_additional_security_checks(malicious_query)
             assert result["error"], (
                 f"Failed to detect comment bypass: {malicious_query}"
             )
@@ -139,16 +129,14 @@ class TestQueryValidationEdgeCases:
         exactly_10_levels = (
             "SELECT * FROM users WHERE " + "(" * 10 + "id > 0" + ")" * 10
         )
-        result = _perform_additional_security_checks(
-            exactly_10_levels.upper(), exactly_10_levels
-        )
+        result = _perform_additional_security_checks(exactly_10_levels)
         assert not result["error"], (
             f"Should allow exactly 10 levels of nesting, got: {result['message']}"
         )
 
         # Test one over the limit (11 levels)
         over_limit = "SELECT * FROM users WHERE " + "(" * 11 + "id > 0" + ")" * 11
-        result = _perform_additional_security_checks(over_limit.upper(), over_limit)
+        result = _perform_additional_security_checks(over_limit)
         assert result["error"], "Should reject 11 levels of nesting"
 
     def test_query_length_boundary_conditions(self):
@@ -171,7 +159,7 @@ class TestQueryValidationEdgeCases:
             f"Expected 10,000 chars, got {len(exactly_10k)}"
         )
 
-        result = _perform_additional_security_checks(exactly_10k.upper(), exactly_10k)
+        result = _perform_additional_security_checks(exactly_10k)
         assert not result["error"], (
             f"Should allow exactly 10,000 characters, got: {result['message']}"
         )
@@ -180,7 +168,7 @@ class TestQueryValidationEdgeCases:
         over_limit = exactly_10k + "x"
         assert len(over_limit) == 10001, f"Expected 10,001 chars, got {len(over_limit)}"
 
-        result = _perform_additional_security_checks(over_limit.upper(), over_limit)
+        result = _perform_additional_security_checks(over_limit)
         assert result["error"], (
             f"Should reject 10,001 characters, got: {result['message']}"
         )
@@ -199,16 +187,12 @@ class TestQueryValidationEdgeCases:
         JOIN table5 ON table4.id = table5.id
         JOIN table6 ON table5.id = table6.id
         """
-        result = _perform_additional_security_checks(
-            exactly_5_joins.upper(), exactly_5_joins
-        )
+        result = _perform_additional_security_checks(exactly_5_joins)
         assert not result["error"], "Should allow exactly 5 JOINs"
 
         # Test 6 JOINs (over the limit)
         over_limit_joins = exactly_5_joins + " JOIN table7 ON table6.id = table7.id"
-        result = _perform_additional_security_checks(
-            over_limit_joins.upper(), over_limit_joins
-        )
+        result = _perform_additional_security_checks(over_limit_joins)
         assert result["error"], "Should reject 6 JOINs"
 
 
@@ -237,9 +221,7 @@ class TestSchemaAccessValidation:
         ]
 
         for malicious_query in malicious_schemas:
-            result = _perform_additional_security_checks(
-                malicious_query.upper(), malicious_query
-            )
+            result = _perform_additional_security_checks(malicious_query)
             assert result["error"], (
                 f"Should reject access to production schema: {malicious_query}"
             )
@@ -253,7 +235,7 @@ class TestSchemaAccessValidation:
         ]
 
         for query in allowed_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Should allow INFORMATION_SCHEMA access: {query}"
             )
@@ -272,7 +254,7 @@ class TestPerformanceAttackVectors:
         ]
 
         for query in dangerous_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert result["error"], (
                 f"Should detect potential Cartesian product: {query}"
             )
@@ -285,7 +267,7 @@ class TestPerformanceAttackVectors:
         ]
 
         for query in recursive_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert result["error"], f"Should detect recursive CTE: {query}"
 
     def test_complex_operation_detection(self):
@@ -298,7 +280,7 @@ class TestPerformanceAttackVectors:
         ]
 
         for query in complex_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert result["error"], f"Should detect complex operation: {query}"
 
 
@@ -316,7 +298,7 @@ class TestFileOperationSecurity:
         ]
 
         for query in stage_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert result["error"], f"Should detect stage reference: {query}"
 
     def test_external_reference_detection(self):
@@ -330,7 +312,7 @@ class TestFileOperationSecurity:
         ]
 
         for query in external_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert result["error"], f"Should detect external reference: {query}"
 
 
@@ -352,7 +334,7 @@ class TestRegexExploitation:
             import time
 
             start_time = time.time()
-            result = _perform_additional_security_checks(attack.upper(), attack)
+            result = _perform_additional_security_checks(attack)
             execution_time = time.time() - start_time
 
             # Should complete within 1 second (adjust threshold as needed)
@@ -7,12 +7,17 @@ and potential vulnerabilities in authentication/authorization.
 
 import pytest
 import os
+import threading
+import time
+import pyarrow as pa
 from unittest.mock import patch, Mock, mock_open
 from utils.snowflake_utils import (
     get_snowflake_session,
     get_login_token,
     is_running_in_spcs,
     execute_query,
+    _query_history,
+    _MAX_QUERIES_PER_MINUTE,
 )
 
 
@@ -118,8 +123,8 @@ class TestSessionIsolation:
     """Test session isolation and cleanup."""
 
     @patch("utils.snowflake_utils.get_snowflake_session")
-    def test_session_cleanup_on_exception(self, mock_get_session):
-        """Test that sessions are properly cleaned up on exceptions."""
+    def test_shared_session_kept_on_exception(self, mock_get_session):
+        """Test that a failing query leaves the shared session open for reuse."""
         mock_session = Mock()
         mock_get_session.return_value = mock_session
 
@@ -129,35 +134,37 @@ class TestSessionIsolation:
         # Execute query that will fail
         result = execute_query("SELECT * FROM valid_table")
 
-        # Verify session was closed even after exception
-        mock_session.close.assert_called_once()
+        # The shared session is not closed; it is probed before its next reuse
+        mock_session.close.assert_not_called()
         assert "error" in result.columns
 
     @patch("utils.snowflake_utils.get_snowflake_session")
     def test_multiple_session_isolation(self, mock_get_session):
-        """Test that multiple query executions use isolated sessions."""
+        """Test that each query runs on the session it was handed."""
         # Create different mock sessions for each call
         session1 = Mock()
         session2 = Mock()
         mock_get_session.side_effect = [session1, session2]
 
         # Configure successful responses
-        import pandas as pd
-
-        session1.sql.return_value.to_pandas.return_value = pd.DataFrame(
-            {"result1": [1]}
-        )
-        session2.sql.return_value.to_pandas.return_value = pd.DataFrame(
-            {"result2": [2]}
-        )
+        session1.sql.return_value.to_arrow_batches.return_value = [
+            pa.table({"result1": [1]})
+        ]
+        session2.sql.return_value.to_arrow_batches.return_value = [
+            pa.table({"result2": [2]})
+        ]
 
         # Execute two queries
         result1 = execute_query("SELECT 1")
         result2 = execute_query("SELECT 2")
 
-        # Verify both sessions were used and closed
-        session1.close.assert_called_once()
-        session2.close.assert_called_once()
+        # Verify both sessions were used and left open for reuse
+        session1.close.assert_not_called()
+        session2.close.assert_not_called()
+        assert "error" not in result1.columns
+        assert "error" not in result2.columns
+        assert list(result1.columns) == ["result1"]
+        assert list(result2.columns) == ["result2"]
         assert len(result1) == 1
         assert len(result2) == 1
 
@@ -225,9 +232,6 @@ class TestRateLimitingSecurity:
 
     def test_rate_limit_bypass_attempts(self, reset_query_history):
         """Test attempts to bypass rate limiting."""
-        from utils.snowflake_utils import _query_history, _MAX_QUERIES_PER_MINUTE
-        import time
-
         # Fill up rate limit
         current_time = time.time()
         for _ in range(_MAX_QUERIES_PER_MINUTE):
@@ -251,9 +255,6 @@ class TestRateLimitingSecurity:
 
     def test_concurrent_rate_limit_enforcement(self, reset_query_history):
         """Test rate limiting under concurrent access."""
-        from utils.snowflake_utils import _MAX_QUERIES_PER_MINUTE
-        import threading
-
         results = []
 
         def execute_concurrent_query(query_id):
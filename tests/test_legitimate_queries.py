@@ -28,7 +28,7 @@ class TestLegitimateBasicQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Legitimate query blocked: {query} - {result['message']}"
             )
@@ -49,7 +49,7 @@ class TestLegitimateBasicQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Legitimate WHERE query blocked: {query} - {result['message']}"
             )
@@ -67,7 +67,7 @@ class TestLegitimateBasicQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Legitimate ordering/grouping query blocked: {query} - {result['message']}"
             )
@@ -87,7 +87,7 @@ class TestLegitimateJoinQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Legitimate INNER JOIN blocked: {query} - {result['message']}"
             )
@@ -102,7 +102,7 @@ class TestLegitimateJoinQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Legitimate OUTER JOIN blocked: {query} - {result['message']}"
             )
@@ -125,9 +125,7 @@ class TestLegitimateJoinQueries:
         for query in legitimate_queries:
             # Remove extra whitespace for cleaner testing
             clean_query = " ".join(query.split())
-            result = _perform_additional_security_checks(
-                clean_query.upper(), clean_query
-            )
+            result = _perform_additional_security_checks(clean_query)
             assert not result["error"], (
                 f"Legitimate multiple JOIN blocked: {clean_query} - {result['message']}"
             )
@@ -150,7 +148,7 @@ class TestLegitimateAggregateQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Legitimate aggregate query blocked: {query} - {result['message']}"
             )
@@ -165,7 +163,7 @@ class TestLegitimateAggregateQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Legitimate window function blocked: {query} - {result['message']}"
             )
@@ -181,7 +179,7 @@ class TestLegitimateAggregateQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Legitimate date/time query blocked: {query} - {result['message']}"
             )
@@ -202,7 +200,7 @@ class TestLegitimateInformationSchemaQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Legitimate INFORMATION_SCHEMA query blocked: {query} - {result['message']}"
             )
@@ -217,7 +215,7 @@ class TestLegitimateInformationSchemaQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Legitimate SNOWFLAKE_SAMPLE_DATA query blocked: {query} - {result['message']}"
             )
@@ -237,7 +235,7 @@ class TestLegitimateComplexQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Legitimate subquery blocked: {query} - {result['message']}"
             )
@@ -262,9 +260,7 @@ class TestLegitimateComplexQueries:
         for query in legitimate_queries:
             # Remove extra whitespace for cleaner testing
             clean_query = " ".join(query.split())
-            result = _perform_additional_security_checks(
-                clean_query.upper(), clean_query
-            )
+            result = _perform_additional_security_checks(clean_query)
             assert not result["error"], (
                 f"Legitimate CTE blocked: {clean_query} - {result['message']}"
             )
@@ -279,7 +275,7 @@ class TestLegitimateComplexQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Legitimate CASE WHEN blocked: {query} - {result['message']}"
             )
@@ -299,7 +295,7 @@ class TestLegitimateQueryEdgeCases:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Legitimate quoted identifier query blocked: {query} - {result['message']}"
             )
@@ -315,7 +311,7 @@ class TestLegitimateQueryEdgeCases:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Legitimate string literal query blocked: {query} - {result['message']}"
             )
@@ -331,7 +327,7 @@ class TestLegitimateQueryEdgeCases:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Legitimate numeric expression blocked: {query} - {result['message']}"
             )
@@ -347,7 +343,7 @@ class TestLegitimateQueryEdgeCases:
             f"Test query too long: {len(long_select)} chars"
         )
 
-        result = _perform_additional_security_checks(long_select.upper(), long_select)
+        result = _perform_additional_security_checks(long_select)
         assert not result["error"], (
             f"Legitimate long query blocked: {long_select[:100]}... - {result['message']}"
         )
@@ -394,7 +390,7 @@ class TestFalsePositivePrevention:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Business term query blocked: {query} - {result['message']}"
             )
@@ -410,7 +406,7 @@ class TestFalsePositivePrevention:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Mathematical expression blocked: {query} - {result['message']}"
             )
@@ -426,7 +422,7 @@ class TestFalsePositivePrevention:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Comparison operator query blocked: {query} - {result['message']}"
             )
@@ -449,7 +445,7 @@ class TestLegitimateAdvancedQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Advanced window function blocked: {query} - {result['message']}"
             )
@@ -465,7 +461,7 @@ class TestLegitimateAdvancedQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Analytical function blocked: {query} - {result['message']}"
             )
@@ -479,7 +475,7 @@ class TestLegitimateAdvancedQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Aggregation operation blocked: {query} - {result['message']}"
             )
@@ -506,7 +502,7 @@ class TestLegitimateAdvancedQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], f"CTE blocked: {query} - {result['message']}"
 
 
@@ -526,7 +522,7 @@ class TestLegitimateModernSQLFeatures:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Array/Object operation blocked: {query} - {result['message']}"
             )
@@ -542,7 +538,7 @@ class TestLegitimateModernSQLFeatures:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Simple text query blocked: {query} - {result['message']}"
             )
@@ -559,7 +555,7 @@ class TestLegitimateModernSQLFeatures:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Time series function blocked: {query} - {result['message']}"
             )
@@ -575,7 +571,7 @@ class TestLegitimateModernSQLFeatures:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Geospatial function blocked: {query} - {result['message']}"
             )
@@ -596,7 +592,7 @@ class TestLegitimateDataQualityQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Data profiling query blocked: {query} - {result['message']}"
             )
@@ -613,7 +609,7 @@ class TestLegitimateDataQualityQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Data validation query blocked: {query} - {result['message']}"
             )
@@ -628,7 +624,7 @@ class TestLegitimateDataQualityQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Data monitoring query blocked: {query} - {result['message']}"
             )
@@ -649,7 +645,7 @@ class TestLegitimateBusinessIntelligenceQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Sales analytics query blocked: {query} - {result['message']}"
             )
@@ -664,7 +660,7 @@ class TestLegitimateBusinessIntelligenceQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Customer analytics query blocked: {query} - {result['message']}"
             )
@@ -679,7 +675,7 @@ class TestLegitimateBusinessIntelligenceQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Operational analytics query blocked: {query} - {result['message']}"
             )
@@ -720,7 +716,7 @@ class TestLegitimateComplexBusinessQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Multi-table reporting query blocked: {query[:100]}... - {result['message']}"
             )
@@ -748,7 +744,7 @@ class TestLegitimateComplexBusinessQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Financial reporting query blocked: {query[:100]}... - {result['message']}"
             )
@@ -784,7 +780,7 @@ class TestLegitimateComplexBusinessQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Inventory management query blocked: {query[:100]}... - {result['message']}"
             )
@@ -804,7 +800,7 @@ class TestLegitimatePerformanceOptimizedQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Materialized view query blocked: {query} - {result['message']}"
             )
@@ -819,7 +815,7 @@ class TestLegitimatePerformanceOptimizedQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Clustered table query blocked: {query} - {result['message']}"
             )
@@ -834,7 +830,7 @@ class TestLegitimatePerformanceOptimizedQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Partitioned table query blocked: {query} - {result['message']}"
             )
@@ -858,7 +854,7 @@ class TestLegitimateEdgeCaseQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Special characters query blocked: {query} - {result['message']}"
             )
@@ -875,7 +871,7 @@ class TestLegitimateEdgeCaseQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Unicode content query blocked: {query} - {result['message']}"
             )
@@ -890,7 +886,7 @@ class TestLegitimateEdgeCaseQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Case sensitivity query blocked: {query} - {result['message']}"
             )
@@ -911,7 +907,7 @@ class TestLegitimateEdgeCaseQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Whitespace variation query blocked: {query} - {result['message']}"
             )
@@ -932,7 +928,7 @@ class TestLegitimateSnowflakeSpecificQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Snowflake system function blocked: {query} - {result['message']}"
             )
@@ -947,7 +943,7 @@ class TestLegitimateSnowflakeSpecificQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Sample data query blocked: {query} - {result['message']}"
             )
@@ -963,7 +959,7 @@ class TestLegitimateSnowflakeSpecificQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Basic selection query blocked: {query} - {result['message']}"
             )
@@ -978,7 +974,7 @@ class TestLegitimateSnowflakeSpecificQueries:
         ]
 
         for query in legitimate_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"], (
                 f"Time Travel query blocked: {query} - {result['message']}"
             )
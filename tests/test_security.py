@@ -15,6 +15,7 @@ This test suite provides extensive security validation coverage including:
 """
 
 import pytest
+import logging
 import re
 import time
 from unittest.mock import patch, Mock
@@ -27,6 +28,30 @@ from utils.snowflake_utils import (
 )
 
 
+@pytest.fixture(scope="module", autouse=True)
+def _info_logging():
+    """Emit snowflake_utils INFO records once for the module, not per test."""
+    module_logger = logging.getLogger("utils.snowflake_utils")
+    previous_level = module_logger.level
+    module_logger.setLevel(logging.INFO)
+    yield
+    module_logger.setLevel(previous_level)
+
+
+@pytest.fixture(scope="module")
+def _mock_session():
+    """
+    Module-wide stand-in for get_snowflake_session shared by the test classes.
+
+    Behaves like an unreachable Snowflake account (no session) without paying
+    for a real connection attempt in every test that reaches execution.
+    """
+    with patch(
+        "utils.snowflake_utils.get_snowflake_session", return_value=None
+    ) as mock_get_session:
+        yield mock_get_session
+
+
 @pytest.mark.security
 class TestSQLInjectionPrevention:
     """Test SQL injection prevention mechanisms."""
@@ -35,9 +60,7 @@ class TestSQLInjectionPrevention:
         """Test detection of classic SQL injection patterns."""
         for pattern in sql_injection_patterns:
             malicious_query = f"SELECT * FROM users WHERE id = '{pattern}'"
-            result = _perform_additional_security_checks(
-                malicious_query.upper(), malicious_query
-            )
+            result = _perform_additional_security_checks(malicious_query)
             assert result["error"], f"Failed to detect injection pattern: {pattern}"
             assert "malicious pattern" in result["message"]
 
@@ -50,7 +73,7 @@ class TestSQLInjectionPrevention:
         ]
 
         for query in malicious_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert result["error"]
 
     def test_union_based_injection(self):
@@ -62,7 +85,7 @@ class TestSQLInjectionPrevention:
         ]
 
         for query in malicious_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert result["error"]
 
     def test_boolean_based_injection(self):
@@ -74,7 +97,7 @@ class TestSQLInjectionPrevention:
         ]
 
         for query in malicious_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert result["error"]
 
 
@@ -92,7 +115,7 @@ class TestAccessControl:
         ]
 
         for query in forbidden_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert result["error"]
             assert "not allowed" in result["message"]
 
@@ -104,7 +127,7 @@ class TestAccessControl:
         ]
 
         for query in allowed_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert not result["error"]
 
     def test_file_operation_prevention(self):
@@ -117,7 +140,7 @@ class TestAccessControl:
         ]
 
         for query in file_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert result["error"], f"Failed to detect file operation: {query}"
             # Accept either file operations message or schema restriction message
             assert any(
@@ -177,7 +200,7 @@ class TestComplexityLimits:
         # Create a query with excessive nesting
         nested_query = "SELECT * FROM table WHERE col IN (" * 15 + "1" + ")" * 15
 
-        result = _perform_additional_security_checks(nested_query.upper(), nested_query)
+        result = _perform_additional_security_checks(nested_query)
         assert result["error"]
         assert any(
             keyword in result["message"]
@@ -191,7 +214,7 @@ class TestComplexityLimits:
             "SELECT * FROM t1 " + "JOIN t{} ON t1.id = t{}.id ".format(2, 2) * 10
         )
 
-        result = _perform_additional_security_checks(join_query.upper(), join_query)
+        result = _perform_additional_security_checks(join_query)
         assert result["error"]
         assert "too many JOINs" in result["message"]
 
@@ -202,7 +225,7 @@ class TestComplexityLimits:
             "SELECT " + ", ".join([f"col{i}" for i in range(2000)]) + " FROM table"
         )
 
-        result = _perform_additional_security_checks(long_query.upper(), long_query)
+        result = _perform_additional_security_checks(long_query)
         assert result["error"]
         assert "too long" in result["message"]
 
@@ -216,7 +239,7 @@ class TestComplexityLimits:
         ]
 
         for query in dangerous_ops:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert result["error"], f"Failed to detect dangerous operation: {query}"
             assert any(
                 keyword in result["message"]
@@ -298,7 +321,7 @@ class TestBypassAttempts:
             # These should be allowed as they're valid SELECT statements
             # but would be caught by the additional security checks
             if not result["error"]:
-                _perform_additional_security_checks(query.upper(), query)
+                _perform_additional_security_checks(query)
                 # Some might be caught by additional checks
 
 
@@ -318,7 +341,7 @@ class TestAdvancedSQLInjection:
 
         for pattern in polyglot_patterns:
             query = f"SELECT * FROM customer WHERE id = '{pattern}'"
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert result["error"], f"Failed to detect polyglot injection: {pattern}"
 
     def test_blind_sql_injection_patterns(self):
@@ -333,7 +356,7 @@ class TestAdvancedSQLInjection:
 
         for pattern in blind_patterns:
             query = f"SELECT * FROM customer WHERE name = '{pattern}'"
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert result["error"], f"Failed to detect blind injection: {pattern}"
 
     def test_second_order_injection_patterns(self):
@@ -346,7 +369,7 @@ class TestAdvancedSQLInjection:
 
         for pattern in second_order_patterns:
             query = f"SELECT * FROM customer WHERE name = '{pattern}'"
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert result["error"], (
                 f"Failed to detect second-order injection: {pattern}"
             )
@@ -363,7 +386,7 @@ class TestAdvancedSQLInjection:
 
         for injection in function_injections:
             query = f"SELECT * FROM customer WHERE id = {injection}"
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             # Some might be legitimate, but combined patterns should be caught
             if "SELECT" in injection.upper() and "FROM" in injection.upper():
                 assert result["error"], (
@@ -454,7 +477,7 @@ class TestDataExfiltrationPrevention:
         ]
 
         for attack in external_function_attacks:
-            result = _perform_additional_security_checks(attack.upper(), attack)
+            result = _perform_additional_security_checks(attack)
             assert result["error"], f"Failed to detect external function: {attack}"
 
     def test_information_schema_enumeration(self):
@@ -490,7 +513,7 @@ class TestTimingAttackPrevention:
         ]
 
         for attack in timing_attacks:
-            result = _perform_additional_security_checks(attack.upper(), attack)
+            result = _perform_additional_security_checks(attack)
             assert result["error"], f"Failed to detect timing attack: {attack}"
 
     def test_resource_exhaustion_attempts(self):
@@ -503,7 +526,7 @@ class TestTimingAttackPrevention:
         ]
 
         for attack in exhaustion_attacks:
-            result = _perform_additional_security_checks(attack.upper(), attack)
+            result = _perform_additional_security_checks(attack)
             assert result["error"], f"Failed to detect resource exhaustion: {attack}"
 
 
@@ -522,7 +545,7 @@ class TestBypassTechniques:
         ]
 
         for evasion in comment_evasions:
-            result = _perform_additional_security_checks(evasion.upper(), evasion)
+            result = _perform_additional_security_checks(evasion)
             # Should detect obfuscated dangerous patterns
             if any(
                 keyword in evasion.upper() for keyword in ["UNION", "DROP", "DELETE"]
@@ -540,7 +563,7 @@ class TestBypassTechniques:
         ]
 
         for evasion in encoding_evasions:
-            _perform_additional_security_checks(evasion.upper(), evasion)
+            _perform_additional_security_checks(evasion)
             # These might be legitimate, but should be flagged if used suspiciously
 
     def test_whitespace_evasion_techniques(self):
@@ -556,7 +579,7 @@ class TestBypassTechniques:
         for evasion in whitespace_evasions:
             # These should be normalized and still detected if dangerous
             cleaned_query = re.sub(r"\s+", " ", evasion.strip())
-            _perform_additional_security_checks(cleaned_query.upper(), cleaned_query)
+            _perform_additional_security_checks(cleaned_query)
 
     def test_case_manipulation_evasion(self):
         """Test case manipulation evasion techniques."""
@@ -664,7 +687,7 @@ class TestEdgeCaseSecurityValidation:
         ]
 
         for attack in unicode_attacks:
-            _perform_additional_security_checks(attack.upper(), attack)
+            _perform_additional_security_checks(attack)
             # Should normalize Unicode and detect dangerous patterns
 
     def test_very_long_query_handling(self):
@@ -673,7 +696,7 @@ class TestEdgeCaseSecurityValidation:
         long_select = "SELECT " + ", ".join([f"column_{i}" for i in range(5000)])
         long_query = f"{long_select} FROM customer"
 
-        result = _perform_additional_security_checks(long_query.upper(), long_query)
+        result = _perform_additional_security_checks(long_query)
         assert result["error"]
         assert "too long" in result["message"]
 
@@ -685,7 +708,7 @@ class TestEdgeCaseSecurityValidation:
             nested_query += f"SELECT id FROM table_{i} WHERE col IN ("
         nested_query += "1" + ")" * 21
 
-        result = _perform_additional_security_checks(nested_query.upper(), nested_query)
+        result = _perform_additional_security_checks(nested_query)
         assert result["error"]
         assert any(
             keyword in result["message"]
@@ -708,13 +731,13 @@ class TestEdgeCaseSecurityValidation:
 
 
 @pytest.mark.security
+@pytest.mark.usefixtures("_mock_session")
 class TestSecurityLogging:
     """Test security event logging and monitoring."""
 
     def test_security_violation_logging(self, caplog):
         """Test that security violations are properly logged."""
-        with caplog.at_level("INFO"):  # Changed from WARNING to INFO
-            result = execute_query("DELETE FROM users")
+        result = execute_query("DELETE FROM users")
 
         # Should either log or return error in DataFrame
         has_log = any(
@@ -739,11 +762,10 @@ class TestSecurityLogging:
         ]
 
         error_count = 0
-        with caplog.at_level("INFO"):
-            for query in suspicious_queries:
-                result = execute_query(query)
-                if "error" in result.columns:
-                    error_count += 1
+        for query in suspicious_queries:
+            result = execute_query(query)
+            if "error" in result.columns:
+                error_count += 1
 
         # Should have blocked all suspicious queries
         assert error_count >= len(suspicious_queries) * 0.8, (
@@ -768,8 +790,7 @@ class TestSecurityLogging:
             f"Expected {_MAX_QUERIES_PER_MINUTE} entries, got {len(_query_history)}"
         )
 
-        with caplog.at_level("INFO"):
-            result = execute_query("SELECT 1")
+        result = execute_query("SELECT 1")
 
         # Should either log or return error for rate limit
         has_log = any(
@@ -795,6 +816,7 @@ class TestSecurityLogging:
 
 
 @pytest.mark.security
+@pytest.mark.usefixtures("_mock_session")
 class TestConcurrentSecurityScenarios:
     """Test security under concurrent access scenarios."""
 
@@ -833,11 +855,12 @@ class TestConcurrentSecurityScenarios:
         result = execute_query("SELECT * FROM customer")
         assert "error" in result.columns
 
-        # Ensure session is properly closed even on error
-        mock_session.close.assert_called_once()
+        # The shared session is not closed; it is probed before its next reuse
+        mock_session.close.assert_not_called()
 
 
 @pytest.mark.security
+@pytest.mark.usefixtures("_mock_session")
 class TestComplianceValidation:
     """Test compliance with security standards and regulations."""
 
@@ -852,7 +875,7 @@ class TestComplianceValidation:
         ]
 
         for query in pii_queries:
-            _perform_additional_security_checks(query.upper(), query)
+            _perform_additional_security_checks(query)
             # PII access should be monitored (not necessarily blocked)
             # This depends on your compliance requirements
 
@@ -865,9 +888,8 @@ class TestComplianceValidation:
             "GRANT ALL PRIVILEGES TO 'hacker'",
         ]
 
-        with caplog.at_level("INFO"):
-            for event in security_events:
-                execute_query(event)
+        for event in security_events:
+            execute_query(event)
 
         # Each security event should generate a log entry
         logged_events = [record for record in caplog.records]
@@ -6,6 +6,8 @@ under extreme conditions, high load, and edge cases.
 """
 
 import pytest
+import io
+import itertools
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
@@ -13,17 +15,38 @@ from utils.snowflake_utils import (
     execute_query,
     _validate_query_safety,
     _perform_additional_security_checks,
+    _run_security_checks,
     _check_rate_limit,
     _MAX_QUERIES_PER_MINUTE,
 )
 
+# Keep the stress classes on one xdist worker: their timing thresholds assume
+# they are not competing with each other for the same CPU.
+security_stress_group = pytest.mark.xdist_group("security_stress")
+
+
+@pytest.fixture(scope="class")
+def _pool():
+    """Thread pools created once per class, one per worker count, and shared."""
+    pools = {}
+
+    def get_pool(max_workers):
+        if max_workers not in pools:
+            pools[max_workers] = ThreadPoolExecutor(max_workers=max_workers)
+        return pools[max_workers]
+
+    yield get_pool
+    for executor in pools.values():
+        executor.shutdown()
+
 
 @pytest.mark.security
 @pytest.mark.slow
+@security_stress_group
 class TestSecurityStressTesting:
     """Stress tests for security validation under load."""
 
-    def test_concurrent_malicious_queries(self, reset_query_history):
+    def test_concurrent_malicious_queries(self, _pool, reset_query_history):
         """Test security validation under concurrent malicious query load."""
         malicious_queries = [
             "DELETE FROM users",
@@ -39,15 +62,14 @@ class TestSecurityStressTesting:
             return execute_query(query)
 
         # Execute queries concurrently
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            futures = [
-                executor.submit(execute_malicious_query, query)
-                for query in malicious_queries
-            ]
+        futures = [
+            _pool(10).submit(execute_malicious_query, query)
+            for query in malicious_queries
+        ]
 
-            for future in as_completed(futures):
-                result = future.result()
-                results.append(result)
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
 
         # All malicious queries should be blocked
         blocked_queries = [r for r in results if "error" in r.columns]
@@ -70,7 +92,7 @@ class TestSecurityStressTesting:
             )
 
     def test_rapid_fire_injection_attempts(
-        self, sql_injection_patterns, reset_query_history
+        self, _pool, sql_injection_patterns, reset_query_history
     ):
         """Test rapid-fire SQL injection attempts."""
         injection_queries = []
@@ -87,18 +109,16 @@ class TestSecurityStressTesting:
         start_time = time.time()
 
         def rapid_injection_test(query):
-            return _perform_additional_security_checks(query.upper(), query)
+            return _perform_additional_security_checks(query)
 
         # Execute injection attempts in rapid succession
-        with ThreadPoolExecutor(max_workers=20) as executor:
-            futures = [
-                executor.submit(rapid_injection_test, query)
-                for query in injection_queries
-            ]
+        futures = [
+            _pool(20).submit(rapid_injection_test, query) for query in injection_queries
+        ]
 
-            for future in as_completed(futures):
-                result = future.result()
-                results.append(result)
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
 
         end_time = time.time()
 
@@ -111,7 +131,7 @@ class TestSecurityStressTesting:
             "Security validation took too long under load"
         )
 
-    def test_rate_limit_stress_test(self, reset_query_history):
+    def test_rate_limit_stress_test(self, _pool, reset_query_history):
         """Test rate limiting under extreme load."""
         query_count = _MAX_QUERIES_PER_MINUTE * 3  # 3x the limit
 
@@ -124,17 +144,16 @@ class TestSecurityStressTesting:
             return result
 
         # Execute queries rapidly
-        with ThreadPoolExecutor(max_workers=50) as executor:
-            futures = [executor.submit(stress_query) for _ in range(query_count)]
+        futures = [_pool(50).submit(stress_query) for _ in range(query_count)]
 
-            for future in as_completed(futures):
-                result = future.result()
-                results.append(result)
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
 
-                if not result["error"]:
-                    successful_queries += 1
-                else:
-                    rate_limited_queries += 1
+            if not result["error"]:
+                successful_queries += 1
+            else:
+                rate_limited_queries += 1
 
         # Verify rate limiting is working
         assert successful_queries <= _MAX_QUERIES_PER_MINUTE, "Rate limit was exceeded"
@@ -144,6 +163,7 @@ class TestSecurityStressTesting:
 
 @pytest.mark.security
 @pytest.mark.slow
+@security_stress_group
 class TestLargeScaleSecurityValidation:
     """Large-scale security validation tests."""
 
@@ -153,13 +173,16 @@ class TestLargeScaleSecurityValidation:
         for category, attacks in advanced_attack_patterns.items():
             all_attacks.extend(attacks)
 
-        # Multiply attacks to create a large test set
-        large_attack_set = all_attacks * 100  # 500+ malicious queries
+        # Repeat attacks lazily to create a large test set without copying it
+        repetitions = 100
+        large_attack_count = len(all_attacks) * repetitions  # 500+ malicious queries
 
         start_time = time.time()
         results = []
 
-        for attack in large_attack_set:
+        for attack in itertools.chain.from_iterable(
+            itertools.repeat(all_attacks, repetitions)
+        ):
             result = _validate_query_safety(attack, 1000)
             results.append(result)
 
@@ -167,39 +190,41 @@ class TestLargeScaleSecurityValidation:
         processing_time = end_time - start_time
 
         # Performance validation
-        queries_per_second = len(large_attack_set) / processing_time
+        queries_per_second = large_attack_count / processing_time
         assert queries_per_second > 10, (
             f"Security validation too slow: {queries_per_second} queries/sec"
         )
 
         # Security validation
         blocked_attacks = [r for r in results if r["error"]]
-        assert len(blocked_attacks) > len(large_attack_set) * 0.8, (
+        assert len(blocked_attacks) > large_attack_count * 0.8, (
             "Not enough attacks were blocked"
         )
 
     def test_memory_usage_under_attack_load(self, real_world_attack_scenarios):
         """Test memory usage doesn't grow excessively under attack load."""
-        import psutil
-        import os
+        import tracemalloc
 
-        process = psutil.Process(os.getpid())
-        initial_memory = process.memory_info().rss / 1024 / 1024  # MB
+        # Trace only Python allocations made by the attack workload
+        tracemalloc.start()
+        try:
+            # Execute many attack scenarios
+            for scenario_type, attacks in real_world_attack_scenarios.items():
+                for _ in range(50):  # Repeat each scenario 50 times
+                    for attack in attacks:
+                        try:
+                            execute_query(attack)
+                        except Exception:
+                            pass  # Expected for malicious queries
 
-        # Execute many attack scenarios
-        for scenario_type, attacks in real_world_attack_scenarios.items():
-            for _ in range(50):  # Repeat each scenario 50 times
-                for attack in attacks:
-                    try:
-                        execute_query(attack)
-                    except Exception:
-                        pass  # Expected for malicious queries
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
 
-        final_memory = process.memory_info().rss / 1024 / 1024  # MB
-        memory_growth = final_memory - initial_memory
+        memory_growth = peak / 1024 / 1024  # MB
 
-        # Memory growth should be reasonable (less than 100MB)
-        assert memory_growth < 100, f"Excessive memory growth: {memory_growth}MB"
+        # Peak traced memory should be small (less than 20MB)
+        assert memory_growth < 20, f"Excessive memory growth: {memory_growth:.2f}MB"
 
 
 @pytest.mark.security
@@ -214,16 +239,16 @@ class TestExtremeEdgeCases:
         extreme_queries = [
             base_attack + " AND col = 'value'" * 1000,  # Very long query
             "SELECT "
-            + ", ".join([f"malicious_col_{i}" for i in range(10000)])
+            + ", ".join(map("malicious_col_{}".format, range(10000)))
             + " FROM users",
             (
                 "SELECT * FROM users WHERE "
-                + " OR ".join([f"col_{i} = 'malicious_{i}'" for i in range(1000)])
+                + " OR ".join(f"col_{i} = 'malicious_{i}'" for i in range(1000))
             ),
         ]
 
         for query in extreme_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
+            result = _perform_additional_security_checks(query)
             assert result["error"], f"Failed to handle extreme query: {query[:100]}..."
             # Accept either "too long" or "malicious pattern" - both are valid security blocks
             assert any(
@@ -234,16 +259,16 @@ class TestExtremeEdgeCases:
     def test_deeply_nested_malicious_structures(self):
         """Test handling of deeply nested malicious query structures."""
         # Create deeply nested malicious queries
-        nested_injection = "SELECT * FROM users WHERE id IN ("
+        buffer = io.StringIO()
+        buffer.write("SELECT * FROM users WHERE id IN (")
         for i in range(100):
-            nested_injection += (
+            buffer.write(
                 f"SELECT id FROM table_{i} WHERE malicious_col = 'evil' AND id IN ("
             )
-        nested_injection += "'1'" + ")" * 101
+        buffer.write("'1'" + ")" * 101)
+        nested_injection = buffer.getvalue()
 
-        result = _perform_additional_security_checks(
-            nested_injection.upper(), nested_injection
-        )
+        result = _perform_additional_security_checks(nested_injection)
         assert result["error"]
         assert any(
             keyword in result["message"].lower()
@@ -259,7 +284,7 @@ class TestExtremeEdgeCases:
     def test_unicode_normalization_attacks(self, unicode_attack_vectors):
         """Test Unicode normalization attack detection."""
         for attack in unicode_attack_vectors:
-            _perform_additional_security_checks(attack.upper(), attack)
+            _perform_additional_security_checks(attack)
             # Should detect dangerous patterns even with Unicode obfuscation
             if any(pattern in attack for pattern in ["OR", "AND", "DROP", "DELETE"]):
                 # May or may not be blocked depending on Unicode handling
@@ -299,7 +324,7 @@ class TestSecurityBypassAttempts:
         ]
 
         for attack in sophisticated_attacks:
-            result = _perform_additional_security_checks(attack.upper(), attack)
+            result = _perform_additional_security_checks(attack)
             # Advanced attacks should be detected
             if any(
                 dangerous in attack.upper() for dangerous in ["OR", "UNION", "DROP"]
@@ -319,7 +344,7 @@ class TestSecurityBypassAttempts:
         # Test malicious timing attacks
         for bypass in malicious_timing_bypasses:
             start_time = time.time()
-            result = _perform_additional_security_checks(bypass.upper(), bypass)
+            result = _perform_additional_security_checks(bypass)
             end_time = time.time()
 
             # Validation should be fast regardless of query complexity
@@ -329,9 +354,7 @@ class TestSecurityBypassAttempts:
             assert result["error"], f"Failed to detect timing attack: {bypass}"
 
         # Test that legitimate subqueries are allowed
-        result = _perform_additional_security_checks(
-            legitimate_subquery.upper(), legitimate_subquery
-        )
+        result = _perform_additional_security_checks(legitimate_subquery)
         # Legitimate subqueries should pass (this is actually a valid query pattern)
         # We'll just check it executes quickly
         assert isinstance(result, dict), "Security check should return a result"
@@ -372,12 +395,14 @@ class TestComprehensiveSecurityAudit:
     def test_security_coverage_completeness(self, advanced_attack_patterns):
         """Test that security validation covers all known attack categories."""
         coverage_results = {}
+        all_results = []
 
         for category, attacks in advanced_attack_patterns.items():
             category_results = []
             for attack in attacks:
                 result = _validate_query_safety(attack, 1000)
                 category_results.append(result["error"])
+            all_results.extend(category_results)
 
             # Calculate coverage percentage for each category
             blocked_count = sum(category_results)
@@ -403,14 +428,9 @@ class TestComprehensiveSecurityAudit:
                 f"Low security coverage for {category}: {coverage}% (threshold: {threshold}%)"
             )
 
-        # Overall coverage should be very high
-        total_attacks = sum(
-            len(attacks) for attacks in advanced_attack_patterns.values()
-        )
-        total_blocked = sum(
-            len([r for r in attacks if _validate_query_safety(r, 1000)["error"]])
-            for attacks in advanced_attack_patterns.values()
-        )
+        # Overall coverage should be very high (reuses the per-category results)
+        total_attacks = len(all_results)
+        total_blocked = sum(all_results)
         overall_coverage = (total_blocked / total_attacks) * 100
         assert overall_coverage >= 83, (
             f"Overall security coverage too low: {overall_coverage}%"
@@ -459,11 +479,16 @@ class TestComprehensiveSecurityAudit:
 
 @pytest.mark.security
 @pytest.mark.slow
+@security_stress_group
 class TestSecurityPerformanceUnderLoad:
     """Test security performance under various load conditions."""
 
     def test_security_validation_scalability(self):
-        """Test security validation performance scales with load."""
+        """Test security validation performance scales with load.
+
+        Measures the uncached checks; repeated memoized lookups would only
+        time the LRU cache.
+        """
         query_counts = [10, 50, 100, 500]
         performance_results = {}
 
@@ -473,7 +498,7 @@ class TestSecurityPerformanceUnderLoad:
             start_time = time.time()
 
             for _ in range(count):
-                _perform_additional_security_checks(test_query.upper(), test_query)
+                _run_security_checks(test_query)
 
             end_time = time.time()
             total_time = end_time - start_time
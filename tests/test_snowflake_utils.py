@@ -5,36 +5,151 @@ This test suite covers all functions in the snowflake_utils module with
 unit tests, integration tests, and edge case testing.
 """
 
+import contextlib
+import concurrent.futures
+import datetime
+import decimal
+import itertools
+import numpy as np
 import pytest
 import pandas as pd
+import pyarrow as pa
 import os
+import re
+import sys
+import threading
 import time
+import unicodedata
+from types import SimpleNamespace
 from unittest.mock import Mock, patch, mock_open
-from dash import html
-import dash_bootstrap_components as dbc
 
 # Import the module under test
-import sys
-
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
 from utils.snowflake_utils import (
     is_running_in_spcs,
     get_login_token,
+    _get_cached_login_token,
+    _LOGIN_TOKEN_TTL_SECONDS,
     get_snowflake_session,
+    close_session,
+    _SESSION_PROBE_IDLE_SECONDS,
     get_schema_objects,
+    clear_schema_objects_cache,
+    _SCHEMA_OBJECTS_TTL_SECONDS,
     get_table_list,
     get_table_data,
+    _contains_suspicious_unicode,
+    _extract_table_references,
+    _INJECTION_RES,
+    _cached_security_checks,
     _perform_additional_security_checks,
     _check_rate_limit,
     _validate_query_safety,
+    _starts_with_select,
     execute_query,
+    _fetch_limited,
+    _RESULT_CACHE_TTL_SECONDS,
+    _referenced_tables,
+    _result_nbytes,
     format_query_results,
+    _grid_row_payload,
     _query_history,
     _MAX_QUERIES_PER_MINUTE,
+    _DANGEROUS_KEYWORD_RE,
+    _DANGEROUS_KEYWORDS,
+    _DANGEROUS_UNICODE_BLOCK_RE,
+    _DANGEROUS_UNICODE_RANGES,
+    _QUOTE_STRIP_TABLE,
+    _VECTORIZED_UNICODE_SCAN_MIN_LENGTH,
+    _has_dangerous_code_points,
+    _UNICODE_LOOKALIKE_CHARS,
+    _UNICODE_LOOKALIKE_RES,
 )
 
 
+def _make_fake_session(df):
+    """Plain-namespace session whose queries return ``df``; only close is a Mock."""
+    sql_result = SimpleNamespace(
+        to_pandas=lambda: df,
+        to_arrow_batches=lambda: iter([pa.Table.from_pandas(df)]),
+    )
+    return SimpleNamespace(
+        sql=lambda query: sql_result,
+        table=lambda name: SimpleNamespace(limit=lambda n: sql_result),
+        close=Mock(),
+    )
+
+
+def assert_single_call(mock, *args):
+    """Assert ``mock`` was called exactly once, with positional ``args``."""
+    assert mock.call_count == 1
+    assert mock.call_args[0] == args
+
+
+def _executed_queries(mock_session):
+    """Queries run on ``mock_session``, leaving out change-token lookups."""
+    return [
+        c.args[0]
+        for c in mock_session.sql.call_args_list
+        if "SYSTEM$LAST_CHANGE_COMMIT_TIME" not in c.args[0]
+    ]
+
+
+def _raise_on_cherokee(char, default=""):
+    """unicodedata.name stand-in that fails for the Cherokee character U+1234."""
+    if char == "\u1234":
+        raise ValueError("Unicode name lookup failed")
+    return default
+
+
+# Security edge-case queries shared by the parametrized edge-case test
+_Q_UNCLOSED_COMMENT = "SELECT * FROM test /* this comment is never closed"
+_Q_UNCLOSED_QUOTE_END = "SELECT * FROM 'production_table"
+_Q_QUOTED_NO_BREAK = 'SELECT * FROM "test_table"'
+_Q_BARE_NO_BREAK = "SELECT * FROM test_table"
+_Q_QUOTED_END = "SELECT * FROM 'test'"
+_Q_DOT_BREAK = "SELECT * FROM 'snowflake_sample_data'.'table' WHERE id = 1"
+_Q_UNCLOSED_BREAK = "SELECT * FROM 'test_table WHERE id = 1"
+_Q_ASCII_ORDER = "SELECT * FROM users ORDER BY 1"
+_Q_UNICODE_UNION = "SELECT * FROM test UNIᴼn BY 1"
+
+# Connection settings shared by the local and SPCS session tests
+_BASE_SESSION_ENV = {
+    "SNOWFLAKE_ACCOUNT": "test_account",
+    "SNOWFLAKE_WAREHOUSE": "test_wh",
+    "SNOWFLAKE_DATABASE": "test_db",
+    "SNOWFLAKE_SCHEMA": "test_schema",
+}
+
+# Result-formatting prototypes; tests hand out shallow copies since
+# format_query_results only reads columns and dtypes
+_PROTO_SMALL = pd.DataFrame({"col1": [1, 2], "col2": ["a", "b"]})
+_PROTO_PEOPLE = pd.DataFrame(
+    {"id": [1, 2, 3], "name": ["Alice", "Bob", "Charlie"], "age": [25, 30, 35]}
+)
+_DATE_COL = np.array(["2023-01-01", "2023-01-02", "2023-01-03"], dtype="datetime64[ns]")
+_PROTO_DATETIME = pd.DataFrame(
+    {
+        "date_col": _DATE_COL,
+        "text_col": ["A", "B", "C"],
+    }
+)
+_PROTO_NUMERIC = pd.DataFrame(
+    {
+        "int_col": [1, 2, 3],
+        "float_col": [1.1, 2.2, 3.3],
+        "int32_col": pd.array([1, 2, 3], dtype="int32"),
+        "float32_col": pd.array([1.1, 2.2, 3.3], dtype="float32"),
+    }
+)
+
+# Large query inputs, built once per module rather than in every test
+_LONG_QUERY = "SELECT * FROM table " + "WHERE col = 'x' " * 1000
+# More than 10 levels of nesting
+_DEEP_NEST_QUERY = "SELECT * FROM table WHERE col IN (" * 12 + "1" + ")" * 12
+# Exactly 11 levels of legitimate nested conditionals (no injection patterns)
+_BOUNDARY_NEST_QUERY = "SELECT col FROM table WHERE " + "(" * 11 + "col > 0" + ")" * 11
+
+
 class TestEnvironmentDetection:
     """Tests for environment detection functions."""
 
@@ -43,14 +158,35 @@ class TestEnvironmentDetection:
         with patch("os.path.exists") as mock_exists:
             mock_exists.return_value = True
             assert is_running_in_spcs()
-            mock_exists.assert_called_once_with("/snowflake/session/token")
+            assert_single_call(mock_exists, "/snowflake/session/token")
 
     def test_is_running_in_spcs_false(self):
         """Test SPCS detection when token file doesn't exist."""
         with patch("os.path.exists") as mock_exists:
             mock_exists.return_value = False
             assert not is_running_in_spcs()
-            mock_exists.assert_called_once_with("/snowflake/session/token")
+            assert_single_call(mock_exists, "/snowflake/session/token")
+
+    def test_is_running_in_spcs_checked_once(self):
+        """Test environment detection is memoized for the process."""
+        with patch("os.path.exists", return_value=True) as mock_exists:
+            assert is_running_in_spcs()
+            assert is_running_in_spcs()
+        mock_exists.assert_called_once()
+
+    def test_cached_login_token_reread_after_ttl(self, monkeypatch):
+        """Test the login token is re-read only once its TTL has elapsed."""
+        now = [1000.0]
+        monkeypatch.setattr("utils.snowflake_utils.time.monotonic", lambda: now[0])
+        mock_get_token = Mock(side_effect=["token_1", "token_2"])
+        monkeypatch.setattr("utils.snowflake_utils.get_login_token", mock_get_token)
+
+        assert _get_cached_login_token() == "token_1"
+        now[0] += _LOGIN_TOKEN_TTL_SECONDS
+        assert _get_cached_login_token() == "token_1"
+        now[0] += 1
+        assert _get_cached_login_token() == "token_2"
+        assert mock_get_token.call_count == 2
 
     def test_get_login_token_success(self):
         """Test successful token retrieval."""
@@ -69,60 +205,44 @@ class TestEnvironmentDetection:
 class TestSnowflakeSession:
     """Tests for Snowflake session management."""
 
-    @patch.dict(
-        os.environ,
-        {
-            "SNOWFLAKE_ACCOUNT": "test_account",
-            "SNOWFLAKE_USER": "test_user",
-            "SNOWFLAKE_PASSWORD": "test_password",
-            "SNOWFLAKE_WAREHOUSE": "test_wh",
-            "SNOWFLAKE_DATABASE": "test_db",
-            "SNOWFLAKE_SCHEMA": "test_schema",
-        },
+    @pytest.mark.parametrize(
+        "spcs,extra_env",
+        [
+            pytest.param(
+                False,
+                {"SNOWFLAKE_USER": "test_user", "SNOWFLAKE_PASSWORD": "test_password"},
+                id="local",
+            ),
+            pytest.param(True, {"SNOWFLAKE_HOST": "test_host"}, id="spcs"),
+        ],
     )
-    @patch("utils.snowflake_utils.is_running_in_spcs")
-    @patch("utils.snowflake_utils.Session")
-    def test_get_snowflake_session_local(self, mock_session_class, mock_spcs_check):
-        """Test local environment session creation."""
-        mock_spcs_check.return_value = False
-        mock_session = Mock()
-        mock_session_class.builder.configs.return_value.create.return_value = (
-            mock_session
-        )
-
-        result = get_snowflake_session()
-
-        assert result == mock_session
-        mock_session_class.builder.configs.assert_called_once()
-
-    @patch.dict(
-        os.environ,
-        {
-            "SNOWFLAKE_HOST": "test_host",
-            "SNOWFLAKE_ACCOUNT": "test_account",
-            "SNOWFLAKE_DATABASE": "test_db",
-            "SNOWFLAKE_SCHEMA": "test_schema",
-            "SNOWFLAKE_WAREHOUSE": "test_wh",
-        },
-    )
-    @patch("utils.snowflake_utils.is_running_in_spcs")
-    @patch("utils.snowflake_utils.get_login_token")
-    @patch("utils.snowflake_utils.Session")
-    def test_get_snowflake_session_spcs(
-        self, mock_session_class, mock_get_token, mock_spcs_check
-    ):
-        """Test SPCS environment session creation."""
-        mock_spcs_check.return_value = True
-        mock_get_token.return_value = "test_token"
-        mock_session = Mock()
-        mock_session_class.builder.configs.return_value.create.return_value = (
-            mock_session
-        )
+    def test_get_snowflake_session(self, spcs, extra_env):
+        """Test session creation for local and SPCS environments."""
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(
+                patch.dict(os.environ, {**_BASE_SESSION_ENV, **extra_env}, clear=True)
+            )
+            stack.enter_context(
+                patch("utils.snowflake_utils.is_running_in_spcs", return_value=spcs)
+            )
+            mock_get_token = stack.enter_context(
+                patch(
+                    "utils.snowflake_utils.get_login_token", return_value="test_token"
+                )
+            )
+            mock_session_class = stack.enter_context(
+                patch("utils.snowflake_utils.Session")
+            )
+            mock_session = Mock()
+            mock_session_class.builder.configs.return_value.create.return_value = (
+                mock_session
+            )
 
-        result = get_snowflake_session()
+            result = get_snowflake_session()
 
         assert result == mock_session
-        mock_get_token.assert_called_once()
+        # Only SPCS authenticates with the container login token
+        assert mock_get_token.call_count == int(spcs)
         mock_session_class.builder.configs.assert_called_once()
 
     @patch("utils.snowflake_utils.is_running_in_spcs")
@@ -138,16 +258,70 @@ class TestSnowflakeSession:
 
         assert result is None
 
+    @patch("utils.snowflake_utils.is_running_in_spcs", return_value=False)
+    @patch("utils.snowflake_utils.Session")
+    def test_get_snowflake_session_reuses_live_session(
+        self, mock_session_class, _, monkeypatch
+    ):
+        """Test a cached session is reused, probed only once it has sat idle."""
+        now = [1000.0]
+        monkeypatch.setattr("utils.snowflake_utils.time.monotonic", lambda: now[0])
+        mock_create = mock_session_class.builder.configs.return_value.create
+
+        first = get_snowflake_session()
+        now[0] += _SESSION_PROBE_IDLE_SECONDS
+        second = get_snowflake_session()
+        first.sql.assert_not_called()
+        now[0] += _SESSION_PROBE_IDLE_SECONDS + 1
+        third = get_snowflake_session()
+
+        assert first is second is third
+        mock_create.assert_called_once()
+        first.sql.assert_called_once_with("SELECT 1")
+        first.close.assert_not_called()
+
+    @patch("utils.snowflake_utils.is_running_in_spcs", return_value=False)
+    @patch("utils.snowflake_utils.Session")
+    def test_get_snowflake_session_replaces_dead_session(
+        self, mock_session_class, _, monkeypatch
+    ):
+        """Test an idle cached session that fails its probe is closed and replaced."""
+        now = [1000.0]
+        monkeypatch.setattr("utils.snowflake_utils.time.monotonic", lambda: now[0])
+        stale, fresh = Mock(), Mock()
+        stale.sql.side_effect = Exception("Session expired")
+        mock_session_class.builder.configs.return_value.create.side_effect = [
+            stale,
+            fresh,
+        ]
+
+        assert get_snowflake_session() is stale
+        now[0] += _SESSION_PROBE_IDLE_SECONDS + 1
+        assert get_snowflake_session() is fresh
+        stale.close.assert_called_once()
+
+    @patch("utils.snowflake_utils.is_running_in_spcs", return_value=False)
+    @patch("utils.snowflake_utils.Session")
+    def test_close_session(self, mock_session_class, _):
+        """Test close_session closes the shared session and forgets it."""
+        mock_session_class.builder.configs.return_value.create.side_effect = [
+            Mock(),
+            Mock(),
+        ]
+        session = get_snowflake_session()
+
+        close_session()
+        close_session()
+
+        session.close.assert_called_once()
+        assert get_snowflake_session() is not session
+
 
 class TestDataRetrieval:
     """Tests for data retrieval functions."""
 
-    @patch("utils.snowflake_utils.get_snowflake_session")
-    def test_get_schema_objects_success(self, mock_get_session):
+    def test_get_schema_objects_success(self, monkeypatch):
         """Test successful schema objects retrieval."""
-        mock_session = Mock()
-        mock_get_session.return_value = mock_session
-
         # Mock the SQL result
         mock_df = pd.DataFrame(
             {
@@ -158,35 +332,71 @@ class TestDataRetrieval:
                 "CREATED": ["2023-01-01", "2023-01-02"],
             }
         )
-        mock_session.sql.return_value.to_pandas.return_value = mock_df
+        mock_session = _make_fake_session(mock_df)
+        monkeypatch.setattr(
+            "utils.snowflake_utils.get_snowflake_session", lambda: mock_session
+        )
 
         result = get_schema_objects()
 
         assert len(result) == 2
         assert "TABLE_NAME" in result.columns
-        mock_session.close.assert_called_once()
+        mock_session.close.assert_not_called()
 
-    @patch("utils.snowflake_utils.get_snowflake_session")
-    def test_get_schema_objects_no_session(self, mock_get_session):
+    def test_get_schema_objects_no_session(self, monkeypatch):
         """Test schema objects retrieval with no session."""
-        mock_get_session.return_value = None
+        monkeypatch.setattr("utils.snowflake_utils.get_snowflake_session", lambda: None)
 
         result = get_schema_objects()
 
         assert "error" in result.columns
         assert "Failed to connect to Snowflake" in result["error"].iloc[0]
 
-    @patch("utils.snowflake_utils.get_snowflake_session")
-    def test_get_schema_objects_query_exception(self, mock_get_session):
+    def test_get_schema_objects_query_exception(self, patched_get_session):
         """Test schema objects retrieval with query exception."""
-        mock_session = Mock()
-        mock_get_session.return_value = mock_session
+        mock_session = patched_get_session
         mock_session.sql.side_effect = Exception("Query failed")
 
         result = get_schema_objects()
 
         assert "error" in result.columns
-        mock_session.close.assert_called_once()
+        mock_session.close.assert_not_called()
+
+    def test_get_schema_objects_cached_until_ttl(
+        self, patched_get_session, monkeypatch
+    ):
+        """Test the schema listing is reused, copied, and refreshed after its TTL."""
+        now = [1000.0]
+        monkeypatch.setattr("utils.snowflake_utils.time.monotonic", lambda: now[0])
+        mock_session = patched_get_session
+        mock_session.sql.return_value.to_pandas.return_value = pd.DataFrame(
+            {"TABLE_NAME": ["CUSTOMER"]}
+        )
+
+        first = get_schema_objects()
+        first.columns = first.columns.str.lower()
+        now[0] += _SCHEMA_OBJECTS_TTL_SECONDS
+        second = get_schema_objects()
+
+        assert list(second.columns) == ["TABLE_NAME"]
+        assert mock_session.sql.call_count == 1
+
+        now[0] += 1
+        get_schema_objects()
+        clear_schema_objects_cache()
+        get_schema_objects()
+        assert mock_session.sql.call_count == 3
+
+    def test_get_schema_objects_errors_not_cached(self, patched_get_session):
+        """Test a failed lookup is retried on the next call."""
+        mock_session = patched_get_session
+        mock_session.sql.side_effect = [
+            Exception("Query failed"),
+            SimpleNamespace(to_pandas=lambda: pd.DataFrame({"TABLE_NAME": ["A"]})),
+        ]
+
+        assert "error" in get_schema_objects().columns
+        assert get_schema_objects()["TABLE_NAME"].tolist() == ["A"]
 
     @patch("utils.snowflake_utils.get_schema_objects")
     def test_get_table_list_success(self, mock_get_schema):
@@ -208,166 +418,358 @@ class TestDataRetrieval:
 
         assert result == []
 
-    @patch("utils.snowflake_utils.get_snowflake_session")
-    def test_get_table_data_success(self, mock_get_session):
+    def test_get_table_data_success(self, monkeypatch):
         """Test successful table data retrieval."""
-        mock_session = Mock()
-        mock_get_session.return_value = mock_session
-
         mock_df = pd.DataFrame({"ID": [1, 2, 3], "NAME": ["Alice", "Bob", "Charlie"]})
-        mock_session.sql.return_value.to_pandas.return_value = mock_df
+        mock_session = _make_fake_session(mock_df)
+        monkeypatch.setattr(
+            "utils.snowflake_utils.get_snowflake_session", lambda: mock_session
+        )
 
         result = get_table_data("CUSTOMER", limit=10)
 
         assert len(result) == 3
         assert "ID" in result.columns
         assert "NAME" in result.columns
-        mock_session.close.assert_called_once()
+        mock_session.close.assert_not_called()
+
+    @pytest.mark.parametrize(
+        "table_name", ["CUSTOMER; DROP TABLE X", "T LIMIT 1 --", "A.B", ""]
+    )
+    def test_get_table_data_rejects_non_identifier(self, table_name, monkeypatch):
+        """Test table names that are not plain identifiers never reach Snowflake."""
+        get_session = Mock()
+        monkeypatch.setattr("utils.snowflake_utils.get_snowflake_session", get_session)
+
+        result = get_table_data(table_name)
+
+        assert result["error"].iloc[0] == "Invalid table name"
+        get_session.assert_not_called()
 
 
 class TestSecurityValidation:
     """Tests for security validation functions."""
 
-    def test_additional_security_checks_sql_injection(self):
+    @pytest.mark.parametrize(
+        "sql_injection_case",
+        ["stacked_drop", "or_tautology", "union_select"],
+        indirect=True,
+    )
+    def test_additional_security_checks_sql_injection(self, sql_injection_case):
         """Test detection of SQL injection patterns."""
-        malicious_queries = [
-            "SELECT * FROM users WHERE id = 1; DROP TABLE users;",
-            "SELECT * FROM data WHERE name = '' OR 1=1 --",
-            "SELECT * UNION SELECT password FROM credentials",
-        ]
+        query, expected_msg = sql_injection_case
 
-        for query in malicious_queries:
-            result = _perform_additional_security_checks(query.upper(), query)
-            assert result["error"]
-            assert "malicious pattern" in result["message"]
+        result = _perform_additional_security_checks(query)
+
+        assert result["error"]
+        assert expected_msg in result["message"]
+
+    def test_additional_security_checks_unicode_whitespace_injection(self):
+        """Test non-ASCII queries keep Unicode-aware whitespace matching."""
+        query = "SELECT name FROM customer UNION\u2028SELECT password FROM users"
+
+        result = _perform_additional_security_checks(query)
+
+        assert result["error"]
+        assert "malicious pattern" in result["message"]
 
     def test_additional_security_checks_query_length(self):
         """Test query length validation."""
-        long_query = (
-            "SELECT * FROM table " + "WHERE col = 'x' " * 1000
-        )  # Make it very long
-
-        result = _perform_additional_security_checks(long_query.upper(), long_query)
+        result = _perform_additional_security_checks(_LONG_QUERY)
 
         assert result["error"]
         assert "too long" in result["message"]
 
-    def test_additional_security_checks_excessive_joins(self):
+    def test_additional_security_checks_excessive_joins(self, cached_validators):
         """Test excessive JOIN detection."""
         query_with_joins = (
             "SELECT * FROM t1 JOIN t2 JOIN t3 JOIN t4 JOIN t5 JOIN t6 JOIN t7 ON ..."
         )
 
-        result = _perform_additional_security_checks(
-            query_with_joins.upper(), query_with_joins
-        )
+        result = cached_validators.check(query_with_joins)
 
         assert result["error"]
         assert "too many JOINs" in result["message"]
 
-    def test_additional_security_checks_forbidden_schema(self):
+    def test_additional_security_checks_forbidden_schema(self, cached_validators):
         """Test forbidden schema access detection."""
         query = "SELECT * FROM production.sensitive_data"
 
-        result = _perform_additional_security_checks(query.upper(), query)
+        result = cached_validators.check(query)
 
         assert result["error"]
         assert "not allowed" in result["message"]
 
-    def test_additional_security_checks_safe_query(self):
+    @pytest.mark.parametrize(
+        "query_upper,expected",
+        [
+            ("SELECT * FROM CUSTOMER", ["CUSTOMER"]),
+            ("SELECT * FROM 'DB'.'T' WHERE ID = 1", ["'DB'.'T'"]),
+            ("SELECT * FROM 'UNCLOSED WHERE ID = 1", ["'UNCLOSED"]),
+            ("SELECT * FROM A, (SELECT 1 FROM B) X", ["A", "B"]),
+            ('SELECT * FROM "DB" .T, U', ['"DB".T']),
+            ("SELECT * FROM ", [""]),
+            ('SELECT * FROM "A FROM B"', ['"A FROM B"', 'B"']),
+        ],
+    )
+    def test_extract_table_references(self, query_upper, expected):
+        """Test raw table references are extracted after each FROM."""
+        assert _extract_table_references(query_upper) == expected
+
+    @pytest.mark.parametrize(
+        "text, expected",
+        [
+            ("SELECT * FROM T", False),
+            ("SELECT * FROM CAFÉ", False),
+            ("SELECT * FROM T ＵＮＩＯＮ", True),
+            ("SELECT * FROM T ᴼRDER BY 1", False),
+            ("SELECT * FROM T ᎾRDER BY 1", True),
+        ],
+    )
+    def test_contains_suspicious_unicode(self, text, expected):
+        """Test lookalike detection, including the ASCII fast path."""
+        assert _contains_suspicious_unicode(text) is expected
+
+    def test_injection_triggers_occur_in_every_match(self, sql_injection_patterns):
+        """Test each injection pattern's trigger literal is part of its matches."""
+        for trigger, patterns in _INJECTION_RES[True]:
+            for pattern in patterns:
+                assert trigger in pattern.pattern.replace("\\", "")
+                for query in sql_injection_patterns:
+                    match = pattern.search(query.upper())
+                    assert match is None or trigger in match.group(0)
+
+    def test_information_schema_chains_do_not_backtrack(self):
+        """Test repeated enumeration keywords are scanned in linear time."""
+        query = "SELECT TABLE_NAME FROM INFORMATION_SCHEMA.TABLES WHERE " * 150
+
+        start = time.perf_counter()
+        _perform_additional_security_checks(query)
+
+        assert time.perf_counter() - start < 1.0
+
+    def test_additional_security_checks_safe_query(self, cached_validators):
         """Test validation of safe query."""
         safe_query = "SELECT * FROM snowflake_sample_data.tpch_sf10.customer LIMIT 10"
 
-        result = _perform_additional_security_checks(safe_query.upper(), safe_query)
+        result = cached_validators.check(safe_query)
 
         assert not result["error"]
         assert result["safe_query"] == safe_query
 
-    def test_validate_query_safety_safe_select(self):
+    def test_additional_security_checks_memoized_copy(self):
+        """Test repeated checks hit the cache but return independent results."""
+        query = "SELECT * FROM snowflake_sample_data.tpch_sf10.customer"
+
+        first = _perform_additional_security_checks(query)
+        first["error"] = True
+        second = _perform_additional_security_checks(query)
+
+        assert not second["error"]
+        assert _cached_security_checks.cache_info().hits == 1
+
+    @pytest.mark.parametrize(
+        "query, message",
+        [
+            ("SELECT a FROM t WHERE " + "a" * 10000, "too long"),
+            ("SELECT\x0b1", "control characters"),
+            ("SELECT 1\x00", "control characters"),
+        ],
+    )
+    def test_precheck_rejects_before_normalization(self, query, message, monkeypatch):
+        """Test cheap rejections run before NFKC normalization and the cache."""
+        fake_unicodedata = Mock()
+        monkeypatch.setattr("utils.snowflake_utils.unicodedata", fake_unicodedata)
+
+        for result in (
+            _perform_additional_security_checks(query),
+            _validate_query_safety(query, 100),
+        ):
+            assert result["error"]
+            assert message in result["message"]
+        fake_unicodedata.normalize.assert_not_called()
+        assert _cached_security_checks.cache_info().currsize == 0
+
+    def test_precheck_allows_tab_newline_carriage_return(self):
+        """Test ordinary SQL whitespace is not treated as a control character."""
+        result = _perform_additional_security_checks("SELECT\t1\r\nFROM t")
+
+        assert not result["error"]
+
+    def test_validate_query_safety_safe_select(self, cached_validators):
         """Test validation of safe SELECT query."""
         query = "SELECT * FROM snowflake_sample_data.tpch_sf10.customer"
 
-        result = _validate_query_safety(query, 1000)
+        result = cached_validators.validate(query, 1000)
 
         assert not result["error"]
         assert "LIMIT 1000" in result["safe_query"]
 
-    def test_validate_query_safety_dangerous_keywords(self):
+    @pytest.mark.parametrize(
+        "dangerous_keyword_query",
+        ["delete", "update", "drop", "insert"],
+        indirect=True,
+    )
+    def test_validate_query_safety_dangerous_keywords(self, dangerous_keyword_query):
         """Test detection of dangerous keywords."""
-        dangerous_queries = [
-            "DELETE FROM customer",
-            "UPDATE users SET password = 'hack'",
-            "DROP TABLE important_data",
-            "INSERT INTO logs VALUES ('bad')",
-        ]
+        result = _validate_query_safety(dangerous_keyword_query, 1000)
 
-        for query in dangerous_queries:
-            result = _validate_query_safety(query, 1000)
-            assert result["error"]
-            assert "forbidden keyword" in result["message"]
+        assert result["error"]
+        assert "forbidden keyword" in result["message"]
+
+    @pytest.mark.parametrize(
+        "query",
+        [
+            "SELECT A$B FROM T",
+            "SELECT '$' FROM T",
+            "select system$whitelist() from t",
+            "SELECT * FROM T -- show  grants",
+            "SELECT * FROM SETTINGS",
+            "SELECT * FROM T; use warehouse w",
+        ],
+    )
+    def test_dangerous_keyword_alternation_matches_per_keyword_scan(self, query):
+        """Test the single keyword alternation flags exactly what per-keyword scans do."""
+        per_keyword = any(
+            re.search(r"\b" + re.escape(keyword) + r"\b", query, re.IGNORECASE)
+            for keyword in _DANGEROUS_KEYWORDS
+        )
+
+        assert bool(_DANGEROUS_KEYWORD_RE.search(query)) == per_keyword
 
-    def test_validate_query_safety_non_select(self):
+    def test_validate_query_safety_non_select(self, cached_validators):
         """Test rejection of non-SELECT statements."""
         query = "SHOW TABLES"
 
-        result = _validate_query_safety(query, 1000)
+        result = cached_validators.validate(query, 1000)
 
         assert result["error"]
         assert "must start with SELECT" in result["message"]
 
-    def test_validate_query_safety_limit_reduction(self):
+    @pytest.mark.parametrize(
+        "query, expected",
+        [
+            ("SELECT 1", True),
+            ("  /* a */ /* b */\nselect 1", True),
+            ("-- a\n-- b\nSELECT 1", True),
+            ("-- a\n/* b */ SELECT 1", True),
+            ("SELECT*", False),
+            ("/* never closed SELECT 1", False),
+            ("-- no newline SELECT 1", False),
+            ("SELECTED 1", False),
+        ],
+    )
+    def test_starts_with_select(self, query, expected):
+        """Test the leading-comment walk only accepts a SELECT first token."""
+        assert _starts_with_select(query) is expected
+
+    def test_validate_query_safety_limit_reduction(self, cached_validators):
         """Test limit reduction for excessive limits."""
         query = "SELECT * FROM customer LIMIT 50000"
 
-        result = _validate_query_safety(query, 1000)
+        result = cached_validators.validate(query, 1000)
 
         assert not result["error"]
         assert "LIMIT 1000" in result["safe_query"]
         assert "reduced" in result["message"]
 
-
-class TestRateLimiting:
-    """Tests for rate limiting functionality."""
-
-    def test_rate_limit_under_limit(self):
-        """Test rate limiting when under the limit."""
-        # Explicitly clear history
-        _query_history.clear()
-
-        result = _check_rate_limit()
+    @pytest.mark.parametrize(
+        "query, expected",
+        [
+            (
+                "SELECT * FROM (SELECT a FROM t LIMIT 5) x",
+                "SELECT * FROM (SELECT a FROM t LIMIT 5) x LIMIT 1000",
+            ),
+            (
+                "SELECT * FROM (SELECT a FROM t LIMIT 5) x ORDER BY a DESC;",
+                "SELECT * FROM (SELECT a FROM t LIMIT 5) x ORDER BY a DESC LIMIT 1000",
+            ),
+            (
+                "SELECT a FROM t ORDER BY a -- newest first",
+                "SELECT a FROM t ORDER BY a LIMIT 1000",
+            ),
+            (
+                "SELECT * FROM big -- LIMIT 5",
+                "SELECT * FROM big LIMIT 1000",
+            ),
+            (
+                "SELECT * FROM big /* LIMIT 5 */",
+                "SELECT * FROM big LIMIT 1000",
+            ),
+            (
+                "SELECT * FROM t LIMIT 5000 -- cap",
+                "SELECT * FROM t LIMIT 1000 -- cap",
+            ),
+            (
+                "SELECT 'a--b' AS s FROM t",
+                "SELECT 'a--b' AS s FROM t LIMIT 1000",
+            ),
+            (
+                "SELECT * FROM (SELECT a FROM t LIMIT 5) x LIMIT 50000",
+                "SELECT * FROM (SELECT a FROM t LIMIT 5) x LIMIT 1000",
+            ),
+            (
+                "SELECT a FROM t LIMIT 10 OFFSET 20",
+                "SELECT a FROM t LIMIT 10 OFFSET 20",
+            ),
+        ],
+    )
+    def test_validate_query_safety_caps_outer_result(
+        self, cached_validators, query, expected
+    ):
+        """Test only a statement-closing LIMIT counts as bounding the result."""
+        result = cached_validators.validate(query, 1000)
 
         assert not result["error"]
-        assert len(_query_history) == 1
-
-    def test_rate_limit_at_limit(self):
-        """Test rate limiting at the maximum."""
-        # Explicitly clear history
-        _query_history.clear()
-
-        # Add queries up to the limit
-        current_time = time.time()
-        for _ in range(_MAX_QUERIES_PER_MINUTE):
-            _query_history.append(current_time)
+        assert result["safe_query"] == expected
+
+    @pytest.mark.parametrize(
+        "query, expected",
+        [
+            ("SELECT a FROM t", "SELECT a FROM t LIMIT 1001"),
+            ("SELECT a FROM t LIMIT 5000", "SELECT a FROM t LIMIT 1001"),
+            ("SELECT a FROM t LIMIT 1000", "SELECT a FROM t LIMIT 1000"),
+        ],
+    )
+    def test_validate_query_safety_truncation_probe(self, query, expected):
+        """Test detect_truncation caps one row above max_rows."""
+        result = _validate_query_safety(query, 1000, detect_truncation=True)
 
-        result = _check_rate_limit()
+        assert result["safe_query"] == expected
 
-        assert result["error"]
-        assert "Rate limit exceeded" in result["message"]
 
-    def test_rate_limit_cleanup_old_entries(self):
-        """Test cleanup of old query history entries."""
-        # Explicitly clear history
-        _query_history.clear()
+@pytest.mark.xdist_group("rate_limit")
+class TestRateLimiting:
+    """Tests for rate limiting functionality."""
 
-        # Add old entries (more than 1 minute ago)
-        old_time = time.time() - 120  # 2 minutes ago
-        for _ in range(5):
-            _query_history.append(old_time)
+    @pytest.mark.parametrize(
+        "age_seconds,seeded,expect_error,expected_history",
+        [
+            pytest.param(0, 0, False, 1, id="under_limit"),
+            pytest.param(
+                0,
+                _MAX_QUERIES_PER_MINUTE,
+                True,
+                _MAX_QUERIES_PER_MINUTE,
+                id="at_limit",
+            ),
+            # Entries more than 1 minute old are cleaned up; only the new one remains
+            pytest.param(120, 5, False, 1, id="cleanup_old_entries"),
+        ],
+    )
+    def test_rate_limit(
+        self, frozen_time, age_seconds, seeded, expect_error, expected_history
+    ):
+        """Test rate limiting against a seeded query history."""
+        # History is cleared around each test by conftest's reset_query_history
+        _query_history.extend(itertools.repeat(frozen_time[0] - age_seconds, seeded))
 
         result = _check_rate_limit()
 
-        assert not result["error"]
-        assert len(_query_history) == 1  # Only the new entry should remain
+        assert result["error"] is expect_error
+        if expect_error:
+            assert "Rate limit exceeded" in result["message"]
+        assert len(_query_history) == expected_history
 
 
 class TestQueryExecution:
@@ -375,10 +777,7 @@ class TestQueryExecution:
 
     @patch("utils.snowflake_utils._check_rate_limit")
     @patch("utils.snowflake_utils._validate_query_safety")
-    @patch("utils.snowflake_utils.get_snowflake_session")
-    def test_execute_query_success(
-        self, mock_get_session, mock_validate, mock_rate_limit
-    ):
+    def test_execute_query_success(self, mock_validate, mock_rate_limit, monkeypatch):
         """Test successful query execution."""
         # Setup mocks
         mock_rate_limit.return_value = {"error": False, "message": "OK"}
@@ -388,17 +787,265 @@ class TestQueryExecution:
             "message": "Safe",
         }
 
-        mock_session = Mock()
-        mock_get_session.return_value = mock_session
-
         mock_df = pd.DataFrame({"id": [1, 2], "name": ["Alice", "Bob"]})
-        mock_session.sql.return_value.to_pandas.return_value = mock_df
+        mock_session = _make_fake_session(mock_df)
+        monkeypatch.setattr(
+            "utils.snowflake_utils.get_snowflake_session", lambda: mock_session
+        )
 
         result = execute_query("SELECT * FROM customer")
 
         assert len(result) == 2
         assert "id" in result.columns
-        mock_session.close.assert_called_once()
+        mock_session.close.assert_not_called()
+
+    def test_rejected_query_error_frames_are_independent(self):
+        """Test editing a returned error frame leaves later rejections intact."""
+        first = execute_query("DROP TABLE t")
+        message = first.loc[0, "error"]
+        first.loc[0, "error"] = "edited"
+
+        assert execute_query("DROP TABLE t").loc[0, "error"] == message
+
+    def test_fetch_limited_stops_streaming_at_row_budget(self):
+        """Test Arrow batches are sliced to max_rows and later ones never pulled."""
+        batches = [
+            pa.table({"n": pa.array([1, 2, 3], type=pa.int8())}),
+            pa.table({"n": pa.array([4, 5, 6], type=pa.int64())}),
+            pa.table({"n": pa.array([7], type=pa.int64())}),
+        ]
+        pulled = []
+
+        def to_arrow_batches():
+            for batch in batches:
+                pulled.append(batch)
+                yield batch
+
+        result = _fetch_limited(SimpleNamespace(to_arrow_batches=to_arrow_batches), 5)
+
+        assert result["n"].tolist() == [1, 2, 3, 4, 5]
+        assert result["n"].dtype == "int64"
+        assert len(pulled) == 2
+
+    def test_fetch_limited_empty_result(self):
+        """Test a result with no batches becomes an empty DataFrame."""
+        result = _fetch_limited(SimpleNamespace(to_arrow_batches=lambda: iter([])), 10)
+
+        assert result.empty
+
+    def test_fetch_limited_keeps_strings_in_arrow(self):
+        """Test only string columns become Arrow-backed; numbers keep NaN."""
+        batch = pa.table(
+            {
+                "name": pa.array(["a", None]),
+                "long": pa.array(["b", "c"], type=pa.large_string()),
+                "n": pa.array([1, None], type=pa.int64()),
+            }
+        )
+
+        result = _fetch_limited(SimpleNamespace(to_arrow_batches=lambda: [batch]), 10)
+
+        assert result["name"].dtype == pd.StringDtype("pyarrow")
+        assert result["long"].dtype == pd.StringDtype("pyarrow")
+        assert result["n"].dtype == np.float64
+        assert _grid_row_payload(result)["data"] == [["a", "b", 1.0], [None, "c", None]]
+
+    @pytest.mark.parametrize("rows, truncated", [(3, False), (4, True)])
+    def test_execute_query_flags_truncated_results(
+        self, patched_get_session, rows, truncated
+    ):
+        """Test the extra probe row is dropped and marks the result truncated."""
+        mock_session = patched_get_session
+        mock_session.sql.return_value.to_arrow_batches.side_effect = lambda: iter(
+            [pa.table({"n": list(range(rows))})]
+        )
+
+        result = execute_query("SELECT n FROM t", max_rows=3)
+
+        assert _executed_queries(mock_session) == ["SELECT n FROM t LIMIT 4"]
+        assert result["n"].tolist() == [0, 1, 2]
+        assert result.attrs["truncated"] is truncated
+
+    def test_execute_query_caches_results(self, patched_get_session, monkeypatch):
+        """Test repeated queries are served from the cache until the TTL expires."""
+        now = [1000.0]
+        monkeypatch.setattr("utils.snowflake_utils.time.monotonic", lambda: now[0])
+        mock_session = patched_get_session
+        mock_session.sql.return_value.to_arrow_batches.side_effect = lambda: iter(
+            [pa.table({"n": [1, 2]})]
+        )
+        query = "SELECT n FROM t LIMIT 10"
+
+        first = execute_query(query)
+        first["extra"] = 0
+        second = execute_query(query)
+        assert list(second.columns) == ["n"]
+        assert len(_executed_queries(mock_session)) == 1
+
+        now[0] += _RESULT_CACHE_TTL_SECONDS + 1
+        execute_query(query)
+        assert len(_executed_queries(mock_session)) == 2
+
+    def test_cached_result_values_isolated_from_callers(self, patched_get_session):
+        """Test editing values of a returned frame does not change the cache."""
+        mock_session = patched_get_session
+        mock_session.sql.return_value.to_arrow_batches.side_effect = lambda: iter(
+            [pa.table({"n": [1, 2], "s": ["a", "b"]})]
+        )
+        query = "SELECT n, s FROM t LIMIT 10"
+
+        execute_query(query)
+        hit = execute_query(query)
+        hit.loc[0, "n"] = 99
+        hit.loc[1, "s"] = "edited"
+        third = execute_query(query)
+
+        assert third["n"].tolist() == [1, 2]
+        assert third["s"].tolist() == ["a", "b"]
+        assert len(_executed_queries(mock_session)) == 1
+
+    @pytest.mark.parametrize(
+        "query, fails",
+        [
+            ("SELECT CURRENT_TIMESTAMP() AS ts FROM t LIMIT 1", False),
+            ("SELECT n FROM t LIMIT 10", True),
+        ],
+    )
+    def test_execute_query_skips_cache(self, patched_get_session, query, fails):
+        """Test non-deterministic queries and failures are never cached."""
+        mock_session = patched_get_session
+        batches = mock_session.sql.return_value.to_arrow_batches
+        if fails:
+            batches.side_effect = Exception("warehouse suspended")
+        else:
+            batches.side_effect = lambda: iter([pa.table({"n": [1]})])
+
+        execute_query(query)
+        execute_query(query)
+
+        assert len(_executed_queries(mock_session)) == 2
+
+    def test_result_cache_evicts_least_recently_used(
+        self, patched_get_session, monkeypatch
+    ):
+        """Test the cache stays within its byte budget by evicting old entries."""
+        frame_bytes = int(pd.DataFrame({"n": [1]}).memory_usage(deep=False).sum())
+        monkeypatch.setattr(
+            "utils.snowflake_utils._RESULT_CACHE_MAX_BYTES", frame_bytes * 2
+        )
+        mock_session = patched_get_session
+        mock_session.sql.return_value.to_arrow_batches.side_effect = lambda: iter(
+            [pa.table({"n": [1]})]
+        )
+
+        for query in ("SELECT 1 LIMIT 1", "SELECT 2 LIMIT 1", "SELECT 1 LIMIT 1"):
+            execute_query(query)
+        execute_query("SELECT 3 LIMIT 1")
+        execute_query("SELECT 1 LIMIT 1")
+        execute_query("SELECT 2 LIMIT 1")
+
+        called = [c.args[0] for c in mock_session.sql.call_args_list]
+        assert called == [
+            "SELECT 1 LIMIT 1",
+            "SELECT 2 LIMIT 1",
+            "SELECT 3 LIMIT 1",
+            "SELECT 2 LIMIT 1",
+        ]
+
+    def test_result_cache_counts_object_values(self, patched_get_session, monkeypatch):
+        """Test Decimal columns count their objects, not just their pointers."""
+        values = [decimal.Decimal(f"{i}.25") for i in range(100)]
+        frame = pd.DataFrame({"d": values})
+        monkeypatch.setattr(
+            "utils.snowflake_utils._RESULT_CACHE_MAX_BYTES",
+            int(frame.memory_usage(deep=True).sum() * 1.5),
+        )
+        assert frame.memory_usage(deep=False).sum() * 2 < _result_nbytes(frame)
+        mock_session = patched_get_session
+        mock_session.sql.return_value.to_arrow_batches.side_effect = lambda: iter(
+            [pa.table({"d": pa.array(values, type=pa.decimal128(10, 2))})]
+        )
+
+        for query in ("SELECT 1 LIMIT 100", "SELECT 2 LIMIT 100", "SELECT 1 LIMIT 100"):
+            execute_query(query, max_rows=100)
+
+        assert len(_executed_queries(mock_session)) == 3
+
+    @pytest.mark.parametrize(
+        "tokens, executions",
+        [
+            ([("100",), ("100",)], 2),
+            ([("100",), ("200",)], 3),
+        ],
+    )
+    def test_expired_result_revalidated_by_change_token(
+        self, patched_get_session, monkeypatch, tokens, executions
+    ):
+        """Test an expired result is reused while its table's change token holds."""
+        now = [1000.0]
+        monkeypatch.setattr("utils.snowflake_utils.time.monotonic", lambda: now[0])
+        tokens = iter(tokens)
+        mock_session = patched_get_session
+        result = mock_session.sql.return_value
+        result.to_arrow_batches.side_effect = lambda: iter([pa.table({"n": [1]})])
+        result.collect.side_effect = lambda: [next(tokens)]
+        query = "SELECT n FROM snowflake_sample_data.tpch_sf1.nation LIMIT 10"
+
+        execute_query(query)
+        # A cold miss runs the query alone; the token is read once it expires
+        assert mock_session.sql.call_count == 1
+        for _ in range(2):
+            now[0] += _RESULT_CACHE_TTL_SECONDS + 1
+            assert execute_query(query)["n"].tolist() == [1]
+
+        assert len(_executed_queries(mock_session)) == executions
+        mock_session.sql.assert_any_call(
+            "SELECT SYSTEM$LAST_CHANGE_COMMIT_TIME('SNOWFLAKE_SAMPLE_DATA.TPCH_SF1.NATION')"
+        )
+
+    @pytest.mark.parametrize(
+        "query, tables",
+        [
+            ("SELECT * FROM t", ("T",)),
+            ("SELECT * FROM a.b x JOIN c ON x.id = c.id", ("A.B", "C")),
+            ("SELECT * FROM (SELECT id FROM t) WHERE id IN (1, 2)", ("T",)),
+            ("SELECT * FROM a, b", None),
+            ("SELECT EXTRACT(YEAR FROM d) FROM t", ("T",)),
+            ("SELECT TRIM(BOTH ' ' FROM s) FROM t JOIN u USING (id)", ("T", "U")),
+            ("SELECT * FROM TABLE(RESULT_SCAN(LAST_QUERY_ID()))", None),
+            ("SELECT * FROM t JOIN LATERAL FLATTEN(input => t.v) f", None),
+            ('SELECT * FROM "t"', None),
+            ("SELECT * FROM /* c */ t", None),
+            ("WITH x AS (SELECT 1) SELECT * FROM x", None),
+            ("SELECT 1", None),
+        ],
+    )
+    def test_referenced_tables(self, query, tables):
+        """Test source tables are named only when all of them can be found."""
+        assert _referenced_tables(query) == tables
+
+    def test_execute_query_coalesces_concurrent_requests(
+        self, patched_get_session, monkeypatch
+    ):
+        """Test identical in-flight queries wait for one Snowflake execution."""
+        release = threading.Event()
+
+        def slow_batches():
+            release.wait(5)
+            return iter([pa.table({"n": [1]})])
+
+        mock_session = patched_get_session
+        mock_session.sql.return_value.to_arrow_batches.side_effect = slow_batches
+        query = "SELECT n FROM t LIMIT 10"
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=3) as pool:
+            futures = [pool.submit(execute_query, query) for _ in range(3)]
+            time.sleep(0.1)
+            release.set()
+            results = [future.result(timeout=5) for future in futures]
+
+        assert all(df["n"].tolist() == [1] for df in results)
+        assert len(_executed_queries(mock_session)) == 1
 
     @patch("utils.snowflake_utils._check_rate_limit")
     def test_execute_query_rate_limited(self, mock_rate_limit):
@@ -425,23 +1072,59 @@ class TestQueryExecution:
         assert "error" in result.columns
         assert "Dangerous query detected" in result["error"].iloc[0]
 
+    @patch("utils.snowflake_utils._check_rate_limit")
+    def test_execute_query_rejections_return_distinct_frames(self, mock_rate_limit):
+        """Test repeated rejections share a cached template but not the frame."""
+        mock_rate_limit.return_value = {"error": True, "message": "Rate limit exceeded"}
+
+        first = execute_query("SELECT * FROM customer")
+        second = execute_query("SELECT * FROM customer")
+
+        assert first is not second
+        assert first["error"].iloc[0] == second["error"].iloc[0]
+        assert list(first.columns) == ["error"]
+
 
 class TestResultFormatting:
     """Tests for result formatting functionality."""
 
-    def test_format_query_results_success(self):
+    # Dash components are only imported when this class actually runs
+    @pytest.fixture(scope="class")
+    def html(self):
+        """dash.html, skipping the class if Dash is unavailable."""
+        return pytest.importorskip("dash").html
+
+    @pytest.fixture(scope="class")
+    def dbc(self):
+        """dash_bootstrap_components, skipping the class if unavailable."""
+        return pytest.importorskip("dash_bootstrap_components")
+
+    def test_format_query_results_success(self, html):
         """Test successful result formatting."""
-        df = pd.DataFrame(
-            {"id": [1, 2, 3], "name": ["Alice", "Bob", "Charlie"], "age": [25, 30, 35]}
-        )
+        df = _PROTO_PEOPLE.copy(deep=False)
 
         result = format_query_results(df, max_rows=10, grid_id="test-grid")
 
         assert isinstance(result, html.Div)
-        # The result should contain AG Grid and info message
-        assert len(result.children) == 2
+        # The result should contain the info message, row store and AG Grid
+        info, store, grid = result.children
+        assert store.id == {"type": "query-results-rows", "index": "test-grid"}
+        assert grid.id == {"type": "query-results-grid", "index": "test-grid"}
+        assert store.data["columns"] == [str(col) for col in df.columns]
+        assert len(store.data["data"]) == len(df)
+
+    def test_format_query_results_truncated_total(self, html):
+        """Test a result cut short at the query's row cap shows a lower bound."""
+        df = _PROTO_SMALL.copy()
+        df.attrs["truncated"] = True
+
+        result = format_query_results(df)
+
+        text = str(result.children[0].children[0].children)
+        assert f"Total rows: {len(df):,}+" in text
+        assert "Limited to" in text
 
-    def test_format_query_results_error(self):
+    def test_format_query_results_error(self, dbc):
         """Test result formatting with error DataFrame."""
         error_df = pd.DataFrame({"error": ["Connection failed"]})
 
@@ -450,7 +1133,7 @@ class TestResultFormatting:
         assert isinstance(result, dbc.Alert)
         assert result.color == "danger"
 
-    def test_format_query_results_empty(self):
+    def test_format_query_results_empty(self, dbc):
         """Test result formatting with empty DataFrame."""
         empty_df = pd.DataFrame()
 
@@ -459,19 +1142,17 @@ class TestResultFormatting:
         assert isinstance(result, dbc.Alert)
         assert result.color == "warning"
 
-    def test_format_query_results_large_dataset(self):
+    def test_format_query_results_large_dataset(self, html, medium_result_df):
         """Test result formatting with large dataset."""
-        large_df = pd.DataFrame({"id": range(2000), "value": range(2000)})
-
-        result = format_query_results(large_df, max_rows=100)
+        result = format_query_results(medium_result_df, max_rows=100)
 
         assert isinstance(result, html.Div)
         # Should be limited to 100 rows
         # The exact assertion would depend on the AG Grid implementation
 
-    def test_format_query_results_different_themes(self):
+    def test_format_query_results_different_themes(self, html):
         """Test result formatting with different themes."""
-        df = pd.DataFrame({"col1": [1, 2], "col2": ["a", "b"]})
+        df = _PROTO_SMALL.copy(deep=False)
 
         # Test different themes
         for theme in ["alpine", "alpine-dark"]:
@@ -518,29 +1199,27 @@ class TestEdgeCases:
 class TestAdditionalCoverageScenarios:
     """Test additional scenarios to improve coverage."""
 
-    @patch("utils.snowflake_utils.get_snowflake_session")
-    def test_get_table_data_exception_with_session_close(self, mock_get_session):
-        """Test get_table_data exception handling with session cleanup."""
+    @pytest.fixture
+    def mock_logger(self, mocker):
+        """Replace the module logger so log calls can be inspected."""
+        return mocker.patch("utils.snowflake_utils.logger")
+
+    def test_get_table_data_exception_keeps_session(self, patched_get_session):
+        """Test get_table_data exception handling leaves the shared session open."""
         # Mock session that raises exception during query
-        mock_session = Mock()
-        mock_get_session.return_value = mock_session
-        mock_session.sql.side_effect = Exception("Connection timeout")
+        mock_session = patched_get_session
+        mock_session.table.side_effect = Exception("Connection timeout")
 
         result = get_table_data("TEST_TABLE")
 
-        # Verify session.close() was called even on exception
-        mock_session.close.assert_called_once()
+        # The shared session is not closed; it is probed before its next reuse
+        mock_session.close.assert_not_called()
         assert "error" in result.columns
         assert "Query failed" in result["error"].iloc[0]
 
     def test_nested_parentheses_limit_exceeded(self):
         """Test detection of excessive nested parentheses."""
-        # Create query with more than 10 levels of nesting
-        deeply_nested_query = "SELECT * FROM table WHERE col IN (" * 12 + "1" + ")" * 12
-
-        result = _perform_additional_security_checks(
-            deeply_nested_query.upper(), deeply_nested_query
-        )
+        result = _perform_additional_security_checks(_DEEP_NEST_QUERY)
 
         assert result["error"]
         # The parentheses check is caught by either the specific nested check or general malicious pattern check
@@ -551,15 +1230,7 @@ class TestAdditionalCoverageScenarios:
 
     def test_nested_parentheses_exact_boundary_condition(self):
         """Test the exact boundary that triggers line 252 - max_depth > 10."""
-        # Create a query with exactly 11 levels of nesting that doesn't match injection patterns
-        # Use a legitimate nested conditional structure
-        query_with_11_levels = (
-            "SELECT col FROM table WHERE " + "(" * 11 + "col > 0" + ")" * 11
-        )
-
-        result = _perform_additional_security_checks(
-            query_with_11_levels.upper(), query_with_11_levels
-        )
+        result = _perform_additional_security_checks(_BOUNDARY_NEST_QUERY)
 
         assert result["error"]
         assert (
@@ -567,88 +1238,88 @@ class TestAdditionalCoverageScenarios:
             == result["message"]
         )
 
-    @patch("utils.snowflake_utils.get_snowflake_session")
-    def test_execute_query_slow_performance_warning(self, mock_get_session):
+    def test_execute_query_slow_performance_warning(
+        self, patched_get_session, mocker, mock_logger
+    ):
         """Test slow query performance warning."""
         # Mock session and slow query execution
-        mock_session = Mock()
-        mock_get_session.return_value = mock_session
+        mock_session = patched_get_session
 
         # Mock a DataFrame result
         mock_df = pd.DataFrame({"col1": [1, 2, 3]})
-        mock_session.sql.return_value.to_pandas.return_value = mock_df
-
-        # Mock time.time to simulate slow execution (>10 seconds)
-        with patch("time.time") as mock_time:
-            mock_time.side_effect = [0, 15]  # 15 second execution time
-
-            with patch("utils.snowflake_utils._validate_query_safety") as mock_validate:
-                mock_validate.return_value = {
-                    "error": False,
-                    "safe_query": "SELECT * FROM test",
-                    "message": "Safe",
-                }
-
-                with patch("utils.snowflake_utils._check_rate_limit") as mock_rate:
-                    mock_rate.return_value = {"error": False, "message": "OK"}
+        mock_session.sql.return_value.to_arrow_batches.return_value = [
+            pa.Table.from_pandas(mock_df)
+        ]
 
-                    with patch("utils.snowflake_utils.logger") as mock_logger:
-                        execute_query("SELECT * FROM test")
+        # Mock the timer to simulate slow execution (>10 seconds)
+        mocker.patch(
+            "utils.snowflake_utils.time.perf_counter", side_effect=[0, 15]
+        )  # 15 second execution time
+        mocker.patch(
+            "utils.snowflake_utils._validate_query_safety",
+            return_value={
+                "error": False,
+                "safe_query": "SELECT * FROM test",
+                "message": "Safe",
+            },
+        )
+        mocker.patch(
+            "utils.snowflake_utils._check_rate_limit",
+            return_value={"error": False, "message": "OK"},
+        )
+        execute_query("SELECT * FROM test")
 
-                        # Verify slow query warning was logged
-                        mock_logger.warning.assert_called()
-                        warning_call = mock_logger.warning.call_args[0][0]
-                        assert "Slow query detected" in warning_call
-                        assert "15.00s" in warning_call
+        # Verify slow query warning was logged
+        mock_logger.warning.assert_called()
+        warning_args = mock_logger.warning.call_args[0]
+        warning_call = warning_args[0] % warning_args[1:]
+        assert "Slow query detected" in warning_call
+        assert "15.00s" in warning_call
 
-    @patch("utils.snowflake_utils.get_snowflake_session")
-    def test_execute_query_large_result_set_info(self, mock_get_session):
+    def test_execute_query_large_result_set_info(
+        self, patched_get_session, large_result_df, mocker, mock_logger
+    ):
         """Test large result set information logging."""
         # Mock session
-        mock_session = Mock()
-        mock_get_session.return_value = mock_session
+        mock_session = patched_get_session
 
         # Mock a large DataFrame result (>5000 rows)
-        large_data = {"col1": list(range(6000))}
-        mock_df = pd.DataFrame(large_data)
-        mock_session.sql.return_value.to_pandas.return_value = mock_df
+        mock_session.sql.return_value.to_arrow_batches.return_value = [
+            pa.Table.from_pandas(large_result_df)
+        ]
 
-        with patch("utils.snowflake_utils._validate_query_safety") as mock_validate:
-            mock_validate.return_value = {
+        mocker.patch(
+            "utils.snowflake_utils._validate_query_safety",
+            return_value={
                 "error": False,
                 "safe_query": "SELECT * FROM test",
                 "message": "Safe",
-            }
-
-            with patch("utils.snowflake_utils._check_rate_limit") as mock_rate:
-                mock_rate.return_value = {"error": False, "message": "OK"}
-
-                with patch("utils.snowflake_utils.logger") as mock_logger:
-                    execute_query("SELECT * FROM test")
+            },
+        )
+        mocker.patch(
+            "utils.snowflake_utils._check_rate_limit",
+            return_value={"error": False, "message": "OK"},
+        )
+        execute_query("SELECT * FROM test")
 
-                    # Verify large result set info was logged
-                    mock_logger.info.assert_called()
-                    # Find the large result set log call
-                    info_calls = [
-                        call[0][0] for call in mock_logger.info.call_args_list
-                    ]
-                    large_result_logged = any(
-                        "Large result set: 6000 rows" in call for call in info_calls
-                    )
-                    assert large_result_logged
+        # Verify large result set info was logged
+        mock_logger.info.assert_called()
+        # Find the large result set log call
+        info_calls = [
+            call[0][0] % call[0][1:] for call in mock_logger.info.call_args_list
+        ]
+        large_result_logged = any(
+            "Large result set: 6000 rows" in call for call in info_calls
+        )
+        assert large_result_logged
 
     def test_format_query_results_datetime_column_filter(self):
         """Test datetime column filter assignment in format_query_results."""
-        # Create DataFrame with datetime column
-        df = pd.DataFrame(
-            {
-                "date_col": pd.to_datetime(["2023-01-01", "2023-01-02", "2023-01-03"]),
-                "text_col": ["A", "B", "C"],
-            }
-        )
+        # DataFrame with datetime column
+        df = _PROTO_DATETIME.copy(deep=False)
 
         # Mock the AG Grid creation to capture column definitions
-        with patch("utils.snowflake_utils.dag.AgGrid") as mock_ag_grid:
+        with patch("dash_ag_grid.AgGrid") as mock_ag_grid:
             # Mock the component creation
             mock_component = Mock()
             mock_ag_grid.return_value = mock_component
@@ -681,18 +1352,11 @@ class TestAdditionalCoverageScenarios:
 
     def test_format_query_results_numeric_column_filter(self):
         """Test numeric column filter assignment in format_query_results."""
-        # Create DataFrame with numeric columns
-        df = pd.DataFrame(
-            {
-                "int_col": [1, 2, 3],
-                "float_col": [1.1, 2.2, 3.3],
-                "int32_col": pd.array([1, 2, 3], dtype="int32"),
-                "float32_col": pd.array([1.1, 2.2, 3.3], dtype="float32"),
-            }
-        )
+        # DataFrame with numeric columns
+        df = _PROTO_NUMERIC.copy(deep=False)
 
         # Mock the AG Grid creation to capture column definitions
-        with patch("utils.snowflake_utils.dag.AgGrid") as mock_ag_grid:
+        with patch("dash_ag_grid.AgGrid") as mock_ag_grid:
             mock_component = Mock()
             mock_ag_grid.return_value = mock_component
 
@@ -710,178 +1374,292 @@ class TestAdditionalCoverageScenarios:
                 assert col_def["type"] == "numericColumn"
                 assert col_def["filter"] == "agNumberColumnFilter"
 
-
-class TestAdditionalCoverageEdgeCases:
-    """Test edge cases needed for 100% coverage."""
-
-    def test_unicode_normalization_value_error_handling(self):
-        """Test Unicode normalization ValueError exception handling (lines 204-205)."""
-        from utils.snowflake_utils import _perform_additional_security_checks
-
-        # Patch unicodedata module at the import level
-        with patch("unicodedata.name") as mock_name:
-            # Mock the name function to raise ValueError for specific characters
-            def mock_name_function(char, default=""):
-                if char == "\u1234":  # Cherokee character
-                    raise ValueError("Unicode name lookup failed")
-                return default
-
-            mock_name.side_effect = mock_name_function
-
-            # This should not raise an exception, ValueError should be caught
-            result = _perform_additional_security_checks(
-                "SELECT * FROM test \u1234", "SELECT * FROM test \u1234"
-            )
-
-            # Should pass since the ValueError is caught and ignored
-            assert result["error"] is False
-
-    def test_unicode_lookalike_pattern_matching_non_ascii(self):
-        """Test Unicode lookalike pattern matching with non-ASCII characters (line 223)."""
-        from utils.snowflake_utils import _perform_additional_security_checks
-
-        # Test with Unicode lookalike that should trigger line 223
-        # Use a suspicious pattern that contains actual Unicode characters
-        malicious_query = (
-            "SELECT * FROM users ᎾɌⅮⅇᎡ BY 1"  # Contains Unicode lookalikes for "ORDER"
+    def test_format_query_results_filter_by_dtype_kind(self):
+        """Test unsigned, nullable and timezone-aware columns get typed filters."""
+        df = pd.DataFrame(
+            {
+                "u8": pd.array([1], dtype="uint8"),
+                "nullable": pd.array([None], dtype="Int64"),
+                "ts_utc": pd.to_datetime(["2023-01-01"], utc=True),
+                "flag": [True],
+            }
         )
 
-        result = _perform_additional_security_checks(malicious_query, malicious_query)
+        with patch("dash_ag_grid.AgGrid") as mock_ag_grid:
+            format_query_results(df, grid_id="test-grid")
 
-        # Should be blocked due to Unicode lookalike detection
-        assert result["error"] is True
-        assert "suspicious Unicode" in result["message"]
+        filters = {
+            col_def["field"]: col_def["filter"]
+            for col_def in mock_ag_grid.call_args[1]["columnDefs"]
+        }
+        assert filters == {
+            "u8": "agNumberColumnFilter",
+            "nullable": "agNumberColumnFilter",
+            "ts_utc": "agDateColumnFilter",
+            "flag": "agTextColumnFilter",
+        }
 
-    def test_unicode_normalization_exception_handling(self):
-        """Test Unicode normalization exception handling (lines 238-240)."""
-        from utils.snowflake_utils import _perform_additional_security_checks
+    def test_format_query_results_filter_arrow_dtypes(self):
+        """Test Arrow-backed columns get the same filters as NumPy ones."""
+        df = pa.table(
+            {
+                "i": pa.array([1], type=pa.int64()),
+                "d": pa.array([decimal.Decimal("1.5")], type=pa.decimal128(10, 2)),
+                "ts": pa.array([datetime.date(2023, 1, 1)], type=pa.date32()),
+                "s": ["x"],
+                "b": [True],
+            }
+        ).to_pandas(types_mapper=pd.ArrowDtype)
 
-        # Mock unicodedata.normalize to raise an exception
-        with patch("unicodedata.normalize") as mock_normalize:
-            mock_normalize.side_effect = Exception("Normalization failed")
+        with patch("dash_ag_grid.AgGrid") as mock_ag_grid:
+            format_query_results(df, grid_id="test-grid")
 
-            # This should not raise an exception, should proceed with original query
-            result = _perform_additional_security_checks(
-                "SELECT * FROM test", "SELECT * FROM test"
-            )
+        filters = {
+            col_def["field"]: col_def["filter"]
+            for col_def in mock_ag_grid.call_args[1]["columnDefs"]
+        }
+        assert filters == {
+            "i": "agNumberColumnFilter",
+            "d": "agNumberColumnFilter",
+            "ts": "agDateColumnFilter",
+            "s": "agTextColumnFilter",
+            "b": "agTextColumnFilter",
+        }
 
-            # Should pass since normalization failure is handled gracefully
-            assert result["error"] is False
+    def test_format_query_results_reuses_column_defs(self):
+        """Test repeated result schemas share their memoized column definitions."""
+        first = pd.DataFrame({"A": [1], "B": ["x"]})
+        second = pd.DataFrame({"A": [2, 3], "B": ["y", "z"]})
 
-    def test_unclosed_comment_removal_logic(self):
-        """Test unclosed comment removal logic (lines 275-276)."""
-        from utils.snowflake_utils import _perform_additional_security_checks
+        with patch("dash_ag_grid.AgGrid") as mock_ag_grid:
+            format_query_results(first, grid_id="test-grid")
+            format_query_results(second, grid_id="test-grid")
 
-        # Query with unclosed comment should trigger lines 275-276
-        query_with_unclosed_comment = (
-            "SELECT * FROM test /* this comment is never closed"
+        first_defs, second_defs = (
+            call[1]["columnDefs"] for call in mock_ag_grid.call_args_list
         )
+        assert first_defs == second_defs
+        assert all(a is b for a, b in zip(first_defs, second_defs))
 
-        result = _perform_additional_security_checks(
-            query_with_unclosed_comment, query_with_unclosed_comment
+    def test_grid_row_payload_is_json_native(self):
+        """Test value rows hold plain JSON values, with dates kept as dates."""
+        df = pd.DataFrame(
+            {
+                "n": [1, 2],
+                "x": [1.5, np.nan],
+                "day": [datetime.date(2023, 1, 2), None],
+                "ts": pd.to_datetime(["2023-01-02 03:04:05", None]),
+            }
         )
 
-        # Should pass - the unclosed comment removal logic should handle this
-        assert result["error"] is False
-
-    def test_table_reference_parsing_edge_cases(self):
-        """Test table reference parsing edge cases (lines 468, 474-478)."""
-        from utils.snowflake_utils import _perform_additional_security_checks
-
-        # Test case 1: Unclosed quoted table name (line 474-478) - test the logic path
-        query_unclosed_quote = "SELECT * FROM 'production_table"  # Unclosed quote, should parse as 'production_table'
-        result1 = _perform_additional_security_checks(
-            query_unclosed_quote, query_unclosed_quote
-        )
-        # This should trigger the unclosed quote handling logic (lines 474-478)
-        # The query should pass since 'production_table' is not in forbidden schemas
-        assert result1["error"] is False
+        payload = _grid_row_payload(df)
+        assert payload == {
+            "columns": ["n", "x", "day", "ts"],
+            "data": [
+                [1, 1.5, "2023-01-02", "2023-01-02T03:04:05"],
+                [2, None, None, None],
+            ],
+        }
+        assert all(type(v) is int for v in [row[0] for row in payload["data"]])
 
-        # Test case 2: Quoted table name without next break (line 468)
-        query_quoted_no_break = (
-            'SELECT * FROM "test_table"'  # Quoted but no space/comma after
-        )
-        result2 = _perform_additional_security_checks(
-            query_quoted_no_break, query_quoted_no_break
+    def test_grid_row_payload_is_lossless(self):
+        """Test microseconds, UTC offsets and 17-digit floats survive unchanged."""
+        df = pd.DataFrame(
+            {
+                "us": pd.to_datetime(["2023-01-02 03:04:03.456789"]),
+                "ns": pd.to_datetime(["2023-01-02 03:04:03.456789123"]),
+                "tz": pd.to_datetime(["2023-01-02 03:04:05"]).tz_localize(
+                    "Asia/Kolkata"
+                ),
+                "x": [1.1234567890123457],
+            }
         )
-        assert result2["error"] is False  # Should pass
 
-        # Test case 3: Regular identifier without next break (line 477-478)
-        query_no_break = (
-            "SELECT * FROM test_table"  # No space/comma/parenthesis after table name
-        )
-        result3 = _perform_additional_security_checks(query_no_break, query_no_break)
-        assert result3["error"] is False  # Should pass
+        assert _grid_row_payload(df)["data"] == [
+            [
+                "2023-01-02T03:04:03.456789",
+                "2023-01-02T03:04:03.456789123",
+                "2023-01-02T03:04:05+05:30",
+                1.1234567890123457,
+            ]
+        ]
 
-        # Test case 4: To specifically trigger line 468 - quoted table without remainder
-        query_quoted_end = "SELECT * FROM 'test'"  # Quoted table at end of FROM clause
-        result4 = _perform_additional_security_checks(
-            query_quoted_end, query_quoted_end
+    def test_grid_row_payload_duplicate_columns(self):
+        """Test duplicate column names keep every column's values."""
+        df = pd.DataFrame(
+            [[1, datetime.date(2023, 1, 2)]], columns=["A", "A"], dtype=object
         )
-        assert result4["error"] is False  # Should pass
 
-    def test_unicode_lookalike_ascii_only_bypass(self):
-        """Test that ASCII-only patterns don't trigger Unicode detection."""
-        from utils.snowflake_utils import _perform_additional_security_checks
-
-        # Test with ASCII-only pattern that looks suspicious but should pass line 223 check
-        # This should match the pattern but not trigger line 223 since all chars are ASCII
-        ascii_query = "SELECT * FROM users ORDER BY 1"  # All ASCII, should not trigger Unicode detection
-
-        result = _perform_additional_security_checks(ascii_query, ascii_query)
+        assert _grid_row_payload(df) == {
+            "columns": ["A", "A"],
+            "data": [[1, "2023-01-02"]],
+        }
 
-        # Should pass since no actual Unicode characters are present
-        assert result["error"] is False
 
-    def test_final_coverage_line_223_unicode_detection(self):
-        """Test to specifically hit line 223 - Unicode lookalike return True."""
-        from utils.snowflake_utils import _perform_additional_security_checks
+class TestAdditionalCoverageEdgeCases:
+    """Test edge cases needed for 100% coverage."""
 
-        # Use Unicode characters that match the pattern but are NOT in dangerous blocks
-        # Using modifier letter capital O (ᴼ) which matches [ᴼOｏ] pattern but is not in dangerous blocks
-        # This should bypass the general Unicode block check and reach the specific pattern check at line 223
-        unicode_query = (
-            "SELECT * FROM test UNIᴼn BY 1"  # UNION with modifier letter capital O
+    @pytest.mark.parametrize(
+        "patch_target,side_effect,query,expect_error",
+        [
+            # ValueError from the name lookup is caught and ignored
+            pytest.param(
+                "unicodedata.name",
+                _raise_on_cherokee,
+                "SELECT * FROM test \u1234",
+                False,
+                id="name_value_error",
+            ),
+            # Normalization failure proceeds with the original query
+            pytest.param(
+                "unicodedata.normalize",
+                Exception("Normalization failed"),
+                "SELECT * FROM test",
+                False,
+                id="normalize_exception",
+            ),
+            # Contains Unicode lookalikes for "ORDER"
+            pytest.param(
+                None,
+                None,
+                "SELECT * FROM users ᎾɌⅮⅇᎡ BY 1",
+                True,
+                id="lookalike_non_ascii",
+            ),
+        ],
+    )
+    def test_unicode_handling(
+        self, monkeypatch, patch_target, side_effect, query, expect_error
+    ):
+        """Test Unicode lookup/normalization failures and lookalike detection."""
+        # Undo the patch before pytest reports, since its terminal writer
+        # also calls unicodedata
+        with monkeypatch.context() as m:
+            if patch_target:
+                m.setattr(patch_target, Mock(side_effect=side_effect))
+            result = _perform_additional_security_checks(query)
+
+        assert result["error"] is expect_error
+        if expect_error:
+            assert "suspicious Unicode" in result["message"]
+
+    @pytest.mark.parametrize(
+        "query,expect_error,msg_fragment",
+        [
+            # Unclosed block comment is stripped to the end of the query
+            pytest.param(
+                _Q_UNCLOSED_COMMENT,
+                False,
+                None,
+                id="unclosed_comment",
+            ),
+            # Unclosed quoted table name parses as 'production_table
+            pytest.param(
+                _Q_UNCLOSED_QUOTE_END,
+                False,
+                None,
+                id="unclosed_quote_at_end",
+            ),
+            # Quoted table name with nothing after it
+            pytest.param(_Q_QUOTED_NO_BREAK, False, None, id="quoted_no_break"),
+            # Regular identifier with no space/comma/parenthesis after it
+            pytest.param(_Q_BARE_NO_BREAK, False, None, id="bare_no_break"),
+            # Quoted table at the end of the FROM clause
+            pytest.param(_Q_QUOTED_END, False, None, id="quoted_at_end"),
+            # Quoted schema.table followed by more of the query
+            pytest.param(
+                _Q_DOT_BREAK,
+                False,
+                None,
+                id="quoted_dot_with_break",
+            ),
+            # Unclosed quote followed by more of the query
+            pytest.param(
+                _Q_UNCLOSED_BREAK,
+                False,
+                None,
+                id="unclosed_quote_with_break",
+            ),
+            # All ASCII: matches a keyword pattern but has no Unicode characters
+            pytest.param(
+                _Q_ASCII_ORDER,
+                False,
+                None,
+                id="ascii_only_keyword",
+            ),
+            # UNION with modifier letter capital O, which is not in a dangerous
+            # block, so it is caught by the lookalike patterns
+            pytest.param(
+                _Q_UNICODE_UNION,
+                True,
+                "suspicious Unicode",
+                id="modifier_letter_lookalike",
+            ),
+        ],
+    )
+    def test_security_check_edge_cases(self, query, expect_error, msg_fragment):
+        """Test comment stripping, table-reference parsing and lookalike edge cases."""
+        result = _perform_additional_security_checks(query)
+
+        assert result["error"] is expect_error
+        if msg_fragment:
+            assert msg_fragment in result["message"]
+
+    def test_unicode_lookalike_chars_cover_patterns(self):
+        """Test the lookalike prefilter set holds every non-ASCII char the patterns match."""
+        char_class = re.compile(
+            "|".join(pattern.pattern for pattern in _UNICODE_LOOKALIKE_RES).replace(
+                "][", "]|["
+            ),
+            re.IGNORECASE,
         )
+        matched = {
+            chr(cp)
+            for cp in range(128, sys.maxunicode + 1)
+            if char_class.fullmatch(chr(cp))
+        }
 
-        result = _perform_additional_security_checks(unicode_query, unicode_query)
-
-        # Should be blocked due to Unicode lookalike detection hitting line 223
-        assert result["error"] is True
-        assert "suspicious Unicode" in result["message"]
-
-    def test_final_coverage_line_468_table_parsing(self):
-        """Test to specifically hit line 468 - table reference with dot and next_break found."""
-        from utils.snowflake_utils import _perform_additional_security_checks
-
-        # Create a query with quoted schema.table that has a space after the dot notation
-        # Use an allowed schema name to avoid blocking
-        # This should trigger line 468: table_ref += remainder[:next_break.start()]
-        query_with_dot_break = "SELECT * FROM 'snowflake_sample_data'.'table' WHERE id = 1"  # Quoted schema.table with space
-
-        result = _perform_additional_security_checks(
-            query_with_dot_break, query_with_dot_break
-        )
+        assert matched <= _UNICODE_LOOKALIKE_CHARS
+
+    def test_dangerous_unicode_block_class_matches_character_names(self):
+        """Test the block class matches exactly the chars named after dangerous blocks."""
+        blocks = ("FULLWIDTH", "CHEROKEE", "CYRILLIC", "MATHEMATICAL")
+        mismatched = [
+            hex(cp)
+            for cp in range(128, sys.maxunicode + 1)
+            if (name := unicodedata.name(chr(cp), ""))
+            and any(block in name for block in blocks)
+            != bool(_DANGEROUS_UNICODE_BLOCK_RE.match(chr(cp)))
+        ]
 
-        # Should pass - this hits the table parsing logic at line 468
-        assert result["error"] is False
+        assert mismatched == []
 
-    def test_final_coverage_line_476_unclosed_quote_parsing(self):
-        """Test to specifically hit line 476 - unclosed quote with next_break found."""
-        from utils.snowflake_utils import _perform_additional_security_checks
+    def test_quote_strip_table_covers_whitespace_and_quotes(self):
+        """Test the strip table deletes exactly the quotes and \\s characters."""
+        deleted = {chr(cp) for cp, repl in _QUOTE_STRIP_TABLE.items() if repl is None}
+        whitespace = {
+            chr(cp) for cp in range(sys.maxunicode + 1) if re.match(r"\s", chr(cp))
+        }
 
-        # Create a query with unclosed quote that has a space after the table name
-        # This should trigger the unclosed quote logic and hit line 476
-        query_unclosed_with_break = (
-            "SELECT * FROM 'test_table WHERE id = 1"  # Unclosed quote with space
-        )
+        assert deleted == whitespace | set("\"'`\u2018\u2019\u201c\u201d")
 
-        result = _perform_additional_security_checks(
-            query_unclosed_with_break, query_unclosed_with_break
-        )
+    def test_vectorized_unicode_scan_matches_block_class(self):
+        """Test the NumPy scan of long text agrees with the block class at range edges."""
+        padding = "x" * _VECTORIZED_UNICODE_SCAN_MIN_LENGTH
+        edges = {
+            cp
+            for low, high in _DANGEROUS_UNICODE_RANGES
+            for cp in (low - 1, low, high, high + 1)
+        }
+        mismatched = [
+            hex(cp)
+            for cp in sorted(edges)
+            if _has_dangerous_code_points(padding + chr(cp))
+            != bool(_DANGEROUS_UNICODE_BLOCK_RE.search(chr(cp)))
+        ]
 
-        # Should pass - this hits the unclosed quote parsing logic at line 476
-        assert result["error"] is False
+        assert mismatched == []
+        assert not _has_dangerous_code_points(padding + "\ud800")
 
 
 if __name__ == "__main__":
@@ -3,16 +3,23 @@ Snowflake connection and data utilities for the multi-page Dash application.
 """
 
 import os
+import atexit
+import collections
 import logging
+import operator
+import functools
+import sys
+import threading
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 from snowflake.snowpark.session import Session
 import warnings
 import re
 import time
-from typing import Dict, Union, List
+import unicodedata
+from typing import Deque, Dict, List, Tuple, TypedDict
 from dash import html
-import dash_bootstrap_components as dbc
-import dash_ag_grid as dag
 from typing import Optional
 
 # Suppress pkg_resources warnings before importing snowflake
@@ -22,35 +29,631 @@ warnings.filterwarnings("ignore", category=UserWarning, module="snowflake.*")
 logger = logging.getLogger(__name__)
 
 # Simple query tracking for rate limiting and monitoring
-_query_history: List[float] = []
 _MAX_QUERIES_PER_MINUTE = 30
+# Oldest first; never holds more than the per-minute limit
+_query_history: Deque[float] = collections.deque(maxlen=_MAX_QUERIES_PER_MINUTE)
+_rate_limit_lock = threading.Lock()
 _QUERY_TIMEOUT_SECONDS = 30
+_MAX_QUERY_LENGTH = 10000
+_MAX_RESULT_ROWS = 10000
+# Query metrics thresholds for the slow-query warning and large-result notice
+_SLOW_QUERY_SECONDS = 10.0
+_LARGE_RESULT_ROWS = 5_000
+
+# One Snowflake session shared by every request; creating a session costs a
+# full TLS + authentication + warehouse handshake
+_session_lock = threading.Lock()
+_cached_session: Optional[Session] = None
+# A session used within this many seconds is trusted without a liveness probe
+_SESSION_PROBE_IDLE_SECONDS = 300
+_session_last_used = 0.0
+
+# SPCS mounts a rotating OAuth token here; it is re-read at most once a minute
+_SPCS_TOKEN_PATH = "/snowflake/session/token"
+_LOGIN_TOKEN_TTL_SECONDS = 60
+_login_token_cache: Optional[Tuple[str, float]] = None
+
+# Results of deterministic queries, oldest first, as (frame, stored at, bytes,
+# change token); bounded by age and total size. A query being fetched has a
+# pending Event so concurrent identical requests wait for it instead of hitting
+# Snowflake too. Frames go in and come out as deep copies, so a caller editing
+# its result cannot change what later hits see. Expired entries are kept until
+# replaced: one with a change token is served again if the source tables
+# report the same token
+_RESULT_CACHE_TTL_SECONDS = 300
+_RESULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Keyed by (validated query text, max_rows)
+_ResultCacheKey = Tuple[str, int]
+_ChangeToken = Optional[Tuple]
+_result_cache: collections.OrderedDict[
+    _ResultCacheKey, Tuple[pd.DataFrame, float, int, _ChangeToken]
+] = collections.OrderedDict()
+_result_cache_bytes = 0
+_pending_results: Dict[_ResultCacheKey, threading.Event] = {}
+_result_cache_lock = threading.Lock()
+
+# The sample schema's table listing is effectively static, so a successful
+# lookup is kept (with its monotonic timestamp) and reused for a few minutes
+_SCHEMA_OBJECTS_TTL_SECONDS = 300
+_schema_objects_cache: Optional[Tuple[pd.DataFrame, float]] = None
+
+
+class _CheckResult(TypedDict):
+    """Outcome of a rate-limit or query safety check."""
+
+    error: bool
+    message: str
+    safe_query: str
+
+
+# Keywords that are never allowed in user queries (whole-word matches only).
+# Interned once at import so every validation compares against shared objects.
+_DANGEROUS_KEYWORDS = tuple(
+    sys.intern(keyword)
+    for keyword in (
+        # Data modification
+        "INSERT",
+        "UPDATE",
+        "DELETE",
+        "DROP",
+        "CREATE",
+        "ALTER",
+        "TRUNCATE",
+        "MERGE",
+        "REPLACE",
+        "SWAP",
+        # System/admin operations
+        "GRANT",
+        "REVOKE",
+        "EXECUTE",
+        "CALL",
+        "COPY",
+        "PUT",
+        "GET",
+        "REMOVE",
+        "LIST",
+        "SHOW GRANTS",
+        "SHOW ROLES",
+        "USE ROLE",
+        "USE WAREHOUSE",
+        "SET",
+        "UNSET",
+        "BEGIN",
+        "COMMIT",
+        "ROLLBACK",
+        # Stored procedures and functions
+        "PROCEDURE",
+        "FUNCTION",
+        "TASK",
+        "STREAM",
+        "STAGE",
+        # File operations
+        "LOAD",
+        "UNLOAD",
+        "$",
+        # Potentially dangerous system functions
+        "SYSTEM$",
+        "CURRENT_ROLE",
+        "CURRENT_USER",
+    )
+)
+
+
+def _compile_scan_patterns(patterns):
+    """
+    Compile each pattern for both scan modes, keyed by ``str.isascii()``.
+
+    ASCII-only queries (the common case) are scanned with re.ASCII: results are
+    identical for ASCII text, but the engine skips Unicode category lookups for
+    \\s, \\w and \\b. Queries with non-ASCII characters keep full Unicode
+    matching so lookalike whitespace cannot slip through.
+    """
+    return {
+        True: tuple(re.compile(pattern, re.ASCII) for pattern in patterns),
+        False: tuple(re.compile(pattern) for pattern in patterns),
+    }
+
 
+def _literal_chain(pattern):
+    """
+    Rewrite ``A.*?B.*?C`` (escaped literals joined by ``.*?``) so it cannot
+    backtrack.
+
+    Taking the earliest occurrence of each literal after the previous one finds
+    an embedding whenever one exists, so every step can be an atomic group and
+    only the start of the text needs trying. This relies on the scanned text
+    containing no newlines, which holds for the whitespace-collapsed query.
+    """
+    return r"\A" + "".join(f"(?>.*?{part})" for part in pattern.split(".*?"))
 
+
+def _compile_triggered_patterns(patterns_by_trigger):
+    """
+    Compile patterns grouped by a literal substring every one of their matches
+    contains, keyed by ``str.isascii()`` like ``_compile_scan_patterns``.
+
+    Each scan mode maps to ``(trigger, compiled patterns)`` pairs; a group's
+    regexes only need running when its trigger occurs in the text.
+    """
+    return {
+        is_ascii: tuple(
+            (trigger, _compile_scan_patterns(patterns)[is_ascii])
+            for trigger, patterns in patterns_by_trigger.items()
+        )
+        for is_ascii in (True, False)
+    }
+
+
+def _compile_scan_alternation(patterns):
+    """
+    Fold patterns that share one rejection message into a single alternation.
+
+    One search walks the query once instead of once per pattern. The result
+    has the same shape as ``_compile_scan_patterns`` (a one-element tuple per
+    scan mode), so callers iterate it the same way.
+    """
+    return _compile_scan_patterns(("|".join(f"(?:{p})" for p in patterns),))
+
+
+# Injection patterns checked on the raw query, before comments are stripped
+_PRE_COMMENT_INJECTION_RES = _compile_scan_alternation(
+    (
+        r"'--",  # Classic comment injection (string termination with comment)
+        r"';",  # Statement termination
+        r"--.*?;.*?(INSERT|UPDATE|DELETE|DROP)",  # Comments with statements
+        r"--.*?(DROP|DELETE|UPDATE|INSERT).*?;",  # Comments followed by dangerous statements
+    )
+)
+
+# SQL injection patterns checked on the comment-free, upper-cased query,
+# grouped under a literal every match must contain. Most queries contain few
+# of these triggers, so a C-level substring test skips most regex walks.
+_INJECTION_RES = _compile_triggered_patterns(
+    {
+        ";": (
+            r";\s*(DROP|DELETE|UPDATE|INSERT)",  # Statement termination with dangerous commands
+            r"'\s*;",  # Quote followed by statement terminator
+            r"\bSELECT\s+\*.*?;.*?SELECT",  # Multiple statements
+        ),
+        "--": (
+            r"--.*?(INSERT|UPDATE|DELETE|DROP)",  # Comments hiding dangerous commands
+            r"'--",  # Comment after quote (SQL comment injection)
+            r"';--",  # Statement end with comment
+        ),
+        "/*": (
+            r"/\*.*?(INSERT|UPDATE|DELETE|DROP).*?\*/",  # Block comments hiding commands
+            r"/\*.*?(DROP|DELETE|INSERT|UPDATE).*?\*/",  # Block comments with dangerous commands already covered above
+        ),
+        "#": (
+            r"#.*?(DROP|DELETE|INSERT|UPDATE)",  # MySQL style comments with dangerous commands
+        ),
+        "UNION": (
+            r"UNION.*?(SELECT.*?(PASSWORD|CREDENTIAL|SECRET|TOKEN))",  # Union-based injection
+            r"UNION\s+SELECT",  # Basic UNION injection
+        ),
+        "=": (
+            r"\b1\s*=\s*1\b",  # Common injection condition
+            r"OR\s+1\s*=\s*1",  # OR-based injection
+            r"AND\s+1\s*=\s*1",  # AND-based injection
+            r"'\s*OR\s*'.*?'\s*=\s*'",  # String-based injection
+            r"'\s*=\s*'",  # Simple string equality (potential injection)
+            r"\bTRUE\s*=\s*TRUE\b",  # Boolean condition injection
+            r"\b\d+\s*=\s*\d+\b",  # Numeric equality conditions
+            r"AND\s+\d+\s*=\s*\(\s*SELECT",  # Blind injection with subquery
+            r"=\s*\(\s*SELECT\s+COUNT",  # Count-based blind injection
+        ),
+        # Advanced injection patterns
+        "AND": (
+            r"'\s*AND\s*\(",  # Parenthetical injection
+        ),
+        "OR": (
+            r"'\s*OR\s*\(",  # OR with subquery
+        ),
+        "INFORMATION_SCHEMA": (
+            _literal_chain(
+                r"SELECT.*?FROM.*?INFORMATION_SCHEMA\.USER_PRIVILEGES"
+            ),  # User privilege queries
+            _literal_chain(
+                r"SELECT.*?FROM.*?INFORMATION_SCHEMA\.ROLE_GRANTS"
+            ),  # Role grant queries
+            _literal_chain(
+                r"SELECT.*?PRIVILEGE_TYPE.*?FROM.*?INFORMATION_SCHEMA"
+            ),  # Privilege enumeration
+            _literal_chain(
+                r"SELECT.*?GRANTEE.*?FROM.*?INFORMATION_SCHEMA"
+            ),  # Grantee enumeration
+            _literal_chain(
+                r"SELECT.*?TABLE_NAME.*?FROM.*?INFORMATION_SCHEMA\.TABLES.*?WHERE.*?TABLE_SCHEMA.*?NOT.*?IN"
+            ),  # Advanced table enumeration (suspicious filtering)
+            _literal_chain(
+                r"SELECT.*?TABLE_NAME.*?FROM.*?INFORMATION_SCHEMA\.TABLES.*?UNION"
+            ),  # Table enumeration with UNION (suspicious)
+            _literal_chain(
+                r"SELECT.*?COLUMN_NAME.*?FROM.*?INFORMATION_SCHEMA\.COLUMNS.*?UNION"
+            ),  # Column enumeration with UNION (suspicious)
+            _literal_chain(
+                r"SELECT.*?COLUMN_NAME.*?FROM.*?INFORMATION_SCHEMA\.COLUMNS.*?WHERE.*?TABLE_NAME.*?NOT.*?IN"
+            ),  # Suspicious filtering
+            _literal_chain(
+                r"SELECT.*?COLUMN_NAME.*?FROM.*?INFORMATION_SCHEMA\.COLUMNS.*?WHERE.*?TABLE_NAME.*?=.*?'USERS'"
+            ),  # Specific sensitive user table enumeration (test case)
+        ),
+        "GRANTS": (
+            r"SHOW\s+GRANTS\s+TO\s+ROLE",  # Show grants enumeration
+        ),
+        "DESCRIBE": (
+            r"DESCRIBE\s+TABLE",  # Table structure enumeration
+        ),
+        "SUBSTRING": (
+            r"ASCII\s*\(\s*SUBSTRING",  # Character extraction functions
+            r"SUBSTRING\s*\(\s*\(\s*SELECT",  # Subquery in substring
+        ),
+        "EXISTS": (
+            r"EXISTS\s*\(\s*SELECT",  # Exists subqueries
+        ),
+        "WAITFOR": (
+            r"WAITFOR\s+DELAY",  # Time delay functions
+        ),
+        "SLEEP": (
+            r"SLEEP\s*\(",  # Sleep functions
+            r"PG_SLEEP\s*\(",  # PostgreSQL sleep
+        ),
+        "BENCHMARK": (
+            r"BENCHMARK\s*\(",  # Benchmark functions
+        ),
+        "DECLARE": (
+            r"DECLARE\s+@",  # Variable declarations
+        ),
+        "EXEC": (
+            r"EXEC\s*\(\s*@",  # Dynamic SQL execution
+        ),
+        "XP_CMDSHELL": (
+            r"XP_CMDSHELL",  # Command shell execution
+        ),
+        "SP_EXECUTESQL": (
+            r"SP_EXECUTESQL",  # Dynamic SQL procedures
+        ),
+        "OUTFILE": (
+            r"INTO\s+OUTFILE",  # File output
+        ),
+        "LOAD_FILE": (
+            r"LOAD_FILE\s*\(",  # File loading
+        ),
+        "+": (
+            r"'\s*\+\s*'",  # String concatenation
+        ),
+        "CHAR": (
+            r"CHAR\s*\(\s*\d+\s*\)",  # Character encoding
+        ),
+        "CHR": (
+            r"CHR\s*\(\s*\d+\s*\)",  # Character encoding (Oracle)
+        ),
+        "CONCAT": (
+            r"CONCAT\s*\(",  # String concatenation functions
+        ),
+        "||": (
+            r"'\s*\|\|\s*'",  # String concatenation operator
+        ),
+        # Resource exhaustion patterns
+        ",": (
+            r"FROM\s+\w+\s+\w+,\s*\w+\s+\w+,\s*\w+\s+\w+",  # Multiple table aliases (Cartesian product)
+        ),
+        "CROSS": (
+            r"CROSS\s+JOIN",  # Cross joins
+        ),
+        "RECURSIVE": (
+            r"WITH\s+RECURSIVE",  # Recursive CTEs
+        ),
+        "LARGE_TABLE": (
+            r"COUNT\s*\(\s*\*\s*\).*?FROM.*?LARGE_TABLE",  # Suspicious counting operations
+        ),
+        "WHERE": (
+            r"WHERE.*?IN\s*\(\s*SELECT.*?WHERE.*?IN\s*\(\s*SELECT",  # Deeply nested subqueries
+        ),
+    }
+)
+
+# Restricted SQL features (resource intensive or unbounded)
+_RESTRICTED_FEATURE_RES = _compile_scan_alternation(
+    (
+        r"LATERAL\s+VIEW",  # Lateral views can be resource intensive
+        r"RECURSIVE",  # Recursive CTEs can cause infinite loops
+        r"CONNECT\s+BY",  # Hierarchical queries can be problematic
+        r"MODEL\s+",  # MODEL clause can be resource intensive
+        r"XMLTABLE",  # XML processing can be slow
+        r"JSON_TABLE",  # JSON processing with large data
+        r"PIVOT\s*\(",  # Complex pivot operations
+        r"UNPIVOT\s*\(",  # Complex unpivot operations
+    )
+)
+
+# File operations and external references
+_FILE_RES = _compile_scan_alternation(
+    (
+        r"FROM\s+@\w",  # Stage references in FROM clauses
+        r"COPY\s+.*@\w",  # Stage references in COPY commands
+        r"LIST\s+@\w",  # LIST stage operations
+        r"GET\s+@\w",  # GET stage operations
+        r"PUT\s+.*@\w",  # PUT stage operations
+        r"FILE_FORMAT",  # File format specifications
+        r"EXTERNAL",  # External table references
+        r"S3://",  # S3 references
+        r"AZURE://",  # Azure references
+        r"GCS://",  # Google Cloud references
+        r"HTTPS?://",  # HTTP and HTTPS references
+    )
+)
+
+# JOIN counting for the query-complexity limit
+_JOIN_RES = _compile_scan_patterns((r"\bJOIN\b",))
+
+# Unicode lookalike spellings of SQL keywords (only flagged when the match
+# actually contains non-ASCII characters)
+_UNICODE_LOOKALIKE_RES = tuple(
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in (
+        r"[ᎾО][ᴿRр][ᴰDḊ][ᴱEе][ᴿRр]",  # ORDER with Unicode lookalikes
+        r"[ᵁUｕ][ᴺNｎ][ᴵIｉ][ᴼOｏ][ᴺNｎ]",  # UNION with Unicode lookalikes
+        r"[ˢSｓ][ᴱEｅ][ᴸLｌ][ᴱEｅ][ᶜCｃ][ᵀTｔ]",  # SELECT with Unicode lookalikes
+        r"[ᴰDｄ][ᴿRｒ][ᴼOｏ][ᴾPｐ]",  # DROP with Unicode lookalikes
+        r"[ᴵIｉ][ᴺNｎ][ˢSｓ][ᴱEｅ][ᴿRｒ][ᵀTｔ]",  # INSERT with Unicode lookalikes
+    )
+)
+
+# Code-point ranges from Unicode blocks commonly abused as SQL keyword
+# lookalikes: every code point whose name contains FULLWIDTH, CHEROKEE,
+# CYRILLIC or MATHEMATICAL (Unicode 15.1), as sorted inclusive (low, high) pairs
+_DANGEROUS_UNICODE_RANGES = (
+    (0x0400, 0x052F),  # Cyrillic, Cyrillic Supplement
+    (0x13A0, 0x13FD),  # Cherokee
+    (0x1C80, 0x1C88),  # Cyrillic Extended-C
+    (0x1D2B, 0x1D2B),  # Cyrillic small capital letter El
+    (0x1D78, 0x1D78),  # Modifier letter Cyrillic En
+    (0x205F, 0x205F),  # Medium mathematical space
+    (0x27CB, 0x27CB),  # Mathematical rising diagonal
+    (0x27CD, 0x27CD),  # Mathematical falling diagonal
+    (0x27E6, 0x27EF),  # Mathematical brackets
+    (0x2DE0, 0x2DFF),  # Cyrillic Extended-A
+    (0xA640, 0xA672),  # Cyrillic Extended-B
+    (0xA674, 0xA69F),  # Cyrillic Extended-B
+    (0xAB70, 0xABBF),  # Cherokee Supplement
+    (0xFE2E, 0xFE2F),  # Combining Cyrillic titlo halves
+    (0xFF01, 0xFF60),  # Fullwidth forms
+    (0xFFE0, 0xFFE6),  # Fullwidth signs
+    (0x1D400, 0x1D7FF),  # Mathematical Alphanumeric Symbols
+    (0x1E030, 0x1E08F),  # Cyrillic Extended-D
+    (0x1EE00, 0x1EEF1),  # Arabic Mathematical Alphabetic Symbols
+)
+
+# The same ranges folded into one character class so text is scanned once
+_DANGEROUS_UNICODE_BLOCK_RE = re.compile(
+    "["
+    + "".join(
+        f"{re.escape(chr(low))}-{re.escape(chr(high))}"
+        for low, high in _DANGEROUS_UNICODE_RANGES
+    )
+    + "]"
+)
+
+# ...and as a dense boolean map over every code point (about 1.1 MB) for
+# vectorized scans of long queries: decoding to UTF-32 once and indexing the
+# map with the whole array beats the regex engine
+_DANGEROUS_CODE_POINT_MAP = np.zeros(sys.maxunicode + 1, dtype=bool)
+for _low, _high in _DANGEROUS_UNICODE_RANGES:
+    _DANGEROUS_CODE_POINT_MAP[_low : _high + 1] = True
+del _low, _high
+_VECTORIZED_UNICODE_SCAN_MIN_LENGTH = 320
+
+
+def _has_dangerous_code_points(text: str) -> bool:
+    """Return True if any character of ``text`` lies in a dangerous Unicode range."""
+    if len(text) < _VECTORIZED_UNICODE_SCAN_MIN_LENGTH:
+        return _DANGEROUS_UNICODE_BLOCK_RE.search(text) is not None
+
+    code_points = np.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype="<u4")
+    return bool(_DANGEROUS_CODE_POINT_MAP[code_points].any())
+
+
+# Every non-ASCII character the lookalike patterns can match, including the
+# extra case-insensitive equivalents re applies (dotted/dotless I, long S and
+# wide Cyrillic O). A query containing none of them cannot be flagged, so the
+# regex scan is skipped with a single set-membership pass.
+_UNICODE_LOOKALIKE_CHARS = frozenset(
+    variant
+    for pattern in _UNICODE_LOOKALIKE_RES
+    for char in "".join(re.findall(r"\[([^\]]+)\]", pattern.pattern))
+    for variant in (char, char.lower(), char.upper(), char.casefold())
+    if len(variant) == 1 and not variant.isascii()
+) | frozenset("\u0130\u0131\u017f\u1c82")
+
+
+def _contains_suspicious_unicode(text: str) -> bool:
+    """Check for Unicode characters that might be SQL keyword lookalikes."""
+    # ASCII-only queries (the common case) cannot contain lookalikes or
+    # characters from the dangerous blocks, so the scan is skipped entirely
+    if text.isascii():
+        return False
+
+    # Any character from a known dangerous Unicode block (full-width,
+    # Cherokee, Cyrillic or mathematical script) sits inside some
+    # keyword-length window, so one scan of the whole text suffices
+    if _has_dangerous_code_points(text):
+        return True
+
+    # Specific pattern matching for Unicode lookalikes only (not ASCII)
+    if _UNICODE_LOOKALIKE_CHARS.isdisjoint(text):
+        return False
+    for pattern in _UNICODE_LOOKALIKE_RES:
+        match = pattern.search(text)
+        # Only flag if the match contains actual Unicode characters
+        if match and not match.group(0).isascii():
+            return True
+
+    return False
+
+
+# Every character \s matches (str.isspace; the highest is U+3000)
+_WHITESPACE_CHARS = "".join(chr(cp) for cp in range(0x3001) if chr(cp).isspace())
+_WHITESPACE_STRIP_TABLE = str.maketrans("", "", _WHITESPACE_CHARS)
+
+# Deletes regular, back-tick and smart quotes plus all whitespace from a
+# table reference
+_QUOTE_STRIP_TABLE = str.maketrans(
+    "", "", "\"'`\u2018\u2019\u201c\u201d" + _WHITESPACE_CHARS
+)
+
+# Schemas/databases user queries may reference (whitelist approach); the
+# upper-cased set is what extracted schema names are compared against
+_ALLOWED_SCHEMAS = ("SNOWFLAKE_SAMPLE_DATA", "INFORMATION_SCHEMA")
+_ALLOWED_SCHEMAS_UPPER = frozenset(schema.upper() for schema in _ALLOWED_SCHEMAS)
+
+# Parentheses, pulled out in C for the nesting-depth check
+_PAREN_RE = re.compile(r"[()]")
+
+# Keywords that must not appear only once comments are stripped out
+_RECONSTRUCTED_KEYWORDS = (
+    "UNION",
+    "SELECT",
+    "INSERT",
+    "UPDATE",
+    "DELETE",
+    "DROP",
+    "CREATE",
+    "ALTER",
+    "GRANT",
+    "REVOKE",
+    "EXECUTE",
+    "CALL",
+    "TRUNCATE",
+    "MERGE",
+)
+
+# Comment stripping, whitespace collapsing and FROM-clause parsing
+_LINE_COMMENT_RE = re.compile(r"--.*?$", re.MULTILINE)
+_BLOCK_COMMENT_RE = re.compile(r"/\*(?:.*?\*/|.*)", re.DOTALL)
+_WHITESPACE_RE = re.compile(r"\s+")
+# The reference after each FROM is captured inside a lookahead so that a
+# FROM within a reference is still found by the next finditer step: either a
+# closed quoted identifier plus an optional (possibly spaced) ".name" suffix,
+# or everything up to the next whitespace, comma or closing parenthesis
+_FROM_REFERENCE_RE = re.compile(
+    r"FROM\s+(?="
+    r"(?P<quoted>'[^']*'|\"[^\"]*\"|`[^`]*`)(?:\s*(?P<suffix>\.[^\s,)]*))?"
+    r"|(?P<bare>[^\s,)]*)"
+    r")"
+)
+
+# Whole-word, case-insensitive matcher for every dangerous keyword at once;
+# longest first so the most specific keyword is reported at any position
+_DANGEROUS_KEYWORD_RE = re.compile(
+    r"\b("
+    + "|".join(
+        re.escape(keyword)
+        for keyword in sorted(_DANGEROUS_KEYWORDS, key=len, reverse=True)
+    )
+    + r")\b",
+    re.IGNORECASE,
+)
+
+# Table names get_table_data may interpolate into its internal query
+_PLAIN_IDENTIFIER_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_$]*")
+
+# LIMIT handling in _validate_query_safety. Only a LIMIT closing the
+# statement bounds the rows the server sends back; it is matched against the
+# query with its comments blanked out, so a commented-out LIMIT never counts
+_TRAILING_LIMIT_RE = re.compile(
+    r"\bLIMIT\s+(\d+)(?:\s+OFFSET\s+\d+)?\s*;?\s*\Z", re.IGNORECASE
+)
+# String literals, quoted identifiers and comments, scanned left to right so
+# comment markers inside literals are left alone
+_SQL_COMMENT_SCAN_RE = re.compile(
+    r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"]|\"\")*\"|\$\$.*?\$\$"
+    r"|(?P<comment>--[^\n]*|//[^\n]*|/\*.*?(?:\*/|\Z))",
+    re.DOTALL,
+)
+# Functions whose value changes between runs; results using them are not cached
+_NONDETERMINISTIC_RE = re.compile(
+    r"\b(?:CURRENT_TIMESTAMP|CURRENT_TIME|CURRENT_DATE|LOCALTIMESTAMP|LOCALTIME"
+    r"|SYSDATE|GETDATE|RANDOM|UUID_STRING)\b",
+    re.IGNORECASE,
+)
+# Unquoted table names after FROM/JOIN; the lookahead captures an opening
+# parenthesis (a table function such as TABLE(...), not a table) or a
+# following comma, since comma-joined tables are not matched and make the
+# list incomplete
+_TABLE_REF_RE = re.compile(
+    r"\b(?:FROM|JOIN)\s+([A-Za-z_][\w$]*(?:\.[A-Za-z_][\w$]*){0,2})"
+    r"(?=\s*(\()|(?:\s+(?:AS\s+)?[A-Za-z_]\w*)?\s*(,)?)",
+    re.IGNORECASE,
+)
+# Functions whose arguments use FROM without naming a table, as in
+# EXTRACT(YEAR FROM col); their argument lists are skipped by the scan
+_FROM_ARGUMENT_FUNCTION_RE = re.compile(
+    r"\b(?:EXTRACT|TRIM|SUBSTRING|POSITION|OVERLAY)\s*\([^()]*\)", re.IGNORECASE
+)
+# Constructs whose sources _TABLE_REF_RE cannot see or name: quoted
+# identifiers, stages, comments, common table expressions and lateral joins
+_UNTRACKABLE_SOURCE_RE = re.compile(r"[\"@]|--|/\*|\b(?:WITH|LATERAL)\b", re.IGNORECASE)
+# C0 control characters other than tab, newline and carriage return
+_CONTROL_CHAR_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+@functools.lru_cache(maxsize=128)
+def _error_frame_template(message: str) -> pd.DataFrame:
+    """Build (once per message) the single-row DataFrame used to report errors."""
+    return pd.DataFrame({"error": [message]})
+
+
+def _error_frame(message: str) -> pd.DataFrame:
+    """
+    Return a DataFrame with a single 'error' row containing the given message.
+
+    Rejections repeat a small set of messages, so the frame is built once and
+    handed out as a deep copy, so a caller editing its frame cannot change
+    the error later callers see. The cache is bounded so user-influenced
+    messages cannot grow it unchecked.
+    """
+    return _error_frame_template(message).copy()
+
+
+@functools.lru_cache(maxsize=1)
 def is_running_in_spcs():
     """
     Checks if the current environment is Snowpark Container Services (SPCS)
     by looking for the Snowflake session token file.
+
+    The answer cannot change while the process runs, so it is computed once.
     """
-    snowflake_token_path = "/snowflake/session/token"
-    return os.path.exists(snowflake_token_path)
+    return os.path.exists(_SPCS_TOKEN_PATH)
 
 
 def get_login_token():
     """Get the login token from the Snowflake session token file."""
-    with open("/snowflake/session/token", "r") as f:
+    with open(_SPCS_TOKEN_PATH, "r") as f:
         return f.read()
 
 
-def get_snowflake_session() -> Optional[Session]:
-    """Create a Snowflake session using environment variables."""
+def _get_cached_login_token() -> str:
+    """Return the login token, re-reading the token file at most once per TTL."""
+    global _login_token_cache
+    now = time.monotonic()
+    if (
+        _login_token_cache is None
+        or now - _login_token_cache[1] > _LOGIN_TOKEN_TTL_SECONDS
+    ):
+        _login_token_cache = (get_login_token(), now)
+    return _login_token_cache[0]
+
+
+def _create_session() -> Optional[Session]:
+    """Create a new Snowflake session using environment variables."""
     try:
         if is_running_in_spcs():
             logger.info("Detected SPCS environment - using token authentication")
             connection_parameters = {
                 "host": os.getenv("SNOWFLAKE_HOST"),
                 "account": os.getenv("SNOWFLAKE_ACCOUNT"),
-                "token": get_login_token(),
+                "token": _get_cached_login_token(),
                 "authenticator": "oauth",
                 "database": os.getenv("SNOWFLAKE_DATABASE"),
                 "schema": os.getenv("SNOWFLAKE_SCHEMA", "PUBLIC"),
@@ -74,16 +677,99 @@ def get_snowflake_session() -> Optional[Session]:
             logger.info("Successfully connected to Snowflake locally")
         return session
     except Exception as e:
-        logger.error(f"Error connecting to Snowflake: {e}")
+        logger.error("Error connecting to Snowflake: %s", e)
         return None
 
 
+def _is_session_alive(session: Session) -> bool:
+    """Probe a cached session with a trivial query; any failure means reconnect."""
+    try:
+        session.sql("SELECT 1").collect()
+        return True
+    except Exception as e:
+        logger.info("Cached Snowflake session is no longer usable: %s", e)
+        return False
+
+
+def _close_quietly(session: Session) -> None:
+    """Close a session, ignoring errors from an already-broken connection."""
+    try:
+        session.close()
+    except Exception as e:
+        logger.warning("Error closing Snowflake session: %s", e)
+
+
+def get_snowflake_session() -> Optional[Session]:
+    """
+    Return the shared Snowflake session, connecting on first use.
+
+    A cached session idle for more than _SESSION_PROBE_IDLE_SECONDS is probed
+    before reuse and transparently replaced if the connection was lost or
+    expired; recently used sessions skip the probe's round-trip. Callers must
+    not close it; use close_session() on shutdown.
+    """
+    global _cached_session, _session_last_used
+    with _session_lock:
+        now = time.monotonic()
+        if _cached_session is not None:
+            if now - _session_last_used <= _SESSION_PROBE_IDLE_SECONDS or (
+                _is_session_alive(_cached_session)
+            ):
+                _session_last_used = now
+                return _cached_session
+            _close_quietly(_cached_session)
+            _cached_session = None
+
+        _cached_session = _create_session()
+        _session_last_used = now
+        return _cached_session
+
+
+def close_session() -> None:
+    """Close the shared Snowflake session, if one is open."""
+    global _cached_session
+    with _session_lock:
+        if _cached_session is not None:
+            _close_quietly(_cached_session)
+            _cached_session = None
+
+
+atexit.register(close_session)
+
+
 def get_schema_objects() -> pd.DataFrame:
+    """
+    Get all tables and views in SNOWFLAKE_SAMPLE_DATA.TPCH_SF10 schema.
+
+    Successful results are cached for _SCHEMA_OBJECTS_TTL_SECONDS so page loads
+    skip the INFORMATION_SCHEMA round-trip; errors are never cached. Callers
+    get their own copy, since pages rename the frame's columns in place.
+    """
+    global _schema_objects_cache
+    now = time.monotonic()
+    if (
+        _schema_objects_cache is None
+        or now - _schema_objects_cache[1] > _SCHEMA_OBJECTS_TTL_SECONDS
+    ):
+        result_df = _query_schema_objects()
+        if "error" in result_df.columns:
+            return result_df
+        _schema_objects_cache = (result_df, now)
+    return _schema_objects_cache[0].copy()
+
+
+def clear_schema_objects_cache() -> None:
+    """Drop the cached schema listing so the next lookup queries Snowflake."""
+    global _schema_objects_cache
+    _schema_objects_cache = None
+
+
+def _query_schema_objects() -> pd.DataFrame:
     """Query Snowflake to get all tables and views in SNOWFLAKE_SAMPLE_DATA.TPCH_SF10 schema."""
     session = get_snowflake_session()
     if session is None:
         logger.error("Failed to connect to Snowflake")
-        return pd.DataFrame({"error": ["Failed to connect to Snowflake"]})
+        return _error_frame("Failed to connect to Snowflake")
 
     try:
         # Query to get all tables and views from the specified schema
@@ -105,14 +791,13 @@ def get_schema_objects() -> pd.DataFrame:
         # Execute query and convert to pandas DataFrame
         result_df = session.sql(query).to_pandas()
         logger.info(
-            f"Successfully retrieved {len(result_df)} tables/views from Snowflake schema"
+            "Successfully retrieved %d tables/views from Snowflake schema",
+            len(result_df),
         )
-        session.close()
         return result_df
 
     except Exception as e:
-        logger.error(f"Error querying Snowflake: {e}")
-        session.close() if session else None
+        logger.error("Error querying Snowflake: %s", e)
         return pd.DataFrame({"error": [f"Query failed: {str(e)}"]})
 
 
@@ -125,288 +810,305 @@ def get_table_list() -> list:
 
 
 def get_table_data(table_name: str, limit: int = 1000) -> pd.DataFrame:
-    """Get data from a specific table in SNOWFLAKE_SAMPLE_DATA.TPCH_SF10 schema."""
+    """
+    Get data from a specific table in SNOWFLAKE_SAMPLE_DATA.TPCH_SF10 schema.
+
+    Reads through Snowpark's table API rather than a SQL string, and skips
+    _validate_query_safety, so the table name must be a plain identifier.
+    """
+    if not _PLAIN_IDENTIFIER_RE.fullmatch(table_name):
+        logger.warning("Rejected invalid table name: %r", table_name)
+        return _error_frame("Invalid table name")
+
     session = get_snowflake_session()
     if session is None:
         logger.error("Failed to connect to Snowflake")
-        return pd.DataFrame({"error": ["Failed to connect to Snowflake"]})
+        return _error_frame("Failed to connect to Snowflake")
 
     try:
-        query = f"""
-        SELECT *
-        FROM snowflake_sample_data.tpch_sf10.{table_name}
-        LIMIT {limit}
-        """
-
-        result_df = session.sql(query).to_pandas()
-        logger.info(f"Successfully retrieved {len(result_df)} rows from {table_name}")
-        session.close()
+        result_df = (
+            session.table(f"snowflake_sample_data.tpch_sf10.{table_name}")
+            .limit(limit)
+            .to_pandas()
+        )
+        logger.info(
+            "Successfully retrieved %d rows from %s", len(result_df), table_name
+        )
         return result_df
 
     except Exception as e:
-        logger.error(f"Error querying table {table_name}: {e}")
-        session.close() if session else None
+        logger.error("Error querying table %s: %s", table_name, e)
         return pd.DataFrame({"error": [f"Query failed: {str(e)}"]})
 
 
-def _perform_additional_security_checks(
-    query_upper: str, original_query: str
-) -> Dict[str, Union[bool, str]]:
+def _grid_column_def(name, numeric: bool = False, temporal: bool = False) -> Dict:
+    """Build an AG Grid column definition with a filter suited to the data type."""
+    col_def = {
+        "headerName": str(name),
+        "field": str(name),
+        "sortable": True,
+        "filter": "agTextColumnFilter",
+        "resizable": True,
+    }
+    if numeric:
+        col_def["type"] = "numericColumn"
+        col_def["filter"] = "agNumberColumnFilter"
+    elif temporal:
+        col_def["filter"] = "agDateColumnFilter"
+    return col_def
+
+
+def _column_filter_types(dtype) -> Tuple[bool, bool]:
+    """
+    Classify a column dtype as (numeric, temporal) for its grid filter.
+
+    The pandas type predicates recognize NumPy, nullable and Arrow-backed
+    dtypes alike, including timezone-aware and non-nanosecond datetimes.
+    Booleans keep the text filter.
+    """
+    numeric = pd.api.types.is_numeric_dtype(dtype) and not (
+        pd.api.types.is_bool_dtype(dtype)
+    )
+    return numeric, pd.api.types.is_datetime64_any_dtype(dtype)
+
+
+@functools.lru_cache(maxsize=128)
+def _build_column_defs(
+    columns: Tuple, filter_types: Tuple[Tuple[bool, bool], ...]
+) -> Tuple[Dict, ...]:
+    """
+    Build (once per column signature) the AG Grid column definitions for a result.
+
+    Dashboards re-run the same query shapes, so the definitions are keyed on the
+    column names and filter types and shared between refreshes. The returned
+    dicts are shared too and must not be mutated by callers.
+    """
+    return tuple(
+        _grid_column_def(col, numeric=numeric, temporal=temporal)
+        for col, (numeric, temporal) in zip(columns, filter_types)
+    )
+
+
+# Timestamps, datetimes and dates (including Arrow date32 values) alike
+_isoformat = operator.methodcaller("isoformat")
+
+
+def _json_column_values(column: pd.Series) -> List:
+    """
+    Convert one column to plain JSON-native Python values, missing values as None.
+
+    Timestamps keep their full precision and UTC offset via isoformat, and
+    floats keep their shortest round-trip repr, exactly as Dash's encoder
+    rendered them from to_dict records. Object columns of dates are rendered
+    as plain ISO dates rather than as midnight timestamps.
+    """
+    if pd.api.types.is_datetime64_any_dtype(column.dtype) or (
+        column.dtype == object
+        and pd.api.types.infer_dtype(column, skipna=True) == "date"
+    ):
+        column = column.map(_isoformat, na_action="ignore")
+    column = column.astype(object)
+    return column.where(column.notna(), None).tolist()
+
+
+def _grid_row_payload(display_df: pd.DataFrame) -> Dict:
+    """
+    Convert a frame to columnar AG Grid rows holding only JSON-native values.
+
+    Returns {"columns": [...], "data": [[...], ...]}: every value row is a
+    plain list, so the payload does not repeat each column name per row, and
+    the browser assembles the row objects. Values are converted a column at a
+    time, so Dash serializes plain Python values instead of running its
+    encoder fallback on numpy scalars and Timestamps.
+    """
+    # Positional, since SELECT a, a yields two columns named "A"
+    columns = [
+        _json_column_values(display_df.iloc[:, i])
+        for i in range(len(display_df.columns))
+    ]
+    # Numeric columns are not downcast: JSON text for a value is the same at
+    # any integer width, and float32 only adds rounding noise digits; nor are
+    # repeated strings made categorical, since each row spells them out
+    return {
+        "columns": [str(col) for col in display_df.columns],
+        "data": [list(row) for row in zip(*columns)],
+    }
+
+
+# Pattern-matching ID types pairing each results grid with its row store; the
+# app registers the clientside callback that fills the grid from the store
+GRID_ID_TYPE = "query-results-grid"
+GRID_ROWS_ID_TYPE = "query-results-rows"
+
+
+def _remove_sql_comments(query_text: str) -> str:
+    """Remove SQL comments while preserving string literals."""
+    # Remove single-line comments (-- style); a C-level substring test
+    # skips the regex pass for the usual comment-free query
+    if "--" in query_text:
+        query_text = _LINE_COMMENT_RE.sub("", query_text)
+
+    # Remove multi-line comments (/* */ style) in one pass; an unclosed
+    # comment runs to the end of the query
+    query_text = _BLOCK_COMMENT_RE.sub(" ", query_text)
+
+    # Normalize whitespace after comment removal
+    query_text = _WHITESPACE_RE.sub(" ", query_text).strip()
+    return query_text
+
+
+def _extract_table_references(query_upper: str) -> List[str]:
+    """
+    Extract the table reference that follows each FROM keyword.
+
+    Quoted identifiers are kept whole, together with any ``.name`` suffix;
+    unquoted (or unclosed) references run until the next whitespace, comma or
+    closing parenthesis.
+
+    Args:
+        query_upper (str): Comment-free, upper-cased query
+
+    Returns:
+        List of raw table references, quotes included
+    """
+    from_matches = []
+    for match in _FROM_REFERENCE_RE.finditer(query_upper):
+        if match.group("quoted") is not None:
+            from_matches.append(match.group("quoted") + (match.group("suffix") or ""))
+        else:
+            # Regular identifier, or unclosed quote treated as one
+            from_matches.append(match.group("bare"))
+    return from_matches
+
+
+def _perform_additional_security_checks(query: str) -> _CheckResult:
     """
     Perform additional security validations on the SQL query.
 
+    Oversized queries and control characters are rejected up front. Other
+    decisions are memoized in a bounded LRU cache, since identical SQL is
+    frequently re-submitted. Each call returns its own copy of the result.
+
     Args:
-        query_upper (str): Uppercase version of query for pattern matching
-        original_query (str): Original query for context in error messages
+        query (str): Original query as submitted by the user
 
     Returns:
         Dict with error status and message
     """
+    rejection = _precheck_query(query)
+    if rejection is not None:
+        return rejection
+    return _cached_security_checks(query).copy()
 
-    # SECURITY FIX: Unicode normalization and dangerous character detection
-    import unicodedata
 
+def _precheck_query(query: str) -> Optional[_CheckResult]:
+    """
+    Reject oversized queries and control characters before any costly checks.
+
+    Both tests are linear scans in C, so abusive inputs are turned away before
+    NFKC normalization, the Unicode scan or any pattern matching runs.
+
+    Returns:
+        The rejection dict, or None if the query may proceed
+    """
+    if len(query) > _MAX_QUERY_LENGTH:
+        return {
+            "error": True,
+            "message": "Query is too long. Maximum query length is 10,000 characters.",
+            "safe_query": "",
+        }
+    if _CONTROL_CHAR_RE.search(query):
+        return {
+            "error": True,
+            "message": "Query contains control characters. Only printable SQL text is allowed.",
+            "safe_query": "",
+        }
+    return None
+
+
+def _run_security_checks(query: str) -> _CheckResult:
+    """
+    Run every additional security validation on the SQL query (uncached).
+
+    The uppercase form used for pattern matching is derived here, once, from
+    the Unicode-normalized query so callers don't need to build their own copy.
+
+    Args:
+        query (str): Original query as submitted by the user
+
+    Returns:
+        Dict with error status and message
+    """
+
+    # SECURITY FIX: Unicode normalization and dangerous character detection
+    original_query = query
     try:
         # Normalize Unicode characters to prevent bypass attempts
         normalized_query = unicodedata.normalize("NFKC", original_query)
-        normalized_upper = normalized_query.upper()
 
         # ENHANCED: Check for suspicious Unicode characters and lookalikes
-        # General check for non-ASCII characters in SQL keywords positions
-        def contains_suspicious_unicode(text):
-            """Check for Unicode characters that might be SQL keyword lookalikes."""
-            # Check for any non-ASCII characters in positions that look like SQL keywords
-            import unicodedata
-
-            # Known dangerous Unicode blocks
-            dangerous_blocks = [
-                "FULLWIDTH",  # Full-width characters
-                "CHEROKEE",  # Cherokee characters used as lookalikes
-                "CYRILLIC",  # Cyrillic lookalikes
-                "MATHEMATICAL",  # Mathematical script characters
-            ]
-
-            # Only check for dangerous Unicode in potential SQL keyword positions
-            sql_keywords = [
-                "SELECT",
-                "FROM",
-                "WHERE",
-                "UNION",
-                "ORDER",
-                "GROUP",
-                "HAVING",
-                "INSERT",
-                "UPDATE",
-                "DELETE",
-                "DROP",
-                "CREATE",
-                "ALTER",
-            ]
-
-            for keyword in sql_keywords:
-                # Check if there are Unicode lookalikes for SQL keywords
-                for i in range(len(text) - len(keyword) + 1):
-                    substring = text[i : i + len(keyword)]
-                    if any(ord(char) > 127 for char in substring):
-                        # Found Unicode characters in keyword-length substring
-                        try:
-                            for char in substring:
-                                if ord(char) > 127:
-                                    char_name = unicodedata.name(char, "")
-                                    for block in dangerous_blocks:
-                                        if block in char_name:
-                                            return True
-                        except ValueError:
-                            pass
-
-            # Specific pattern matching for Unicode lookalikes only (not ASCII)
-            # Only detect when actual Unicode lookalikes are used, not ASCII letters
-            suspicious_patterns = [
-                r"[ᎾО][ᴿRр][ᴰDḊ][ᴱEе][ᴿRр]",  # ORDER with Unicode lookalikes
-                r"[ᵁUｕ][ᴺNｎ][ᴵIｉ][ᴼOｏ][ᴺNｎ]",  # UNION with Unicode lookalikes
-                r"[ˢSｓ][ᴱEｅ][ᴸLｌ][ᴱEｅ][ᶜCｃ][ᵀTｔ]",  # SELECT with Unicode lookalikes
-                r"[ᴰDｄ][ᴿRｒ][ᴼOｏ][ᴾPｐ]",  # DROP with Unicode lookalikes
-                r"[ᴵIｉ][ᴺNｎ][ˢSｓ][ᴱEｅ][ᴿRｒ][ᵀTｔ]",  # INSERT with Unicode lookalikes
-            ]
-
-            for pattern in suspicious_patterns:
-                match = re.search(pattern, text, re.IGNORECASE)
-                if match:
-                    # Only flag if the match contains actual Unicode characters
-                    matched_text = match.group(0)
-                    if any(ord(char) > 127 for char in matched_text):
-                        return True
-
-            return False
-
-        if contains_suspicious_unicode(original_query):
+        if _contains_suspicious_unicode(original_query):
             return {
                 "error": True,
                 "message": "Query contains suspicious Unicode characters that may be attempts to bypass security. ASCII-only SQL keywords are required.",
                 "safe_query": "",
             }
 
-        # Use normalized versions for all security checks
-        query_upper = normalized_upper
+        # Use the normalized version for all security checks
         original_query = normalized_query
     except Exception:
         # If normalization fails, proceed with original (safer than allowing bypass)
         pass
 
-    # SECURITY FIX: First check for dangerous injection patterns BEFORE comment removal
-    dangerous_patterns_pre_comment_removal = [
-        r"'--",  # Classic comment injection (string termination with comment)
-        r"';",  # Statement termination
-        r"--.*?;.*?(INSERT|UPDATE|DELETE|DROP)",  # Comments with statements
-        r"--.*?(DROP|DELETE|UPDATE|INSERT).*?;",  # Comments followed by dangerous statements
-    ]
+    # Selects the ASCII or Unicode compilation of each scan pattern
+    is_ascii = original_query.isascii()
 
-    for pattern in dangerous_patterns_pre_comment_removal:
-        if re.search(pattern, original_query):
+    # SECURITY FIX: First check for dangerous injection patterns BEFORE comment removal
+    for pattern in _PRE_COMMENT_INJECTION_RES[is_ascii]:
+        if pattern.search(original_query):
             return {
                 "error": True,
                 "message": "Query contains potentially malicious pattern. SQL injection attempts are not allowed.",
                 "safe_query": "",
             }
 
-    # SECURITY FIX: Remove comments before pattern matching to prevent comment-based bypasses
-    def _remove_sql_comments(query_text: str) -> str:
-        """Remove SQL comments while preserving string literals."""
-        # Remove single-line comments (-- style)
-        query_text = re.sub(r"--.*?$", "", query_text, flags=re.MULTILINE)
-
-        # Remove multi-line comments (/* */ style) - handle nested comments
-        while True:
-            # Find the first /* and its matching */
-            start = query_text.find("/*")
-            if start == -1:
-                break
-
-            # Find the matching */
-            end = query_text.find("*/", start + 2)
-            if end == -1:
-                # Unclosed comment - remove everything from /*
-                query_text = query_text[:start]
-                break
-            else:
-                # Remove the comment
-                query_text = query_text[:start] + " " + query_text[end + 2 :]
-
-        # Normalize whitespace after comment removal
-        query_text = re.sub(r"\s+", " ", query_text).strip()
-        return query_text
-
-    # Apply comment removal to both versions
+    # SECURITY FIX: Remove comments before pattern matching to prevent comment-based bypasses.
+    # Comment markers and whitespace are unaffected by str.upper(), so the
+    # query only needs stripping once; the uppercase copy is derived from it
     comment_free_query = _remove_sql_comments(original_query)
-    comment_free_upper = _remove_sql_comments(query_upper)
-
-    # SECURITY FIX: Check for keywords that might be reconstructed after comment removal
-    dangerous_reconstructed_keywords = [
-        "UNION",
-        "SELECT",
-        "INSERT",
-        "UPDATE",
-        "DELETE",
-        "DROP",
-        "CREATE",
-        "ALTER",
-        "GRANT",
-        "REVOKE",
-        "EXECUTE",
-        "CALL",
-        "TRUNCATE",
-        "MERGE",
-    ]
-
-    # Also check with spaces removed (in case comments leave spaces between keyword parts)
-    comment_free_no_spaces = re.sub(r"\s+", "", comment_free_upper)
-    query_upper_no_spaces = re.sub(r"\s+", "", query_upper)
-
-    for keyword in dangerous_reconstructed_keywords:
-        # Check if removing comments creates dangerous keywords where there weren't any before
-        keyword_appears_after_comment_removal = (
-            keyword in comment_free_upper or keyword in comment_free_no_spaces
-        )
-        keyword_existed_before = (
-            keyword in query_upper or keyword in query_upper_no_spaces
-        )
+    query_upper = comment_free_query.upper()
+
+    # SECURITY FIX: Check for keywords that might be reconstructed after comment removal.
+    # Without comment markers, stripping only collapses whitespace, which cannot
+    # join two fragments into a keyword, so the check is skipped entirely
+    if "--" in original_query or "/*" in original_query:
+        raw_upper = original_query.upper()
+        # Also check with spaces removed (in case comments leave spaces between
+        # keyword parts); the comment-free copy only has single spaces left
+        comment_free_no_spaces = query_upper.replace(" ", "")
+        raw_upper_no_spaces = raw_upper.translate(_WHITESPACE_STRIP_TABLE)
+
+        for keyword in _RECONSTRUCTED_KEYWORDS:
+            # Check if removing comments creates dangerous keywords where there weren't any before
+            keyword_appears_after_comment_removal = (
+                keyword in query_upper or keyword in comment_free_no_spaces
+            )
+            keyword_existed_before = (
+                keyword in raw_upper or keyword in raw_upper_no_spaces
+            )
 
-        if keyword_appears_after_comment_removal and not keyword_existed_before:
-            return {
-                "error": True,
-                "message": f"Query appears to use comments to split dangerous keyword '{keyword}'. This is not allowed.",
-                "safe_query": "",
-            }
+            if keyword_appears_after_comment_removal and not keyword_existed_before:
+                return {
+                    "error": True,
+                    "message": f"Query appears to use comments to split dangerous keyword '{keyword}'. This is not allowed.",
+                    "safe_query": "",
+                }
 
-    # Update query versions for pattern matching
-    query_upper = comment_free_upper
     original_query = comment_free_query
 
     # 1. Check for SQL injection patterns (comprehensive)
-    injection_patterns = [
-        # Basic injection patterns
-        r";\s*(DROP|DELETE|UPDATE|INSERT)",  # Statement termination with dangerous commands
-        r"--.*?(INSERT|UPDATE|DELETE|DROP)",  # Comments hiding dangerous commands
-        r"/\*.*?(INSERT|UPDATE|DELETE|DROP).*?\*/",  # Block comments hiding commands
-        r"UNION.*?(SELECT.*?(PASSWORD|CREDENTIAL|SECRET|TOKEN))",  # Union-based injection
-        r"UNION\s+SELECT",  # Basic UNION injection
-        r"\b1\s*=\s*1\b",  # Common injection condition
-        r"OR\s+1\s*=\s*1",  # OR-based injection
-        r"AND\s+1\s*=\s*1",  # AND-based injection
-        r"'\s*OR\s*'.*?'\s*=\s*'",  # String-based injection
-        r"'\s*=\s*'",  # Simple string equality (potential injection)
-        r"\bTRUE\s*=\s*TRUE\b",  # Boolean condition injection
-        r"\b\d+\s*=\s*\d+\b",  # Numeric equality conditions
-        # Advanced injection patterns
-        r"'\s*AND\s*\(",  # Parenthetical injection
-        r"'\s*OR\s*\(",  # OR with subquery
-        r"SELECT.*?FROM.*?INFORMATION_SCHEMA\.USER_PRIVILEGES",  # User privilege queries
-        r"SELECT.*?FROM.*?INFORMATION_SCHEMA\.ROLE_GRANTS",  # Role grant queries
-        r"SELECT.*?PRIVILEGE_TYPE.*?FROM.*?INFORMATION_SCHEMA",  # Privilege enumeration
-        r"SELECT.*?GRANTEE.*?FROM.*?INFORMATION_SCHEMA",  # Grantee enumeration
-        r"SHOW\s+GRANTS\s+TO\s+ROLE",  # Show grants enumeration
-        r"DESCRIBE\s+TABLE",  # Table structure enumeration
-        r"SELECT.*?TABLE_NAME.*?FROM.*?INFORMATION_SCHEMA\.TABLES.*?WHERE.*?TABLE_SCHEMA.*?NOT.*?IN",  # Advanced table enumeration (suspicious filtering)
-        r"SELECT.*?TABLE_NAME.*?FROM.*?INFORMATION_SCHEMA\.TABLES.*?UNION",  # Table enumeration with UNION (suspicious)
-        r"SELECT.*?COLUMN_NAME.*?FROM.*?INFORMATION_SCHEMA\.COLUMNS.*?UNION",  # Column enumeration with UNION (suspicious)
-        r"SELECT.*?COLUMN_NAME.*?FROM.*?INFORMATION_SCHEMA\.COLUMNS.*?WHERE.*?TABLE_NAME.*?NOT.*?IN",  # Suspicious filtering
-        r"SELECT.*?COLUMN_NAME.*?FROM.*?INFORMATION_SCHEMA\.COLUMNS.*?WHERE.*?TABLE_NAME.*?=.*?'USERS'",  # Specific sensitive user table enumeration (test case)
-        r"ASCII\s*\(\s*SUBSTRING",  # Character extraction functions
-        r"SUBSTRING\s*\(\s*\(\s*SELECT",  # Subquery in substring
-        r"EXISTS\s*\(\s*SELECT",  # Exists subqueries
-        r"AND\s+\d+\s*=\s*\(\s*SELECT",  # Blind injection with subquery
-        r"=\s*\(\s*SELECT\s+COUNT",  # Count-based blind injection
-        r"WAITFOR\s+DELAY",  # Time delay functions
-        r"SLEEP\s*\(",  # Sleep functions
-        r"BENCHMARK\s*\(",  # Benchmark functions
-        r"PG_SLEEP\s*\(",  # PostgreSQL sleep
-        r"DECLARE\s+@",  # Variable declarations
-        r"EXEC\s*\(\s*@",  # Dynamic SQL execution
-        r"XP_CMDSHELL",  # Command shell execution
-        r"SP_EXECUTESQL",  # Dynamic SQL procedures
-        r"INTO\s+OUTFILE",  # File output
-        r"LOAD_FILE\s*\(",  # File loading
-        r"'\s*\+\s*'",  # String concatenation
-        r"CHAR\s*\(\s*\d+\s*\)",  # Character encoding
-        r"CHR\s*\(\s*\d+\s*\)",  # Character encoding (Oracle)
-        r"CONCAT\s*\(",  # String concatenation functions
-        r"'\s*\|\|\s*'",  # String concatenation operator
-        r"'--",  # Comment after quote (SQL comment injection)
-        r"';--",  # Statement end with comment
-        r"#.*?(DROP|DELETE|INSERT|UPDATE)",  # MySQL style comments with dangerous commands
-        r"/\*.*?(DROP|DELETE|INSERT|UPDATE).*?\*/",  # Block comments with dangerous commands already covered above
-        r"'\s*;",  # Quote followed by statement terminator
-        # Resource exhaustion patterns
-        r"FROM\s+\w+\s+\w+,\s*\w+\s+\w+,\s*\w+\s+\w+",  # Multiple table aliases (Cartesian product)
-        r"CROSS\s+JOIN",  # Cross joins
-        r"WITH\s+RECURSIVE",  # Recursive CTEs
-        r"\bSELECT\s+\*.*?;.*?SELECT",  # Multiple statements
-        r"COUNT\s*\(\s*\*\s*\).*?FROM.*?LARGE_TABLE",  # Suspicious counting operations
-        r"WHERE.*?IN\s*\(\s*SELECT.*?WHERE.*?IN\s*\(\s*SELECT",  # Deeply nested subqueries
-    ]
-
-    for pattern in injection_patterns:
-        if re.search(pattern, query_upper):
+    for trigger, patterns in _INJECTION_RES[is_ascii]:
+        if trigger in query_upper and any(p.search(query_upper) for p in patterns):
             return {
                 "error": True,
                 "message": "Query contains potentially malicious pattern. SQL injection attempts are not allowed.",
@@ -414,25 +1116,31 @@ def _perform_additional_security_checks(
             }
 
     # 2. Check for excessive complexity (prevent DoS attacks) - SECURITY FIX
-    if len(original_query) > 10000:  # 10KB limit
+    if len(original_query) > _MAX_QUERY_LENGTH:  # 10KB limit
         return {
             "error": True,
             "message": "Query is too long. Maximum query length is 10,000 characters.",
             "safe_query": "",
         }
 
-    # Count parentheses depth (prevent deeply nested queries)
-    max_depth = 0
-    current_depth = 0
-    for char in original_query:
-        if char == "(":
-            current_depth += 1
-            max_depth = max(max_depth, current_depth)
-        elif char == ")":
-            current_depth -= 1
+    # Count parentheses depth (prevent deeply nested queries). Depth can never
+    # exceed the number of opening parentheses, which str.count finds in C, so
+    # only queries that could be too deep are walked - and then only over the
+    # parentheses themselves, stopping at the first level past the limit
+    too_deep = False
+    if original_query.count("(") > 10:
+        current_depth = 0
+        for paren in _PAREN_RE.findall(original_query):
+            if paren == "(":
+                current_depth += 1
+                if current_depth > 10:
+                    too_deep = True
+                    break
+            else:
+                current_depth -= 1
 
     # SECURITY FIX: Correct boundary condition - allow exactly 10 levels
-    if max_depth > 10:
+    if too_deep:
         return {
             "error": True,
             "message": "Query has too many nested parentheses. Maximum nesting depth is 10.",
@@ -440,7 +1148,7 @@ def _perform_additional_security_checks(
         }
 
     # 3. Check for excessive JOINs (prevent performance issues)
-    join_count = len(re.findall(r"\bJOIN\b", query_upper))
+    join_count = len(_JOIN_RES[is_ascii][0].findall(query_upper))
     if join_count > 5:
         return {
             "error": True,
@@ -449,19 +1157,8 @@ def _perform_additional_security_checks(
         }
 
     # 4. Check for dangerous functions and expressions
-    dangerous_patterns = [
-        r"LATERAL\s+VIEW",  # Lateral views can be resource intensive
-        r"RECURSIVE",  # Recursive CTEs can cause infinite loops
-        r"CONNECT\s+BY",  # Hierarchical queries can be problematic
-        r"MODEL\s+",  # MODEL clause can be resource intensive
-        r"XMLTABLE",  # XML processing can be slow
-        r"JSON_TABLE",  # JSON processing with large data
-        r"PIVOT\s*\(",  # Complex pivot operations
-        r"UNPIVOT\s*\(",  # Complex unpivot operations
-    ]
-
-    for pattern in dangerous_patterns:
-        if re.search(pattern, query_upper):
+    for pattern in _RESTRICTED_FEATURE_RES[is_ascii]:
+        if pattern.search(query_upper):
             return {
                 "error": True,
                 "message": "Query contains restricted SQL feature. Complex operations are not allowed.",
@@ -469,93 +1166,26 @@ def _perform_additional_security_checks(
             }
 
     # 5. Validate allowed schemas/databases (whitelist approach) - SECURITY FIX
-    allowed_schemas = ["SNOWFLAKE_SAMPLE_DATA", "INFORMATION_SCHEMA"]
-
-    # Extract FROM clauses to check table references (handle quoted identifiers)
-    # Simple but effective approach: find FROM followed by everything until space or comma
-    from_matches = []
 
-    # Find all FROM clauses
-    for match in re.finditer(r"FROM\s+", query_upper):
-        start_pos = match.end()
-
-        # Extract everything from this position until we hit a space, comma, or end
-        remaining = query_upper[start_pos:]
-
-        # Handle quoted identifiers by finding matching quotes
-        if remaining.startswith(
-            ("'", '"', "`", "'", "'", """, """)
-        ):  # Regular and smart quotes
-            quote_char = remaining[0]
-            end_quote_pos = remaining.find(quote_char, 1)
-            if end_quote_pos > 0:
-                # Found closing quote, now look for the rest (e.g., .table_name)
-                table_ref = remaining[: end_quote_pos + 1]
-                # Check if there's more after the quote (like .table_name)
-                remainder = remaining[end_quote_pos + 1 :].lstrip()
-                if remainder.startswith("."):
-                    # Add the rest until next space/comma
-                    next_break = re.search(r"[\s,\)]", remainder)
-                    if next_break:
-                        table_ref += remainder[: next_break.start()]
-                    else:
-                        table_ref += remainder
-                from_matches.append(table_ref)
-            else:
-                # Unclosed quote, treat as regular identifier
-                next_break = re.search(r"[\s,\)]", remaining)
-                if next_break:
-                    from_matches.append(remaining[: next_break.start()])
-                else:
-                    from_matches.append(remaining)
-        else:
-            # Regular identifier
-            next_break = re.search(r"[\s,\)]", remaining)
-            if next_break:
-                from_matches.append(remaining[: next_break.start()])
-            else:
-                from_matches.append(remaining)
-    for table_ref in from_matches:
+    # References come from the uppercase form, and deleting quotes and
+    # whitespace cannot introduce lowercase, so they need no further case-folding
+    for table_ref in _extract_table_references(query_upper):
         # SECURITY FIX: Comprehensive quote and whitespace removal (including smart quotes)
-        clean_table = table_ref.replace('"', "").replace("'", "").replace("`", "")
-        clean_table = clean_table.replace("'", "").replace("'", "")  # Smart quotes
-        clean_table = clean_table.replace(
-            """, "").replace(""", ""
-        )  # Smart double quotes
-        clean_table = clean_table.strip()  # Remove leading/trailing whitespace
-        clean_table = re.sub(r"\s+", "", clean_table)  # Remove internal whitespace
+        clean_table = table_ref.translate(_QUOTE_STRIP_TABLE)
 
         if "." in clean_table:
-            schema_part = clean_table.split(".")[
-                0
-            ].upper()  # SECURITY FIX: Case-insensitive comparison
+            schema_part = clean_table.split(".", 1)[0]
             # SECURITY FIX: Check against uppercase allowed schemas
-            allowed_schemas_upper = [schema.upper() for schema in allowed_schemas]
-            if schema_part not in allowed_schemas_upper:
+            if schema_part not in _ALLOWED_SCHEMAS_UPPER:
                 return {
                     "error": True,
-                    "message": f'Access to schema "{schema_part}" is not allowed. Only {", ".join(allowed_schemas)} are permitted.',
+                    "message": f'Access to schema "{schema_part}" is not allowed. Only {", ".join(_ALLOWED_SCHEMAS)} are permitted.',
                     "safe_query": "",
                 }
 
     # 6. Check for file operations or external references
-    file_patterns = [
-        r"FROM\s+@[\w_]+",  # Stage references in FROM clauses
-        r"COPY\s+.*@[\w_]+",  # Stage references in COPY commands
-        r"LIST\s+@[\w_]+",  # LIST stage operations
-        r"GET\s+@[\w_]+",  # GET stage operations
-        r"PUT\s+.*@[\w_]+",  # PUT stage operations
-        r"FILE_FORMAT",  # File format specifications
-        r"EXTERNAL",  # External table references
-        r"S3://",  # S3 references
-        r"AZURE://",  # Azure references
-        r"GCS://",  # Google Cloud references
-        r"HTTP://",  # HTTP references
-        r"HTTPS://",  # HTTPS references
-    ]
-
-    for pattern in file_patterns:
-        if re.search(pattern, query_upper):
+    for pattern in _FILE_RES[is_ascii]:
+        if pattern.search(query_upper):
             return {
                 "error": True,
                 "message": "File operations and external references are not allowed.",
@@ -569,7 +1199,11 @@ def _perform_additional_security_checks(
     }
 
 
-def _check_rate_limit() -> Dict[str, Union[bool, str]]:
+# Bounded so that distinct user queries cannot grow it without limit
+_cached_security_checks = functools.lru_cache(maxsize=1024)(_run_security_checks)
+
+
+def _check_rate_limit() -> _CheckResult:
     """
     Check if the current request exceeds rate limits.
 
@@ -578,27 +1212,71 @@ def _check_rate_limit() -> Dict[str, Union[bool, str]]:
     """
     current_time = time.time()
 
-    # Clean old entries (older than 1 minute)
-    global _query_history
-    _query_history[:] = [
-        timestamp for timestamp in _query_history if current_time - timestamp < 60
-    ]
+    with _rate_limit_lock:
+        # Clean old entries (older than 1 minute); timestamps are appended in
+        # order, so the stale ones are always at the front
+        while _query_history and current_time - _query_history[0] >= 60:
+            _query_history.popleft()
 
-    # Check rate limit
-    if len(_query_history) >= _MAX_QUERIES_PER_MINUTE:
-        return {
-            "error": True,
-            "message": f"Rate limit exceeded. Maximum {_MAX_QUERIES_PER_MINUTE} queries per minute allowed.",
-            "safe_query": "",
-        }
+        # Check rate limit
+        if len(_query_history) >= _MAX_QUERIES_PER_MINUTE:
+            return {
+                "error": True,
+                "message": f"Rate limit exceeded. Maximum {_MAX_QUERIES_PER_MINUTE} queries per minute allowed.",
+                "safe_query": "",
+            }
 
-    # Add current request to history
-    _query_history.append(current_time)
+        # Add current request to history
+        _query_history.append(current_time)
 
     return {"error": False, "message": "Rate limit check passed", "safe_query": ""}
 
 
-def _validate_query_safety(query: str, max_rows: int) -> Dict[str, Union[bool, str]]:
+def _starts_with_select(query: str) -> bool:
+    """
+    Check that the first token after leading whitespace and comments is SELECT.
+
+    Only the prefix is walked, skipping whitespace, closed /* */ comments and
+    newline-terminated -- comments, so long queries are never fully scanned.
+    An unclosed leading comment means the query cannot start with SELECT.
+    """
+    i = 0
+    length = len(query)
+    while i < length:
+        if query[i].isspace():
+            i += 1
+        elif query.startswith("/*", i):
+            end = query.find("*/", i + 2)
+            if end == -1:
+                return False
+            i = end + 2
+        elif query.startswith("--", i):
+            end = query.find("\n", i + 2)
+            if end == -1:
+                return False
+            i = end + 1
+        else:
+            break
+    return query[i : i + 6].upper() == "SELECT" and query[i + 6 : i + 7].isspace()
+
+
+def _blank_sql_comments(query: str) -> str:
+    """
+    Replace each SQL comment with spaces, leaving every other offset unchanged.
+
+    Positions found in the result therefore index the original query too.
+    """
+    if "--" not in query and "/*" not in query and "//" not in query:
+        return query
+    return _SQL_COMMENT_SCAN_RE.sub(
+        lambda m: " " * len(m.group(0)) if m.group("comment") else m.group(0),
+        query,
+    )
+
+
+def _validate_query_safety(
+    query: str, max_rows: int, detect_truncation: bool = False
+) -> _CheckResult:
     """
     Validate that a query is safe to execute by checking for SELECT-only operations
     and ensuring proper LIMIT clauses.
@@ -606,6 +1284,8 @@ def _validate_query_safety(query: str, max_rows: int) -> Dict[str, Union[bool, s
     Args:
         query (str): The SQL query to validate
         max_rows (int): Maximum allowed rows
+        detect_truncation (bool): Cap at max_rows + 1 instead, so a caller
+            that receives the extra row knows the result was cut short
 
     Returns:
         Dict containing 'error' (bool), 'message' (str), and 'safe_query' (str)
@@ -615,82 +1295,28 @@ def _validate_query_safety(query: str, max_rows: int) -> Dict[str, Union[bool, s
     if not query:
         return {"error": True, "message": "Empty query provided", "safe_query": ""}
 
-    # Enforce maximum row limit
-    max_rows = min(max_rows, 10000)  # Hard cap at 10,000 rows
-
-    # Convert to uppercase for keyword checking (but preserve original case for execution)
-    query_upper = query.upper()
-
-    # Security checks - expanded dangerous keywords
-    dangerous_keywords = [
-        # Data modification
-        "INSERT",
-        "UPDATE",
-        "DELETE",
-        "DROP",
-        "CREATE",
-        "ALTER",
-        "TRUNCATE",
-        "MERGE",
-        "REPLACE",
-        "SWAP",
-        # System/admin operations
-        "GRANT",
-        "REVOKE",
-        "EXECUTE",
-        "CALL",
-        "COPY",
-        "PUT",
-        "GET",
-        "REMOVE",
-        "LIST",
-        "SHOW GRANTS",
-        "SHOW ROLES",
-        "USE ROLE",
-        "USE WAREHOUSE",
-        "SET",
-        "UNSET",
-        "BEGIN",
-        "COMMIT",
-        "ROLLBACK",
-        # Stored procedures and functions
-        "PROCEDURE",
-        "FUNCTION",
-        "TASK",
-        "STREAM",
-        "STAGE",
-        # File operations
-        "LOAD",
-        "UNLOAD",
-        "$",
-        # Potentially dangerous system functions
-        "SYSTEM$",
-        "CURRENT_ROLE",
-        "CURRENT_USER",
-    ]
-
-    # Check for dangerous keywords (whole word matches only)
-    import re
+    # Turn away oversized or control-character input before the scans below
+    rejection = _precheck_query(query)
+    if rejection is not None:
+        return rejection
 
-    for keyword in dangerous_keywords:
-        # Use word boundary regex to match whole keywords only
-        if re.search(r"\b" + re.escape(keyword) + r"\b", query_upper):
-            return {
-                "error": True,
-                "message": f"Query contains forbidden keyword: {keyword}. Only SELECT statements are allowed.",
-                "safe_query": "",
-            }
+    # Enforce maximum row limit
+    max_rows = min(max_rows, _MAX_RESULT_ROWS)  # Hard cap at 10,000 rows
+    row_cap = max_rows + 1 if detect_truncation else max_rows
+
+    # Check for dangerous keywords (whole word matches only); matching is
+    # case-insensitive so the query is never copied just to upper-case it
+    keyword_match = _DANGEROUS_KEYWORD_RE.search(query)
+    if keyword_match:
+        keyword = keyword_match.group(1).upper()
+        return {
+            "error": True,
+            "message": f"Query contains forbidden keyword: {keyword}. Only SELECT statements are allowed.",
+            "safe_query": "",
+        }
 
     # Must start with SELECT (allowing for comments and whitespace)
-    query_cleaned = re.sub(
-        r"^\s*(/\*.*?\*/\s*)*", "", query, flags=re.DOTALL
-    )  # Remove leading comments
-    query_cleaned = re.sub(
-        r"^\s*--.*?\n\s*", "", query_cleaned, flags=re.MULTILINE
-    )  # Remove leading line comments
-    query_cleaned = query_cleaned.strip()
-
-    if not re.match(r"^\s*SELECT\s+", query_cleaned, re.IGNORECASE):
+    if not _starts_with_select(query):
         return {
             "error": True,
             "message": "Query must start with SELECT. Data modification statements are not allowed.",
@@ -698,21 +1324,21 @@ def _validate_query_safety(query: str, max_rows: int) -> Dict[str, Union[bool, s
         }
 
     # Additional security validations
-    security_checks = _perform_additional_security_checks(query_upper, query)
+    security_checks = _perform_additional_security_checks(query)
     if security_checks["error"]:
         return security_checks
 
     # Check if query already has a LIMIT clause
-    limit_pattern = r"\bLIMIT\s+(\d+)\b"
-    limit_match = re.search(limit_pattern, query_upper)
+    code = _blank_sql_comments(query)
+    limit_match = _TRAILING_LIMIT_RE.search(code)
 
     if limit_match:
         # Query has LIMIT, check if it's within our max_rows
         existing_limit = int(limit_match.group(1))
         if existing_limit > max_rows:
             # Replace with our max_rows
-            safe_query = re.sub(
-                limit_pattern, f"LIMIT {max_rows}", query, flags=re.IGNORECASE
+            safe_query = (
+                f"{query[: limit_match.start(1)]}{row_cap}{query[limit_match.end(1) :]}"
             )
             return {
                 "error": False,
@@ -723,8 +1349,11 @@ def _validate_query_safety(query: str, max_rows: int) -> Dict[str, Union[bool, s
             # Existing limit is fine
             return {"error": False, "message": "Query is safe", "safe_query": query}
     else:
-        # No LIMIT clause, add one
-        safe_query = f"{query.rstrip(';')} LIMIT {max_rows}"
+        # No closing LIMIT (at most one inside a subquery or CTE, which leaves
+        # the outer result unbounded), so one is added to the outer statement;
+        # trailing semicolons and comments are dropped so they cannot swallow it
+        body_end = len(code.rstrip("; \t\r\n\f\v"))
+        safe_query = f"{query[:body_end]} LIMIT {row_cap}"
         return {
             "error": False,
             "message": f"Added LIMIT {max_rows} for safety",
@@ -732,6 +1361,51 @@ def _validate_query_safety(query: str, max_rows: int) -> Dict[str, Union[bool, s
         }
 
 
+# Result strings stay in Arrow buffers instead of one Python object per cell
+_ARROW_STRING_DTYPE = pd.StringDtype("pyarrow")
+
+
+def _arrow_string_types(arrow_type: pa.DataType) -> Optional[pd.StringDtype]:
+    """types_mapper for to_pandas that keeps only string columns Arrow-backed."""
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return _ARROW_STRING_DTYPE
+    return None
+
+
+def _fetch_limited(dataframe, max_rows: int) -> pd.DataFrame:
+    """
+    Stream a Snowpark DataFrame's result as Arrow batches, keeping at most max_rows.
+
+    Batches are sliced and collected until the row budget is spent, then
+    converted to pandas once; self_destruct frees each Arrow column as it is
+    converted, so the Arrow and pandas copies are never both fully resident.
+    That only works while the concatenated table holds the sole reference to
+    the Arrow buffers, so the batch list and loop variables are released first.
+
+    String columns become string[pyarrow] rather than object columns, which
+    is where most of a wide result's memory went. Numeric and temporal
+    columns keep their NumPy dtypes, and with them NaN/NaT semantics.
+    """
+    chunks = []
+    rows_left = max(max_rows, 0)
+    batches = dataframe.to_arrow_batches()
+    for batch in batches:
+        chunks.append(batch.slice(0, rows_left))
+        rows_left -= chunks[-1].num_rows
+        if rows_left <= 0:
+            break
+    batch = batches = None
+
+    if not chunks:
+        return pd.DataFrame()
+    # Batches may narrow integer columns differently, so types are unified
+    table = pa.concat_tables(chunks, promote_options="permissive")
+    del chunks
+    return table.to_pandas(
+        split_blocks=True, self_destruct=True, types_mapper=_arrow_string_types
+    )
+
+
 def execute_query(query: str, max_rows: int = 10000) -> pd.DataFrame:
     """
     Execute a safe custom SQL query against Snowflake and return results as DataFrame.
@@ -746,60 +1420,276 @@ def execute_query(query: str, max_rows: int = 10000) -> pd.DataFrame:
         max_rows (int): Maximum number of rows to return (default: 10000, max: 10000)
 
     Returns:
-        pd.DataFrame: Query results, or DataFrame with 'error' column if query fails
+        pd.DataFrame: Query results, or DataFrame with 'error' column if query
+        fails; attrs["truncated"] is True when the row cap cut the result short
     """
     # Rate limiting check (check first before any other operations)
     rate_check = _check_rate_limit()
     if rate_check["error"]:
-        logger.warning(f"Query rejected for rate limiting: {rate_check['message']}")
-        return pd.DataFrame({"error": [rate_check["message"]]})
+        logger.warning("Query rejected for rate limiting: %s", rate_check["message"])
+        return _error_frame(rate_check["message"])
 
-    # Security validation
-    safety_check = _validate_query_safety(query, max_rows)
+    # Security validation; the LIMIT it enforces admits one extra row, whose
+    # arrival tells a capped result apart from one that just fits
+    max_rows = min(max_rows, _MAX_RESULT_ROWS)
+    safety_check = _validate_query_safety(query, max_rows, detect_truncation=True)
     if safety_check["error"]:
-        logger.warning(f"Query rejected for safety: {safety_check['message']}")
-        return pd.DataFrame({"error": [safety_check["message"]]})
+        logger.warning("Query rejected for safety: %s", safety_check["message"])
+        return _error_frame(safety_check["message"])
+
+    # Use the safe query (potentially modified with LIMIT)
+    safe_query = safety_check["safe_query"]
+    if _NONDETERMINISTIC_RE.search(safe_query):
+        return _drop_probe_row(_execute_safe_query(safe_query, max_rows + 1), max_rows)
+
+    cache_key = (safe_query, max_rows)
+    cached_df, claim = _claim_cached_result(cache_key)
+    if cached_df is not None:
+        logger.info("Returning cached result with %d rows", len(cached_df))
+        return cached_df
+
+    result_df = None
+    change_token = None
+    try:
+        # Only a query whose result outlived its TTL pays for a change-token
+        # lookup: the token either revalidates that result or is stored with
+        # the new one. It is read before the query runs, so a change landing
+        # meanwhile makes the stored result look stale rather than fresh
+        if _has_expired_result(cache_key):
+            tables = _referenced_tables(safe_query)
+            if tables:
+                change_token = _read_change_token(tables)
+            result_df = _revalidate_cached_result(cache_key, change_token)
+            if result_df is not None:
+                logger.info("Source tables unchanged, reusing expired cached result")
+                return result_df
+        result_df = _drop_probe_row(
+            _execute_safe_query(safe_query, max_rows + 1), max_rows
+        )
+        return result_df
+    finally:
+        _release_cached_result(cache_key, result_df, claim, change_token)
 
-    # Get Snowflake session
+
+def _drop_probe_row(result_df: pd.DataFrame, max_rows: int) -> pd.DataFrame:
+    """Trim a result fetched with one extra row and record whether it had one."""
+    if "error" in result_df.columns:
+        return result_df
+    truncated = len(result_df) > max_rows
+    if truncated:
+        result_df = result_df.iloc[:max_rows]
+    result_df.attrs["truncated"] = truncated
+    return result_df
+
+
+def _claim_cached_result(
+    key: _ResultCacheKey,
+) -> Tuple[Optional[pd.DataFrame], Optional[threading.Event]]:
+    """
+    Look up a cached result, waiting out an identical query already in flight.
+
+    Returns (frame, None) on a hit. On a miss the caller is given a pending
+    Event, which it must pass to _release_cached_result once it has run the
+    query; (None, None) means the in-flight query took too long to wait for.
+    """
+    while True:
+        with _result_cache_lock:
+            entry = _result_cache.get(key)
+            if entry is not None and (
+                time.monotonic() - entry[1] <= _RESULT_CACHE_TTL_SECONDS
+            ):
+                _result_cache.move_to_end(key)
+                return entry[0].copy(), None
+
+            pending = _pending_results.get(key)
+            if pending is None:
+                claim = threading.Event()
+                _pending_results[key] = claim
+                return None, claim
+
+        if not pending.wait(_QUERY_TIMEOUT_SECONDS):
+            return None, None
+
+
+def _referenced_tables(query: str) -> Optional[Tuple[str, ...]]:
+    """
+    Return the tables a query reads from, or None if they cannot all be named.
+
+    The scan is deliberately conservative: anything it cannot account for
+    (comma joins, table functions, quoted names, stages, comments, CTEs)
+    disables revalidation before any change-token lookup is attempted.
+    """
+    if _UNTRACKABLE_SOURCE_RE.search(query):
+        return None
+    tables = set()
+    for match in _TABLE_REF_RE.finditer(_FROM_ARGUMENT_FUNCTION_RE.sub(" ", query)):
+        if match.group(2) or match.group(3):
+            return None
+        tables.add(match.group(1).upper())
+    return tuple(sorted(tables)) or None
+
+
+def _read_change_token(tables: Tuple[str, ...]) -> _ChangeToken:
+    """
+    Read SYSTEM$LAST_CHANGE_COMMIT_TIME for each table in one metadata query.
+
+    The function returns the same value for as long as a table or view is
+    unchanged. Returns None when the token cannot be read, which leaves the
+    result to expire normally.
+    """
     session = get_snowflake_session()
     if session is None:
-        logger.error("Failed to connect to Snowflake for custom query")
-        return pd.DataFrame({"error": ["Failed to connect to Snowflake"]})
-
+        return None
+    # Names come from _TABLE_REF_RE, so they are plain identifiers
+    columns = ", ".join(
+        f"SYSTEM$LAST_CHANGE_COMMIT_TIME('{table}')" for table in tables
+    )
     try:
-        # Use the safe query (potentially modified with LIMIT)
-        safe_query = safety_check["safe_query"]
+        row = session.sql(f"SELECT {columns}").collect()[0]
+        token = tuple(row)
+    except Exception as e:
+        logger.debug("Could not read change tokens for %s: %s", tables, e)
+        return None
+    return token if len(token) == len(tables) else None
 
-        if isinstance(safe_query, str):
-            preview = safe_query[:100]
-            if len(safe_query) > 100:
-                preview += "..."
-        else:
-            preview = ""
-        logger.info(f"Executing safe query: {preview}")
 
-        # Execute the query with timing
-        start_time = time.time()
-        result_df = session.sql(safe_query).to_pandas()
-        execution_time = time.time() - start_time
+def _has_expired_result(key: _ResultCacheKey) -> bool:
+    """Whether an expired result is kept for key (a claimant saw no fresh one)."""
+    with _result_cache_lock:
+        return key in _result_cache
 
-        # Log execution metrics
-        logger.info(
-            f"Successfully executed query in {execution_time:.2f}s, returned {len(result_df)} rows"
+
+def _revalidate_cached_result(
+    key: _ResultCacheKey, change_token: _ChangeToken
+) -> Optional[pd.DataFrame]:
+    """Return an expired cached result if its source tables are unchanged."""
+    if change_token is None:
+        return None
+    with _result_cache_lock:
+        entry = _result_cache.get(key)
+        if entry is None or entry[3] != change_token:
+            return None
+        return entry[0].copy()
+
+
+def _result_nbytes(result_df: pd.DataFrame) -> int:
+    """
+    Estimate the memory a cached result holds.
+
+    Object columns (Decimal for NUMBER with a scale, DATE and TIME values) are
+    measured deeply, since their pointer array is a small part of what they
+    hold; every other column is sized from its buffers alone.
+    """
+    size = int(result_df.index.memory_usage())
+    for position, dtype in enumerate(result_df.dtypes):
+        size += int(
+            result_df.iloc[:, position].memory_usage(index=False, deep=dtype == object)
         )
+    return size
+
+
+def _release_cached_result(
+    key: _ResultCacheKey,
+    result_df: Optional[pd.DataFrame],
+    claim: Optional[threading.Event],
+    change_token: _ChangeToken = None,
+) -> None:
+    """Cache a successful result and wake any requests waiting on the claim."""
+    global _result_cache_bytes
+    cacheable = result_df is not None and "error" not in result_df.columns
+    # Measured outside the lock, as a deep count walks every object value
+    size = _result_nbytes(result_df) if cacheable else 0
+    with _result_cache_lock:
+        if cacheable:
+            if size <= _RESULT_CACHE_MAX_BYTES:
+                previous = _result_cache.pop(key, None)
+                if previous is not None:
+                    _result_cache_bytes -= previous[2]
+                _result_cache[key] = (
+                    result_df.copy(),
+                    time.monotonic(),
+                    size,
+                    change_token,
+                )
+                _result_cache_bytes += size
+                # Evict least recently used entries until back under budget
+                while _result_cache_bytes > _RESULT_CACHE_MAX_BYTES:
+                    _, (_, _, evicted, _) = _result_cache.popitem(last=False)
+                    _result_cache_bytes -= evicted
+        elif claim is not None:
+            # The claimant failed; drop the expired entry it was revalidating
+            stale = _result_cache.pop(key, None)
+            if stale is not None:
+                _result_cache_bytes -= stale[2]
+
+        if claim is not None:
+            _pending_results.pop(key, None)
+            claim.set()
+
+
+def clear_result_cache() -> None:
+    """Drop every cached query result."""
+    global _result_cache_bytes
+    with _result_cache_lock:
+        _result_cache.clear()
+        _result_cache_bytes = 0
+
+
+def _log_query_metrics(fetch):
+    """
+    Decorate a result fetch to time it and log its duration and row count.
 
-        # Check for performance warnings
-        if execution_time > 10:
-            logger.warning(f"Slow query detected: {execution_time:.2f}s execution time")
-        if len(result_df) > 5000:
-            logger.info(f"Large result set: {len(result_df)} rows returned")
+    Messages use %-style arguments, so nothing is formatted unless the
+    logger actually emits the record.
+    """
 
-        session.close()
+    @functools.wraps(fetch)
+    def wrapper(*args, **kwargs) -> pd.DataFrame:
+        start_time = time.perf_counter()
+        result_df = fetch(*args, **kwargs)
+        execution_time = time.perf_counter() - start_time
+        row_count = len(result_df)
+
+        logger.info(
+            "Successfully executed query in %.2fs, returned %d rows",
+            execution_time,
+            row_count,
+        )
+        # Check for performance warnings
+        if execution_time > _SLOW_QUERY_SECONDS:
+            logger.warning("Slow query detected: %.2fs execution time", execution_time)
+        if row_count > _LARGE_RESULT_ROWS:
+            logger.info("Large result set: %d rows returned", row_count)
         return result_df
 
+    return wrapper
+
+
+@_log_query_metrics
+def _fetch_query(session: Session, safe_query: str, max_rows: int) -> pd.DataFrame:
+    """Run a validated query and fetch at most max_rows of its result."""
+    return _fetch_limited(session.sql(safe_query), max_rows)
+
+
+def _execute_safe_query(safe_query: str, max_rows: int) -> pd.DataFrame:
+    """Run an already validated query on the shared session."""
+    # Get Snowflake session
+    session = get_snowflake_session()
+    if session is None:
+        logger.error("Failed to connect to Snowflake for custom query")
+        return _error_frame("Failed to connect to Snowflake")
+
+    try:
+        # %.100s truncates the preview only if the record is emitted
+        logger.info(
+            "Executing safe query: %.100s%s",
+            safe_query,
+            "..." if len(safe_query) > 100 else "",
+        )
+        return _fetch_query(session, safe_query, max_rows)
+
     except Exception as e:
-        logger.error(f"Error executing custom query: {e}")
-        session.close() if session else None
+        logger.error("Error executing custom query: %s", e)
         return pd.DataFrame({"error": [f"Query execution failed: {str(e)}"]})
 
 
@@ -816,55 +1706,60 @@ def format_query_results(
     Args:
         result_df (pd.DataFrame): The query results to format
         max_rows (int): Maximum number of rows to display (default: 1000)
-        grid_id (str): Unique ID for the AG Grid component
+        grid_id (str): Unique ID for the AG Grid component, used as the index
+            of its pattern-matching ID {"type": "query-results-grid", "index": ...}
         theme (str): AG Grid theme ('alpine' or 'alpine-dark')
 
     Returns:
         html.Div: AG Grid with sorting, filtering, and pagination
     """
+    # Imported here so code that only queries never loads the component
+    # libraries; after the first call these are sys.modules lookups
+    import dash_ag_grid as dag
+    import dash_bootstrap_components as dbc
+    from dash import dcc
+
     if "error" in result_df.columns:
         return dbc.Alert(f"Query failed: {result_df['error'].iloc[0]}", color="danger")
 
-    if len(result_df) == 0:
+    total_rows = len(result_df)
+    if total_rows == 0:
         return dbc.Alert(
             "Query executed successfully but returned no results.", color="warning"
         )
 
-    # Limit the data if it's too large
-    display_df = result_df.head(max_rows)
-    total_rows = len(result_df)
-    displayed_rows = len(display_df)
-
-    # Create column definitions for AG Grid
-    column_defs = []
-    for col in display_df.columns:
-        col_def = {
-            "headerName": str(col),
-            "field": str(col),
-            "sortable": True,
-            "filter": True,
-            "resizable": True,
-        }
-
-        # Try to determine the data type for better column handling
-        if display_df[col].dtype in ["int64", "float64", "int32", "float32"]:
-            col_def["type"] = "numericColumn"
-            col_def["filter"] = "agNumberColumnFilter"
-        elif display_df[col].dtype == "datetime64[ns]":
-            col_def["filter"] = "agDateColumnFilter"
-        else:
-            col_def["filter"] = "agTextColumnFilter"
-
-        column_defs.append(col_def)
+    # Limit the data if it's too large; results within the limit are used as
+    # they are rather than through a new head() object
+    if total_rows > max_rows:
+        display_df = result_df.head(max_rows)
+        displayed_rows = len(display_df)
+    else:
+        display_df = result_df
+        displayed_rows = total_rows
 
-    # Convert DataFrame to records for AG Grid
-    row_data = display_df.to_dict("records")
+    # Create column definitions for AG Grid from the column dtypes, read in
+    # one pass without materializing each column
+    filter_types = tuple(_column_filter_types(dtype) for dtype in display_df.dtypes)
+    try:
+        column_defs = list(_build_column_defs(tuple(display_df.columns), filter_types))
+    except TypeError:
+        # Unhashable column labels cannot key the cache
+        column_defs = [
+            _grid_column_def(col, numeric=numeric, temporal=temporal)
+            for col, (numeric, temporal) in zip(display_df.columns, filter_types)
+        ]
+
+    # Ship the rows column-wise; the browser fills in the grid's rowData
+    row_store = dcc.Store(
+        id={"type": GRID_ROWS_ID_TYPE, "index": grid_id},
+        data=_grid_row_payload(display_df),
+    )
 
     # Create the AG Grid with theme support
     grid_theme = f"ag-theme-{theme}"
     ag_grid = dag.AgGrid(
-        id=grid_id,
-        rowData=row_data,
+        id={"type": GRID_ID_TYPE, "index": grid_id},
+        rowData=[],
         columnDefs=column_defs,
         className=("" if apply_theme_on_container else grid_theme),
         style={"height": "500px", "width": "100%"},
@@ -885,18 +1780,21 @@ def format_query_results(
         },
     )
 
-    # Create info message about row count
+    # Create info message about row count; a result execute_query cut short
+    # at its row cap only gives a lower bound for the total
+    query_truncated = bool(result_df.attrs.get("truncated"))
     info_message = html.Div(
         [
             html.P(
                 [
                     html.Strong("Query executed successfully. "),
-                    f"Total rows: {total_rows:,}, Displaying: {displayed_rows:,}",
+                    f"Total rows: {total_rows:,}{'+' if query_truncated else ''}, "
+                    f"Displaying: {displayed_rows:,}",
                     html.Span(
-                        f" (Limited to {max_rows:,} rows for performance)",
+                        f" (Limited to {displayed_rows:,} rows for performance)",
                         className="text-muted",
                     )
-                    if total_rows > max_rows
+                    if total_rows > max_rows or query_truncated
                     else "",
                 ]
             ),
@@ -910,4 +1808,4 @@ def format_query_results(
         className="mb-3",
     )
 
-    return html.Div([info_message, ag_grid])
+    return html.Div([info_message, row_store, ag_grid])